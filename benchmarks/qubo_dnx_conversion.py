@@ -0,0 +1,112 @@
+"""Benchmark the conversions between Qubo and the dictionaries used by D-Wave NetworkX.
+
+The QUBOs are TSP formulations with the same structure as the ones created by dwave_networkx, which has n cities and
+n * n variables. For small city counts, the element-wise conversion QUARK-framework used before is timed as well.
+
+Usage: python benchmarks/qubo_dnx_conversion.py [--cities 4 8 12 16 24 32] [--legacy-max-cities 24]
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+from collections import defaultdict
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from quark.interface_types import Qubo
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+def tsp_dnx_qubo(n: int, seed: int = 0) -> dict:
+    """Create a TSP QUBO on a complete graph with random weights, like dwave_networkx.traveling_salesperson_qubo."""
+    rng = np.random.default_rng(seed)
+    weights = rng.uniform(1, 10, size=(n, n))
+    lagrange = float(weights.sum() / n)
+    q: defaultdict = defaultdict(float)
+    for node in range(n):
+        for pos_1 in range(n):
+            q[((node, pos_1), (node, pos_1))] -= lagrange
+            for pos_2 in range(pos_1 + 1, n):
+                q[((node, pos_1), (node, pos_2))] += 2.0 * lagrange
+    for pos in range(n):
+        for node_1 in range(n):
+            q[((node_1, pos), (node_1, pos))] -= lagrange
+            for node_2 in range(node_1 + 1, n):
+                q[((node_1, pos), (node_2, pos))] += 2.0 * lagrange
+    for u, v in itertools.combinations(range(n), 2):
+        for pos in range(n):
+            next_pos = (pos + 1) % n
+            q[((u, pos), (v, next_pos))] += weights[u, v]
+            q[((v, pos), (u, next_pos))] += weights[u, v]
+    return dict(q)
+
+
+def legacy_from_dnx_qubo(qubo: dict, n: int) -> np.ndarray:
+    """Convert a D-Wave NetworkX dictionary to a matrix element by element, as QUARK-framework used to."""
+    qubo_matrix = np.zeros((n * n, n * n))
+    for (i, j), value in qubo.items():
+        qubo_matrix[i[0] * n + i[1]][j[0] * n + j[1]] = value
+    for i in range(n * n):
+        for j in range(n * n):
+            if qubo_matrix[i, j] != 0:
+                qubo_matrix[j, i] = qubo_matrix[i, j]
+    return qubo_matrix
+
+
+def legacy_as_dnx_qubo(qubo_matrix: np.ndarray) -> dict:
+    """Convert a matrix to a D-Wave NetworkX dictionary element by element, as QUARK-framework used to."""
+    n = int(np.sqrt(len(qubo_matrix)))
+    q = {}
+    for i in range(n * n):
+        for j in range(n * n):
+            if qubo_matrix[i, j] != 0:
+                q[((i // n, i % n), (j // n, j % n))] = qubo_matrix[i, j]
+    return q
+
+
+def best_time(func: Callable[[], object], repeat: int) -> float:
+    """Return the fastest of several runs of the function, in seconds."""
+    times = []
+    for _ in range(repeat):
+        t1 = perf_counter()
+        func()
+        times.append(perf_counter() - t1)
+    return min(times)
+
+
+def main() -> None:
+    """Run the benchmark and print a table of the results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, nargs="+", default=[4, 8, 12, 16, 24, 32])
+    parser.add_argument("--legacy-max-cities", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(  # noqa: T201
+        f"{'cities':>6} {'entries':>9} {'from_dnx':>10} {'as_dnx':>10} {'as_dnx(dense)':>14} "
+        f"{'legacy from':>12} {'legacy as':>10}",
+    )
+    for n in args.cities:
+        dnx = tsp_dnx_qubo(n)
+        sparse = Qubo.from_dnx_qubo(dnx, n)
+        dense = Qubo.from_matrix(sparse.as_matrix())
+        from_time = best_time(lambda: Qubo.from_dnx_qubo(dnx, n), args.repeat)  # noqa: B023
+        as_time = best_time(sparse.as_dnx_qubo, args.repeat)
+        as_dense_time = best_time(dense.as_dnx_qubo, args.repeat)
+        legacy_from = legacy_as = "-"
+        if n <= args.legacy_max_cities:
+            legacy_from = f"{best_time(lambda: legacy_from_dnx_qubo(dnx, n), 1):.4f}"  # noqa: B023
+            legacy_as = f"{best_time(lambda: legacy_as_dnx_qubo(dense.as_matrix()), 1):.4f}"  # noqa: B023
+        print(  # noqa: T201
+            f"{n:>6} {len(dnx):>9} {from_time:>10.4f} {as_time:>10.4f} {as_dense_time:>14.4f} "
+            f"{legacy_from:>12} {legacy_as:>10}",
+        )
+
+
+if __name__ == "__main__":
+    main()
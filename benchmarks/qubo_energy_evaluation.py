@@ -0,0 +1,59 @@
+"""Benchmark Qubo.evaluate_energies against evaluating x^T Q x for one sample at a time.
+
+Random QUBOs of the given sizes and densities are evaluated for random samples, both with a dense and a sparse backing.
+
+Usage: python benchmarks/qubo_energy_evaluation.py [--variables 100 1000] [--density 0.01] [--samples 10000]
+"""
+
+from __future__ import annotations
+
+import argparse
+from time import perf_counter
+
+import numpy as np
+
+from quark.interface_types import Qubo
+
+
+def naive_energies(matrix: np.ndarray, samples: np.ndarray) -> np.ndarray:
+    """Evaluate the energies in a Python loop over the samples, as plugins commonly did."""
+    return np.array([sample @ matrix @ sample for sample in samples])
+
+
+def main() -> None:
+    """Run the benchmark and print a table of the results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variables", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--density", type=float, default=0.01)
+    parser.add_argument("--samples", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'variables':>9} {'samples':>8} {'naive':>8} {'dense':>8} {'sparse':>8}")  # noqa: T201
+    for n in args.variables:
+        nnz = max(1, int(args.density * n * (n + 1) / 2))
+        sparse = Qubo.from_coo(rng.integers(0, n, nnz), rng.integers(0, n, nnz), rng.normal(size=nnz), n=n)
+        dense = Qubo.from_matrix(sparse.as_matrix())
+        samples = rng.integers(0, 2, size=(args.samples, n), dtype=np.int8)
+
+        # Warm up, so that importing scipy.sparse for the sparse backing is not part of the measured time
+        sparse.evaluate_energies(samples[:1])
+
+        t1 = perf_counter()
+        expected = naive_energies(dense.as_matrix(), samples)
+        naive_time = perf_counter() - t1
+        t1 = perf_counter()
+        dense_energies = dense.evaluate_energies(samples)
+        dense_time = perf_counter() - t1
+        t1 = perf_counter()
+        sparse_energies = sparse.evaluate_energies(samples)
+        sparse_time = perf_counter() - t1
+
+        if not (np.allclose(dense_energies, expected) and np.allclose(sparse_energies, expected)):
+            msg = f"Energies for {n} variables do not match the naive evaluation"
+            raise AssertionError(msg)
+        print(f"{n:>9} {args.samples:>8} {naive_time:>8.4f} {dense_time:>8.4f} {sparse_time:>8.4f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
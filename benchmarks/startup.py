@@ -0,0 +1,115 @@
+"""Benchmark the startup of QUARK-framework, using the import times reported by python -X importtime.
+
+Two commands are measured: quark --help, and a run of a pipeline consisting of a single module that does nothing,
+provided by a plugin written to a temporary directory. For each command, the number of imported modules, the total
+import time, and the wall-clock time of the whole process are printed, followed by the slowest top-level imports.
+
+Usage: python benchmarks/startup.py [--repeat 5] [--top 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+
+PLUGIN = """
+from dataclasses import dataclass
+
+from quark.core import Core, Data
+from quark.plugin_manager import factory
+
+
+@dataclass
+class NoOp(Core):
+    def preprocess(self, data):
+        return Data(None)
+
+    def postprocess(self, data):
+        return Data(None)
+
+
+def register():
+    factory.register("no_op", NoOp)
+"""
+
+CONFIG = """
+plugins: ["startup_benchmark_plugin"]
+pipeline: ["no_op"]
+"""
+
+
+@dataclass(frozen=True)
+class ImportTimes:
+    """The import times of a single process, as reported by python -X importtime."""
+
+    num_modules: int
+    total_time: float  # Seconds, the sum of the cumulative times of all top-level imports
+    top_level: list[tuple[str, float]]  # Top-level imports and their cumulative times in seconds
+
+    @classmethod
+    def parse(cls, stderr: str) -> ImportTimes:
+        """Parse the lines written by python -X importtime, ignoring all other output."""
+        num_modules = 0
+        top_level = []
+        for line in stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            _, cumulative, name = line.removeprefix("import time:").split("|")
+            num_modules += 1
+            if not name.startswith("  "):  # Nested imports are indented by two spaces per level
+                top_level.append((name.strip(), int(cumulative) / 1e6))
+        return cls(num_modules, sum(time for _, time in top_level), top_level)
+
+
+def measure(args: list[str], env: dict[str, str]) -> tuple[ImportTimes, float]:
+    """Run python -X importtime with the given arguments, and return its import times and its wall-clock time.
+
+    Each run gets its own working directory, as run directories are named after the second a run started in.
+    """
+    with tempfile.TemporaryDirectory() as cwd:
+        t1 = perf_counter()
+        process = subprocess.run(  # noqa: S603
+            [sys.executable, "-X", "importtime", *args],
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        wall_time = perf_counter() - t1
+    return ImportTimes.parse(process.stderr), wall_time
+
+
+def main() -> None:
+    """Run the benchmark and print the results of each command."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each command, the fastest is reported")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest top-level imports to print")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        tmp_path.joinpath("startup_benchmark_plugin.py").write_text(PLUGIN)
+        tmp_path.joinpath("config.yml").write_text(CONFIG)
+        env = os.environ | {"PYTHONPATH": os.pathsep.join(filter(None, [tmp, os.environ.get("PYTHONPATH")]))}
+        commands = {
+            "quark --help": ["-m", "quark", "--help"],
+            "no-op pipeline": ["-m", "quark", "-c", str(tmp_path.joinpath("config.yml"))],
+        }
+        for label, command in commands.items():
+            runs = [measure(command, env) for _ in range(args.repeat)]
+            import_times, wall_time = min(runs, key=lambda run: run[1])
+            print(f"{label}: {import_times.num_modules} modules imported in {import_times.total_time:.4f}s, ", end="")  # noqa: T201
+            print(f"{wall_time:.4f}s wall-clock time")  # noqa: T201
+            for name, time in sorted(import_times.top_level, key=lambda item: -item[1])[: args.top]:
+                print(f"    {time:>8.4f}s  {name}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
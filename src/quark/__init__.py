@@ -1,5 +1,5 @@
-from quark.__main__ import start
-
-
 def entrypoint():
+    # Imported here, so that importing any part of quark, e.g. in a worker process, does not import the whole CLI
+    from quark.__main__ import start  # noqa: PLC0415
+
     start()
@@ -1,100 +1,131 @@
 from __future__ import annotations
 
-import json
 import logging
 import pickle
 import shutil
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
-from textwrap import wrap
-from typing import Any
-
-import matplotlib.pyplot as plt
-
-from quark.argument_parsing import get_args
-from quark.benchmarking import (
-    FailedPipelineRun,
-    FinishedPipelineRun,
-    FinishedTreeRun,
-    InterruptedTreeRun,
-    ModuleNode,
-    run_pipeline_tree,
-)
-from quark.config_parsing import parse_config
-from quark.interface_types import InterfaceType, Other
-from quark.plugin_manager import loader
-from quark.quark_logging import set_logger
+from typing import TYPE_CHECKING
+
+from quark.argument_parsing import get_args, get_merge_args
+
+if TYPE_CHECKING:
+    from argparse import Namespace
+
+    from quark.config_parsing import PipelineTree
+    from quark.plugin_manager.loader import PluginSpec
+    from quark.results import FailedPipelineRunSummary, FinishedPipelineRunSummary
 
 PICKLE_FILE_NAME: str = "intermediate_run_state.pkl"
 
 
 @dataclass(frozen=True)
 class BenchmarkingPickle:
-    """Encapsulates all data needed when the program state is stored as a pickle file."""
-
-    plugins: list[str]
-    pipeline_trees: list[ModuleNode]
-    finished_pipeline_runs: list[FinishedPipelineRun]
-    failed_pipeline_runs: list[FailedPipelineRun]
-
-
-def extract_result(result: InterfaceType) -> float | None:
-    match result:
-        case Other(data) if isinstance(data, int):
-            return float(data)
-        case Other(data) if isinstance(data, float):
-            return data
-        case _:
-            return None
-
-
-class FinishedPipelineRunResultEncoder(json.JSONEncoder):
-    """JSONEncoder for the FinishedPipelineRun class."""
-
-    def default(self, o: Any) -> Any:  # noqa: ANN401 D102
-        if not isinstance(o, FinishedPipelineRun):
-            # Let the base class default method raise the TypeError
-            return super().default(o)
-        d = o.__dict__.copy()
-        match extract_result(d["result"]):
-            case None:
-                del d["result"]
-            case result:
-                d["result"] = result
-        d["steps"] = [step.__dict__ for step in o.steps]
-        for step in d["steps"]:
-            step["module_info"] = step["module_info"].__dict__
-        return d
-
-
-class FailedPipelineRunResultEncoder(json.JSONEncoder):
-    """JSONEncoder for the FailedPipelineRun class."""
-
-    def default(self, o: Any) -> Any:  # noqa: ANN401 D102
-        if not isinstance(o, FailedPipelineRun):
-            # Let the base class default method raise the TypeError
-            return super().default(o)
-        d = o.__dict__.copy()
-        d["metrics_up_to_now"] = [step.__dict__ for step in o.metrics_up_to_now]
-        for step in d["metrics_up_to_now"]:
-            step["module_info"] = step["module_info"].__dict__
-        return d
+    """Encapsulates all data needed when the program state is stored as a pickle file.
+
+    The results of finished and failed pipeline runs are already written when the pickle file is created, so only their
+    summaries are stored.
+    """
+
+    plugins: list[PluginSpec]
+    pipeline_trees: list[PipelineTree]
+    finished_pipeline_runs: list[FinishedPipelineRunSummary]
+    failed_pipeline_runs: list[FailedPipelineRunSummary]
+    # Names of the journal files whose records are already reflected in this pickle, see CheckpointJournal
+    superseded_journal_files: list[str] = field(default_factory=list)
+
+
+def merge(args: list[str]) -> None:
+    """Combine the run directories of the shards of a config file into one run directory, see sharding.merge_shards."""
+    parsed_args = get_merge_args(args)
+    from quark.quark_logging import set_logger  # noqa: PLC0415
+    from quark.sharding import merge_shards  # noqa: PLC0415
+
+    base_path = (
+        Path(parsed_args.output)
+        if parsed_args.output
+        else Path("benchmark_runs").joinpath(datetime.today().strftime("%Y-%m-%d-%H-%M-%S"))  # noqa: DTZ002
+    )
+    try:
+        result_sink = merge_shards([Path(shard_dir) for shard_dir in parsed_args.shard_dirs], base_path)
+    except ValueError as e:
+        print(f"Error: {e}")  # noqa: T201
+        exit(1)
+    set_logger(base_path)
+    logging.info("")
+    logging.info(f"Merged {len(parsed_args.shard_dirs)} shards into {base_path}")
+    logging.info(" ======================== RESULTS =========================== ")
+    result_sink.write_summary()
+
+
+def plan(parsed_args: Namespace) -> None:
+    """Print the pipelines of the config file and their estimated duration, without running them."""
+    from quark.config_parsing import parse_config  # noqa: PLC0415
+    from quark.planning import describe_plan, estimate_subtrees, load_history  # noqa: PLC0415
+    from quark.sharding import Shard, shard_pipeline_trees  # noqa: PLC0415
+
+    if parsed_args.config is None:
+        print("Error: --plan can only be used with --config")  # noqa: T201
+        exit(1)
+    pipeline_trees = parse_config(parsed_args.config).pipeline_trees
+    if parsed_args.shard is not None:
+        try:
+            shard = Shard.parse(parsed_args.shard)
+        except ValueError as e:
+            print(f"Error: {e}")  # noqa: T201
+            exit(1)
+        pipeline_trees = shard_pipeline_trees(pipeline_trees, shard)
+    estimates = estimate_subtrees(pipeline_trees, load_history(parsed_args.history))
+    for line in describe_plan(pipeline_trees, estimates):
+        print(line)  # noqa: T201
 
 
 def start(args: list[str] | None = None) -> None:
-    """Start the benchmarking process."""
+    """Start the benchmarking process, or combine the run directories of shards if the first argument is merge."""
+    command_line = sys.argv[1:] if args is None else args
+    if command_line[:1] == ["merge"]:
+        merge(command_line[1:])
+        return
     parsed_args = get_args(args)
+    if parsed_args.plan:
+        plan(parsed_args)
+        return
+    # The arguments are parsed first, so that e.g. --help does not wait for the rest of quark and its dependencies
+    from quark.benchmarking import InterruptedTreeRun, RunOptions, run_pipeline_trees  # noqa: PLC0415
+    from quark.checkpoint import JOURNAL_DIR_NAME, CheckpointJournal  # noqa: PLC0415
+    from quark.config_parsing import parse_config  # noqa: PLC0415
+    from quark.instrumentation import Instrumentation  # noqa: PLC0415
+    from quark.planning import estimate_subtrees, load_history, order_longest_first  # noqa: PLC0415
+    from quark.plugin_manager import factory, loader  # noqa: PLC0415
+    from quark.preprocess_cache import PreprocessCache  # noqa: PLC0415
+    from quark.profiling import PROFILES_DIR_NAME, Profiler  # noqa: PLC0415
+    from quark.quark_logging import set_logger  # noqa: PLC0415
+    from quark.results import ResultSink  # noqa: PLC0415
+    from quark.results_store import RESULTS_DB_FILE_NAME, ResultsStore  # noqa: PLC0415
+    from quark.sharding import Shard, shard_pipeline_trees  # noqa: PLC0415
+
     base_path: Path
-    plugins = list[str]
-    pipeline_trees: list[ModuleNode] = []
-    all_finished_pipeline_runs: list[FinishedPipelineRun] = []
-    all_failed_pipeline_runs: list[FailedPipelineRun] = []
+    plugins: list[PluginSpec]
+    pipeline_trees: list[PipelineTree] = []
+    finished_summaries: list[FinishedPipelineRunSummary] = []
+    failed_summaries: list[FailedPipelineRunSummary] = []
     match parsed_args.resume_dir:
         case None:  # New run
-            base_path = Path("benchmark_runs").joinpath(datetime.today().strftime("%Y-%m-%d-%H-%M-%S"))  # noqa: DTZ002
+            shard = None
+            if parsed_args.shard is not None:
+                try:
+                    shard = Shard.parse(parsed_args.shard)
+                except ValueError as e:
+                    print(f"Error: {e}")  # noqa: T201
+                    exit(1)
+            run_name = datetime.today().strftime("%Y-%m-%d-%H-%M-%S")  # noqa: DTZ002
+            if shard is not None:  # Shards of the same config file can be told apart before they are merged
+                run_name += f"-shard-{shard.index}-of-{shard.count}"
+            base_path = Path("benchmark_runs").joinpath(run_name)
             base_path.mkdir(parents=True)
-            set_logger(str(base_path.joinpath("logging.log")))
+            set_logger(base_path, parsed_args.log_level)
             logging.info(" ============================================================ ")
             logging.info(r"             ___    _   _      _      ____    _  __           ")
             logging.info(r"            / _ \  | | | |    / \    |  _ \  | |/ /           ")
@@ -112,103 +143,142 @@ def start(args: list[str] | None = None) -> None:
             shutil.copyfile(parsed_args.config, base_path.joinpath("config.yml"))
             plugins = config.plugins
             pipeline_trees = config.pipeline_trees
+            if shard is not None:
+                shard.write(base_path)
+                pipeline_trees = shard_pipeline_trees(pipeline_trees, shard)
         case resume_dir_path:  # Resumed run
             base_path = Path(resume_dir_path)
             pickle_file_path = base_path.joinpath(PICKLE_FILE_NAME)
-            if not pickle_file_path.is_file():
-                print("Error: No pickle file found in the specified resume_dir")  # noqa: T201
+            journal = CheckpointJournal(base_path.joinpath(JOURNAL_DIR_NAME))
+            if not pickle_file_path.is_file() and not journal.files():
+                print("Error: No pickle file or checkpoint journal found in the specified resume_dir")  # noqa: T201
                 exit(1)
-            set_logger(str(base_path.joinpath("logging.log")))
+            set_logger(base_path, parsed_args.log_level)
             logging.info("")
-            logging.info("Resuming benchmarking from data found in pickle file.")
-            with Path.open(pickle_file_path, "rb") as f:
-                benchmarking_pickle: BenchmarkingPickle = pickle.load(f)  # noqa: S301
-            plugins = benchmarking_pickle.plugins
-            pipeline_trees = benchmarking_pickle.pipeline_trees
-            all_finished_pipeline_runs = benchmarking_pickle.finished_pipeline_runs
-            all_failed_pipeline_runs = benchmarking_pickle.failed_pipeline_runs
+            superseded_journal_files: list[str] = []
+            if pickle_file_path.is_file():
+                logging.info("Resuming benchmarking from data found in pickle file.")
+                with Path.open(pickle_file_path, "rb") as f:
+                    benchmarking_pickle: BenchmarkingPickle = pickle.load(f)  # noqa: S301
+                plugins = benchmarking_pickle.plugins
+                pipeline_trees = benchmarking_pickle.pipeline_trees
+                finished_summaries = benchmarking_pickle.finished_pipeline_runs
+                failed_summaries = benchmarking_pickle.failed_pipeline_runs
+                superseded_journal_files = benchmarking_pickle.superseded_journal_files
+            else:
+                # The run exited uncleanly before any module interrupted it, so it is rebuilt from its config file
+                logging.info("Resuming benchmarking from the checkpoint journal.")
+                config = parse_config(str(base_path.joinpath("config.yml")))
+                plugins = config.plugins
+                pipeline_trees = config.pipeline_trees
+                if (shard := Shard.read(base_path)) is not None:
+                    pipeline_trees = shard_pipeline_trees(pipeline_trees, shard)
+            replay = journal.replay(pipeline_trees, set(superseded_journal_files))
+            pipeline_trees = replay.pipeline_trees
+            finished_summaries = [*finished_summaries, *replay.finished_summaries]
+            failed_summaries = [*failed_summaries, *replay.failed_summaries]
+            logging.info(
+                f"Recovered {len(replay.finished_summaries)} finished and {len(replay.failed_summaries)} failed "
+                "pipeline runs from the checkpoint journal.",
+            )
 
     pickle_file_path = base_path.joinpath(PICKLE_FILE_NAME)
-    pipelines_path = base_path.joinpath("pipelines")
-    failed_pipelines_path = base_path.joinpath("failed_pipelines")
+    journal = CheckpointJournal(
+        base_path.joinpath(JOURNAL_DIR_NAME),
+        max_data_size=parsed_args.journal_data_size * 1_000_000,
+    )
+    store = None
+    store_path = base_path.joinpath(RESULTS_DB_FILE_NAME)
+    # A resumed run keeps writing to the store it started with
+    if parsed_args.results_backend == "sqlite" or store_path.exists():
+        store = ResultsStore(store_path)
+    result_sink = ResultSink(
+        base_path,
+        finished_summaries,
+        failed_summaries,
+        journal,
+        store,
+        resumed=parsed_args.resume_dir is not None,
+    )
 
     loader.load_plugins(plugins)
+    factory.max_idle_instances = parsed_args.module_pool_size
+
+    if parsed_args.longest_first:
+        # Ordered after sharding, so that the pipelines of each shard do not depend on the history of its machine
+        estimates = estimate_subtrees(pipeline_trees, load_history(parsed_args.history))
+        pipeline_trees = order_longest_first(pipeline_trees, estimates)
+        if estimates.unknown_modules:
+            logging.info(f"No recorded times for modules {sorted(estimates.unknown_modules)}, estimated as 0 seconds")
+
+    run_options = RunOptions(
+        failfast=parsed_args.failfast,
+        workers=parsed_args.workers,
+        cache=(
+            PreprocessCache(Path(parsed_args.cache_dir), max_size=parsed_args.cache_size * 1_000_000)
+            if parsed_args.cache_dir
+            else None
+        ),
+        journal=journal,
+        instrumentation=(
+            Instrumentation(trace_allocations=parsed_args.trace_allocations)
+            if parsed_args.instrument or parsed_args.trace_allocations
+            else None
+        ),
+        profiler=(
+            Profiler(
+                base_path.joinpath(PROFILES_DIR_NAME),
+                modules=frozenset(parsed_args.profile) if parsed_args.profile else None,
+            )
+            if parsed_args.profile is not None
+            else None
+        ),
+    )
 
-    rest_trees: list[ModuleNode] = []
-    for pipeline_tree in pipeline_trees:
-        match run_pipeline_tree(pipeline_tree, failfast=parsed_args.failfast):
-            case FinishedTreeRun(finished_pipeline_runs):
-                all_finished_pipeline_runs.extend(finished_pipeline_runs)
-            case InterruptedTreeRun(finished_pipeline_runs, failed_pipeline_runs, rest_tree):
-                all_finished_pipeline_runs.extend(finished_pipeline_runs)
-                all_failed_pipeline_runs.extend(failed_pipeline_runs)
-                if rest_tree:
-                    rest_trees.append(rest_tree)
+    rest_trees: list[PipelineTree] = []
+    # Results are written by the sink as soon as each pipeline run is done, so the tree run results only tell which
+    # trees still contain sleeping modules
+    for tree_run_result in run_pipeline_trees(pipeline_trees, run_options, result_sink):
+        match tree_run_result:
+            case InterruptedTreeRun(rest_tree=rest_tree) if rest_tree:
+                rest_trees.append(rest_tree)
+    journal.close()
+    result_sink.close()
 
     if rest_trees:
         logging.info(
             "Some modules interrupted execution. QUARK will store the current program state and exit.",
         )
-        # TODO write already finished runs to dirs
-        with Path.open(pickle_file_path, "wb") as f:
+        journal_files = journal.files()
+        # The pickle file replaces the previous one atomically, so a crash while writing it leaves the old one intact
+        tmp_pickle_file_path = pickle_file_path.with_suffix(".tmp")
+        with Path.open(tmp_pickle_file_path, "wb") as f:
             pickle.dump(
                 BenchmarkingPickle(
                     plugins=plugins,
                     pipeline_trees=rest_trees,
-                    finished_pipeline_runs=all_finished_pipeline_runs,
-                    failed_pipeline_runs=all_failed_pipeline_runs,
+                    finished_pipeline_runs=result_sink.finished_summaries,
+                    failed_pipeline_runs=result_sink.failed_summaries,
+                    superseded_journal_files=[path.name for path in journal_files],
                 ),
                 f,  # IDE throws warning: Expected type 'SupportsWrite[bytes]', got 'BufferedWriter' instead
             )
+        tmp_pickle_file_path.replace(pickle_file_path)
+        # The journal is only needed for the progress made after the pickle file was written
+        journal.delete(journal_files)
         logging.info(f"To resume from this state, start QUARK with '--resume-dir {base_path}'.")
         return
 
     logging.info(" ======================== RESULTS =========================== ")
 
-    if all_finished_pipeline_runs:
-        pipelines_path.mkdir()
-    bar_plot_results = []
-    for finished_run in all_finished_pipeline_runs:
-        dir_name = str.join("-", (step.unique_name for step in finished_run.steps))
-        dir_path = pipelines_path.joinpath(dir_name)
-        dir_path.mkdir()
-        json_path = dir_path.joinpath("results.json")
-        json_path.write_text(json.dumps(finished_run, cls=FinishedPipelineRunResultEncoder, indent=4))
-        logging.info([step.module_info for step in finished_run.steps])
-        result = extract_result(finished_run.result)
-        logging.info(f"Result: {result}")
-        logging.info(f"Total time: {sum(step.preprocess_time + step.postprocess_time for step in finished_run.steps)}")
-        logging.info(f"Metrics: {[step.additional_metrics for step in finished_run.steps]}")
-        logging.info("-" * 60)
-        if result:
-            bar_plot_results.append(("\n".join(wrap(dir_name, 25)), result))
-
-    if all_failed_pipeline_runs:
-        failed_pipelines_path.mkdir()
-    for i, failed_run in enumerate(all_failed_pipeline_runs):
-        dir_name = str(i) + str.join("-", (step.unique_name for step in failed_run.metrics_up_to_now))
-        dir_path = failed_pipelines_path.joinpath(dir_name)
-        dir_path.mkdir()
-        json_path = dir_path.joinpath("results.json")
-        json_path.write_text(json.dumps(failed_run, cls=FailedPipelineRunResultEncoder, indent=4))
-        logging.info([step.module_info for step in failed_run.metrics_up_to_now])
-        logging.info(f"Reason for fail: {failed_run.reason}")
-        logging.info(f"Metrics: {[step.additional_metrics for step in failed_run.metrics_up_to_now]}")
-        logging.info("-" * 60)
-
-    if bar_plot_results:
-        bar_plot_results.sort(key=lambda x: x[1], reverse=True)
-        plt.barh([r[0] for r in bar_plot_results], [r[1] for r in bar_plot_results])
-        plt.title("Results")
-        plt.ylabel("Pipelines")
-        plt.yticks(fontsize=5)
-        plt.xlabel("Result")
-        plt.tight_layout()
-        plt.savefig(base_path.joinpath("results.pdf"))
-        plt.close()
+    result_sink.write_summary()
 
     if not parsed_args.keep_pickle:
         pickle_file_path.unlink(missing_ok=True)
+        journal.delete()
+    if store is None:
+        # Every profile was copied next to the results of the pipeline runs it belongs to
+        shutil.rmtree(base_path.joinpath(PROFILES_DIR_NAME), ignore_errors=True)
 
     logging.info(" ============================================================ ")
     logging.info(" ====================  QUARK finished!   ==================== ")
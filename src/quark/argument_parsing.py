@@ -11,7 +11,10 @@ def _other_argument_parsing(argument_group: argparse._ArgumentGroup) -> None:
     argument_group.add_argument(
         "-kp",
         "--keep-pickle",
-        help="Keep the pickled state of an interrupted QUARK run, even if all pipeline runs were completed",
+        help=(
+            "Keep the pickled state and the checkpoint journal of an interrupted QUARK run, even if all pipeline runs "
+            "were completed"
+        ),
         action="store_true",
     )
     argument_group.add_argument(
@@ -20,11 +23,114 @@ def _other_argument_parsing(argument_group: argparse._ArgumentGroup) -> None:
         help="Flag whether a single failed benchmark run causes QUARK to fail",
         action="store_true",
     )
+    argument_group.add_argument(
+        "-w",
+        "--workers",
+        help="Number of processes used to run independent pipelines in parallel",
+        type=int,
+        default=1,
+    )
+    argument_group.add_argument(
+        "--instrument",
+        help="Measure the CPU time, peak memory growth and output size of every pre- and postprocess step",
+        action="store_true",
+    )
+    argument_group.add_argument(
+        "--trace-allocations",
+        help="Additionally trace memory allocations of every step with tracemalloc, implies --instrument",
+        action="store_true",
+    )
+    argument_group.add_argument(
+        "--profile",
+        help=(
+            "Profile the pre- and postprocess steps of the given modules with cProfile, or of all modules if no module "
+            "names are given, writing a .pstats file per step next to the results of each pipeline"
+        ),
+        nargs="*",
+        metavar="MODULE",
+    )
+    argument_group.add_argument(
+        "--cache-dir",
+        help="Directory of a preprocess cache shared between runs, caching is disabled if not given",
+    )
+    argument_group.add_argument(
+        "--cache-size",
+        help="Maximum size of the preprocess cache in megabytes, least recently used entries are evicted first",
+        type=int,
+        default=10_000,
+    )
+    argument_group.add_argument(
+        "--journal-data-size",
+        help=(
+            "Maximum size in megabytes of the module and preprocess result journaled per preprocess step, larger ones "
+            "are run again when an uncleanly exited run is resumed. Results in the preprocess cache are always "
+            "journaled as a reference to their cache entry"
+        ),
+        type=int,
+        default=10,
+    )
+    argument_group.add_argument(
+        "--module-pool-size",
+        help=(
+            "Maximum number of idle instances of reusable modules kept per process, to be reused by later nodes with "
+            "the same module and parameters, 0 disables reusing modules"
+        ),
+        type=int,
+        default=8,
+    )
+    argument_group.add_argument(
+        "--shard",
+        help=(
+            "Only run the i-th of N shards of the pipelines in the config file, given as i/N with i starting at 1. The "
+            "run directories of all shards can be combined with 'quark merge'"
+        ),
+        metavar="i/N",
+    )
+    argument_group.add_argument(
+        "--plan",
+        help=(
+            "Only print the number of pipelines and nodes of the config file, and estimate the duration of each "
+            "pipeline tree from the results of earlier runs, without running anything"
+        ),
+        action="store_true",
+    )
+    argument_group.add_argument(
+        "--longest-first",
+        help="Run the subtrees with the longest estimated duration first, which keeps parallel workers busy longer",
+        action="store_true",
+    )
+    argument_group.add_argument(
+        "--history",
+        help=(
+            "Run directories whose results the estimates of --plan and --longest-first are based on, all run "
+            "directories in benchmark_runs if not given"
+        ),
+        nargs="+",
+        metavar="RUN_DIR",
+    )
+    argument_group.add_argument(
+        "--results-backend",
+        help=(
+            "Where to write the results of each pipeline run, either into its own directory, or into a single SQLite "
+            "database in the run directory. A resumed run keeps the backend it was started with"
+        ),
+        choices=["directories", "sqlite"],
+        default="directories",
+    )
+    argument_group.add_argument(
+        "--log-level",
+        help="Minimum level of the messages written to the console and the log file",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+    )
 
 
 def get_args(args: list[str] | None) -> argparse.Namespace:
     """Parse the command line and return a dictionary storing the given parameters."""
-    parser = argparse.ArgumentParser(description="QUARK: Framework for Quantum Computing Application Benchmarking")
+    parser = argparse.ArgumentParser(
+        description="QUARK: Framework for Quantum Computing Application Benchmarking",
+        epilog="To combine the run directories of the shards of a config file, run 'quark merge --help'.",
+    )
 
     _config_argument_parsing(
         parser.add_argument_group("Mutually exclusive arguments, one is required").add_mutually_exclusive_group(
@@ -36,3 +142,18 @@ def get_args(args: list[str] | None) -> argparse.Namespace:
         # Print help if no arguments are provided
         args=["--help"] if (not args) and (not sys.argv[1:]) else args,
     )
+
+
+def get_merge_args(args: list[str]) -> argparse.Namespace:
+    """Parse the arguments of the merge command, which follow the word merge on the command line."""
+    parser = argparse.ArgumentParser(
+        prog="quark merge",
+        description="Combine the run directories of all shards of a config file, see --shard, into one run directory",
+    )
+    parser.add_argument("shard_dirs", help="Run directories of the shards", nargs="+", metavar="SHARD_DIR")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Run directory to create, a new directory in benchmark_runs if not given",
+    )
+    return parser.parse_args(args)
@@ -5,19 +5,40 @@
 from __future__ import annotations
 
 import logging
-from dataclasses import dataclass
-from itertools import chain
+import pickle
+import queue
+import sys
+from collections import deque
+from collections.abc import Callable
+from contextlib import nullcontext, suppress
+from dataclasses import dataclass, replace
+from functools import partial
+from itertools import chain, count
+from pathlib import Path
 from time import perf_counter
 from typing import TYPE_CHECKING, Any
 
 from anytree import NodeMixin
 
 from quark.core import Backtrack, Core, Data, Failed, Sleep
+from quark.instrumentation import deep_sizeof
 from quark.plugin_manager import factory
-from quark.quark_logging import set_logging_depth
+from quark.preprocess_cache import CachedPreprocess
+from quark.quark_logging import log_step, set_logging_context, stop_worker_logging, worker_logging
+from quark.timing import timing_statistics
 
 if TYPE_CHECKING:
+    import multiprocessing.queues
+    from collections.abc import Iterable, Iterator
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+    from quark.checkpoint import CheckpointJournal
+    from quark.config_parsing import PendingChildren, PipelineTree
+    from quark.instrumentation import Instrumentation
     from quark.interface_types import InterfaceType
+    from quark.preprocess_cache import PreprocessCache
+    from quark.profiling import Profiler
+    from quark.quark_logging import WorkerLogging
 
 
 @dataclass(frozen=True)
@@ -52,6 +73,31 @@ class ModuleRunMetrics:
     unique_name: str
     # =/= chosen manually by module or created automatically if nothing is given =/=
 
+    # === only set if the preprocess cache was used for this module ===
+    preprocess_cache_hit: bool | None = None
+    preprocess_time_saved: float | None = None  # Time the preprocess step originally took, minus the time to load it
+    # =/= only set if the preprocess cache was used for this module =/=
+
+    # === only set if the module was run repeatedly, preprocess_time and postprocess_time are the medians then ===
+    preprocess_time_stats: dict[str, Any] | None = None  # See timing.timing_statistics
+    postprocess_time_stats: dict[str, Any] | None = None
+    # =/= only set if the module was run repeatedly, preprocess_time and postprocess_time are the medians then =/=
+
+    # === only set if the run is instrumented, see instrumentation.StepMeasurement ===
+    preprocess_resource_usage: dict[str, Any] | None = None  # Additionally contains the size of the preprocessed data
+    postprocess_resource_usage: dict[str, Any] | None = None
+    # =/= only set if the run is instrumented, see instrumentation.StepMeasurement =/=
+
+    # === only set if the module was profiled, names of the profile files next to the results of the pipeline run ===
+    preprocess_profile: str | None = None
+    postprocess_profile: str | None = None
+    # =/= only set if the module was profiled, names of the profile files next to the results of the pipeline run =/=
+
+    # === only set if the step returned a Circuit, see interface_types.circuit.CircuitStatistics ===
+    preprocess_circuit_statistics: dict[str, Any] | None = None
+    postprocess_circuit_statistics: dict[str, Any] | None = None
+    # =/= only set if the step returned a Circuit, see interface_types.circuit.CircuitStatistics =/=
+
     @classmethod
     def create(
         cls,
@@ -59,6 +105,17 @@ class ModuleRunMetrics:
         module: Core,
         preprocess_time: float,
         postprocess_time: float,
+        *,
+        preprocess_cache_hit: bool | None = None,
+        preprocess_time_saved: float | None = None,
+        preprocess_time_stats: dict[str, Any] | None = None,
+        postprocess_time_stats: dict[str, Any] | None = None,
+        preprocess_resource_usage: dict[str, Any] | None = None,
+        postprocess_resource_usage: dict[str, Any] | None = None,
+        preprocess_profile: str | None = None,
+        postprocess_profile: str | None = None,
+        preprocess_circuit_statistics: dict[str, Any] | None = None,
+        postprocess_circuit_statistics: dict[str, Any] | None = None,
     ) -> ModuleRunMetrics:
         # TODO this docstring is not very good
         """Create a ModuleRunMetrics object."""
@@ -77,6 +134,16 @@ class ModuleRunMetrics:
             postprocess_time=postprocess_time,
             additional_metrics=module.get_metrics(),
             unique_name=unique_name,
+            preprocess_cache_hit=preprocess_cache_hit,
+            preprocess_time_saved=preprocess_time_saved,
+            preprocess_time_stats=preprocess_time_stats,
+            postprocess_time_stats=postprocess_time_stats,
+            preprocess_resource_usage=preprocess_resource_usage,
+            postprocess_resource_usage=postprocess_resource_usage,
+            preprocess_profile=preprocess_profile,
+            postprocess_profile=postprocess_profile,
+            preprocess_circuit_statistics=preprocess_circuit_statistics,
+            postprocess_circuit_statistics=postprocess_circuit_statistics,
         )
 
 
@@ -93,6 +160,7 @@ class FinishedPipelineRun:
 
     result: InterfaceType
     steps: list[ModuleRunMetrics]
+    origin: str = ""  # Position of the leaf node this pipeline run started at, see ModuleNode.position
 
 
 @dataclass(frozen=True)
@@ -101,6 +169,7 @@ class InProgressPipelineRun:
 
     downstream_data: Any  # The result of a child node's postprocessing step
     metrics_up_to_now: list[ModuleRunMetrics]  # The aggregated metrics from all modules included in this pipeline.
+    origin: str  # Position of the leaf node this pipeline run started at
 
 
 @dataclass(frozen=True)
@@ -114,6 +183,9 @@ class FailedPipelineRun:
 
     reason: str
     metrics_up_to_now: list[ModuleRunMetrics]
+    # Position of the node whose preprocess step failed, or of the leaf node the pipeline run started at if a
+    # postprocess step failed. In the former case, every pipeline run passing through that node failed.
+    origin: str = ""
 
 
 PipelineRunStatus = InProgressPipelineRun | PausedPipelineRun | FailedPipelineRun
@@ -154,9 +226,27 @@ class ModuleNode(NodeMixin):
     module_info: ModuleInfo
     module: Core | None = None  # The module is not created before it is needed
 
+    # Identifies the node within the pipeline trees created from the same config file, see config_parsing
+    position: str = ""
+
+    # Children that are only created once they are run, after the children given as nodes. Set for the nodes of
+    # pipelines with parameter sweeps, see config_parsing.PendingChildren.
+    pending_children: PendingChildren | None = None
+
+    # How often the pre- and postprocess steps of this module are run and measured, after being run warmup times
+    # without being measured. Set by the config file.
+    repetitions: int = 1
+    warmup: int = 0
+
     preprocess_finished: bool = False
     preprocess_time: float | None = None
+    preprocess_time_stats: dict[str, Any] | None = None
+    preprocess_resource_usage: dict[str, Any] | None = None
+    preprocess_profile: str | None = None
+    preprocess_circuit_statistics: dict[str, Any] | None = None
     preprocessed_data: Any | None = None
+    preprocess_cache_hit: bool | None = None
+    preprocess_time_saved: float | None = None
 
     interrupted_during_preprocess = False
     data_stored_by_preprocess_interrupt: Any | None = None
@@ -175,8 +265,549 @@ class ModuleNode(NodeMixin):
         self.module_info = module_info
         self.parent = parent
 
+    @property
+    def repeated(self) -> bool:
+        """Whether the steps of this module are run more than once, to aggregate statistics over their times."""
+        return self.repetitions > 1 or self.warmup > 0
+
+    @property
+    def num_children(self) -> int:
+        """Return the number of children that are still to be run, including those that are not created yet."""
+        return len(self.children) + (0 if self.pending_children is None else self.pending_children.remaining)
+
+    @property
+    def num_pipelines(self) -> int:
+        """Return the number of pipelines passing through this node that are still to be run."""
+        if not self.children and self.pending_children is None:
+            return 1
+        pending = 0 if self.pending_children is None else self.pending_children.num_pipelines
+        return sum(child.num_pipelines for child in self.children) + pending
+
+    def all_children(self) -> Iterator[ModuleNode]:
+        """Yield the children of this node, followed by its pending children, which are created one at a time."""
+        yield from self.children
+        if self.pending_children is not None:
+            yield from self.pending_children.create_children(self)
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """Settings shared by every node visited during one call of run_pipeline_tree."""
+
+    failfast: bool = False
+    workers: int = 1  # Number of worker processes the children of a node are distributed over, 1 means serial
+    pool: WorkerPool | None = None  # The worker processes of the run, started by run_pipeline_trees if workers > 1
+    cache: PreprocessCache | None = None  # If given, preprocess results are looked up in and added to this cache
+    journal: CheckpointJournal | None = None  # If given, every finished preprocess step is recorded in this journal
+    instrumentation: Instrumentation | None = None  # If given, the resources used by each step are measured
+    profiler: Profiler | None = None  # If given, the steps of the modules selected by the profiler are profiled
+
+
+def _run_repeatedly(step: Callable[[], Any], node: ModuleNode) -> tuple[Any, list[float]]:
+    """Run a pre- or postprocess step as often as configured for the node.
+
+    The repetitions stop early if the step returns anything but Data, as the pipeline run cannot continue normally then.
+
+    :return: The result of the last run and the measured times of all runs after the warmup runs
+    """
+    times = []
+    result = None
+    for i in range(node.warmup + node.repetitions):
+        t1 = perf_counter()
+        result = step()
+        if i >= node.warmup:
+            times.append(perf_counter() - t1)
+        if not isinstance(result, Data):
+            break
+    return result, times
+
+
+def _circuit_statistics(data: Any) -> dict[str, Any] | None:
+    """Return the structural statistics of the data returned by a step if it is a circuit, and None otherwise.
+
+    The statistics are kept by the circuit, so modules receiving it can use them without parsing it again. If the module
+    defining circuits was never imported, the data cannot be a circuit, so it is not imported just to check that.
+    """
+    circuit_module = sys.modules.get("quark.interface_types.circuit")
+    if circuit_module is None or not isinstance(data, circuit_module.Circuit):
+        return None
+    return data.statistics.as_dict()
+
+
+def _release_module(node: ModuleNode, *, reuse: bool) -> None:
+    """Hand the module of a node that is done back to the factory, which keeps it if it can be reused by other nodes.
+
+    :param reuse: False if a step of the module raised an exception, so that its state cannot be trusted anymore
+    """
+    if node.module is None:
+        return
+    if reuse:
+        factory.release(node.module_info.name, node.module_info.params, node.module)
+    else:
+        factory.discard(node.module)
+    node.module = None
+
+
+# State of a worker process, set by _init_worker and _upstream_data
+_worker_state: dict[str, Any] = {}
+
+# Maximum time in seconds the main process waits for the next status of a subtree before checking whether the subtree
+# was stopped by an exception, e.g. because its worker process was killed
+STATUS_POLL_INTERVAL: float = 0.1
+
+
+def _init_worker(
+    plugin_creation_funcs: dict[str, Any],
+    lazy_modules: dict[str, str],
+    max_idle_instances: int,
+    statuses: multiprocessing.queues.Queue,
+    log_setup: WorkerLogging | None,
+) -> None:
+    """Prepare a freshly started worker process.
+
+    The module registry is copied over so that start methods other than fork also know about every loaded plugin, and
+    about the plugins that are only loaded once one of their modules is used. The statuses of pipeline runs are sent to
+    the main process through the given queue. Log records of the worker are forwarded to the main process, if its logger
+    was set up by set_logger. Each worker keeps its own pool of reusable module instances.
+    """
+    from multiprocessing import util  # noqa: PLC0415  Already imported by every worker process
+
+    if log_setup is not None:
+        log_setup.install()
+    factory.plugin_creation_funcs.update(plugin_creation_funcs)
+    factory.lazy_modules.update(lazy_modules)
+    factory.max_idle_instances = max_idle_instances
+    # Worker processes started by forking exit without running atexit handlers, but with running these finalizers
+    util.Finalize(None, factory.clear_pool, exitpriority=0)
+    _worker_state["statuses"] = statuses
+
 
-def run_pipeline_tree(pipeline_tree: ModuleNode, *, failfast: bool = False) -> TreeRunResult:
+@dataclass(frozen=True)
+class _UpstreamData:
+    """Refers to the output of the preprocess step of a node whose children are distributed, see WorkerPool.publish.
+
+    Only this reference is sent along with each child subtree, not the output itself.
+    """
+
+    key: int  # Unique within a run, so that a worker can tell whether it read this data already
+    path: str  # The temporary file holding the pickled output, removed once all children of the node are done
+
+
+def _upstream_data(upstream: _UpstreamData) -> Any:
+    """Return the upstream data of a child subtree inside a worker, which reads it only once per node."""
+    if _worker_state.get("upstream_key") != upstream.key:
+        _worker_state.pop("upstream_data", None)  # Released before the data of the next node is read
+        with Path(upstream.path).open("rb") as file:
+            _worker_state["upstream_data"] = pickle.load(file)  # noqa: S301  Pickled by the main process
+        _worker_state["upstream_key"] = upstream.key
+    return _worker_state["upstream_data"]
+
+
+@dataclass(frozen=True)
+class _SubtreeDone:
+    """Sent by a worker after the last status of a subtree, together with the subtree if it is still needed."""
+
+    rest_subtree: ModuleNode | None
+
+
+def _run_subtree_in_worker(
+    task: int,
+    subtree: ModuleNode,
+    upstream: _UpstreamData,
+    depth: int,
+    options: RunOptions,
+) -> None:
+    """Run a child subtree inside a worker process, sending the status of each pipeline run to the main process.
+
+    A detached copy of the subtree arrives here. It is given a stand-in parent, so that it can be determined afterward
+    whether the subtree would have been deleted in serial mode. The subtree is only sent back if it is still needed,
+    i.e. if some of its modules are sleeping. Each status is sent as soon as it is yielded, so that the main process can
+    finish the pipeline run and write its results while the rest of the subtree is still running.
+    """
+    statuses = _worker_state["statuses"]
+    anchor = ModuleNode(subtree.module_info)
+    subtree.parent = anchor
+    for status in _run_node(subtree, _upstream_data(upstream), depth, options):
+        # Pickled here, as the queue would only log a status that cannot be pickled, instead of raising
+        statuses.put((task, pickle.dumps(status, protocol=pickle.HIGHEST_PROTOCOL)))
+    rest_subtree = None if subtree.parent is None else subtree
+    subtree.parent = None
+    statuses.put((task, pickle.dumps(_SubtreeDone(rest_subtree), protocol=pickle.HIGHEST_PROTOCOL)))
+
+
+class WorkerPool:
+    """The worker processes the child subtrees of nodes are distributed over, shared by all pipeline trees of a run.
+
+    The processes are only started once the first subtree is submitted, and keep running until the pool is closed. The
+    upstream data of the children of a node is written to a temporary file once, which each worker reads at most once,
+    so only a reference to it is sent with each subtree. The statuses of the pipeline runs of all subtrees arrive on a
+    single queue, and are kept until the subtree they belong to is read.
+    """
+
+    def __init__(self, workers: int) -> None:
+        """Initialize a WorkerPool of the given number of processes, without starting them yet."""
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._statuses: multiprocessing.queues.Queue | None = None
+        self._keys = count()
+        self._tasks = count()
+        self._futures: dict[int, Future[None]] = {}
+        self._received: dict[int, deque[bytes]] = {}  # The pickled statuses of each subtree that were not read yet
+
+    def publish(self, data: Any) -> _UpstreamData:
+        """Write the output of a preprocess step to a temporary file for the child subtrees of its node, see release."""
+        import tempfile  # noqa: PLC0415  Only needed, and imported, with workers
+
+        with tempfile.NamedTemporaryFile(prefix="quark-upstream-", suffix=".pkl", delete=False) as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        return _UpstreamData(next(self._keys), file.name)
+
+    @staticmethod
+    def release(upstream: _UpstreamData) -> None:
+        """Remove the file written by publish, once no child subtree of its node is going to read it anymore."""
+        Path(upstream.path).unlink(missing_ok=True)
+
+    def submit(self, subtree: ModuleNode, upstream: _UpstreamData, depth: int, options: RunOptions) -> int:
+        """Run a detached child subtree in one of the workers, see _run_subtree_in_worker.
+
+        :return: The task the statuses of the subtree are read by, see results
+        """
+        if self._executor is None:
+            import multiprocessing  # noqa: PLC0415  Only needed, and imported, with workers
+            from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+            self._statuses = multiprocessing.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(
+                    dict(factory.plugin_creation_funcs),
+                    dict(factory.lazy_modules),
+                    factory.max_idle_instances,
+                    self._statuses,
+                    worker_logging(),
+                ),
+            )
+        task = next(self._tasks)
+        self._received[task] = deque()
+        self._futures[task] = self._executor.submit(_run_subtree_in_worker, task, subtree, upstream, depth, options)
+        return task
+
+    def results(self, task: int, parent: ModuleNode) -> Iterator[PipelineRunStatus]:
+        """Yield the statuses of the pipeline runs of a submitted subtree as soon as they arrive.
+
+        If the subtree is still needed afterward, it is attached to the given parent again.
+        """
+        try:
+            while True:
+                status = pickle.loads(self._receive(task))  # noqa: S301  Pickled by a worker of this pool
+                if isinstance(status, _SubtreeDone):
+                    if status.rest_subtree is not None:
+                        status.rest_subtree.parent = parent
+                    return
+                yield status
+        finally:
+            self.forget([task])
+
+    def _receive(self, task: int) -> bytes:
+        """Return the next status of a subtree, keeping those of other subtrees that arrive in the meantime."""
+        received = self._received[task]
+        future = self._futures[task]
+        while not received:
+            if future.done() and future.exception() is not None:
+                future.result()  # Raises the exception the subtree was stopped by, e.g. with failfast set
+            with suppress(queue.Empty):
+                sender, status = self._statuses.get(timeout=STATUS_POLL_INTERVAL)  # type: ignore
+                if sender in self._received:  # Statuses of forgotten subtrees are dropped
+                    self._received[sender].append(status)
+        return received.popleft()
+
+    def forget(self, tasks: Iterable[int]) -> None:
+        """Stop waiting for the statuses of the given subtrees, and cancel them if they were not started yet."""
+        for task in tasks:
+            self._received.pop(task, None)
+            future = self._futures.pop(task, None)
+            if future is not None:
+                future.cancel()
+
+    def close(self) -> None:
+        """Cancel the subtrees that were not started yet, wait for the workers to exit, and write their log records."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+            stop_worker_logging()
+        if self._statuses is not None:
+            self._statuses.close()
+            self._statuses = None
+        self._futures.clear()
+        self._received.clear()
+
+
+def _run_children_in_pool(
+    node: ModuleNode,
+    pool: WorkerPool,
+    preprocessed_data: Any,
+    depth: int,
+    options: RunOptions,
+) -> Iterator[Iterator[PipelineRunStatus]]:
+    """Distribute the child subtrees of a node over the worker pool of the run.
+
+    Yields the statuses of each child in the same order as the serial traversal would, each status as soon as it is
+    sent by the worker running the child. Children that are still needed afterward, because some of their modules are
+    sleeping, are attached to the node again in their original order. Only a few children per worker are submitted
+    ahead of the one whose statuses are yielded next, so that pending children are created about as fast as they are
+    run.
+    """
+    upstream = pool.publish(preprocessed_data)
+    worker_options = replace(options, workers=1, pool=None)  # Workers never distribute the children of their nodes
+    tasks: deque[int] = deque()
+    try:
+        for subtree in node.all_children():
+            subtree.parent = None  # Detached, so that pickling the subtree does not pickle the whole tree
+            tasks.append(pool.submit(subtree, upstream, depth, worker_options))
+            if len(tasks) > 2 * pool.workers:
+                yield pool.results(tasks.popleft(), node)
+        while tasks:
+            yield pool.results(tasks.popleft(), node)
+    finally:
+        # Only left early if a pipeline run raised with failfast set, which ends the whole run
+        pool.forget(tasks)
+        pool.release(upstream)
+
+
+def _run_node(
+    node: ModuleNode,
+    upstream_data: Any,  # TODO: InterfaceType,
+    depth: int,
+    options: RunOptions,
+) -> Iterator[PipelineRunStatus]:
+    """Run the preprocess step of a node, all of its children, and its postprocess step for each of their results.
+
+    The status of each pipeline run is yielded as soon as this node is done with it, so that a pipeline run is passed
+    up to the root of the tree right after its last postprocess step, before the next pipeline starts.
+    """
+    set_logging_context(depth, node.module_info)
+    logging.info(f"Running preprocess for module {node.module_info}")
+
+    preprocessed_data: Any
+    if node.module is None:  # This is the first time this node is visited
+        # Only false if resumed
+        logging.info(f"Creating module instance for {node.module_info}")
+        node.module = factory.create(node.module_info.name, node.module_info.params)
+    if node.preprocess_finished:
+        # Can only be true if resumed
+        # If the preprocess is already finished but the iteration still arrives here, this means that this run is
+        # being resumed from an interrupted state. Some node further down the line interrupted the execution.
+        logging.info(f"Preprocessing of module {node.module_info} already done, skipping")
+        preprocessed_data = node.preprocessed_data
+    else:  # Node is not already finished, preprocessing can begin.
+        if node.interrupted_during_preprocess:
+            # This is one of the nodes that interrupted the execution in a previous run. The upstream data is
+            # replaced by the stored data.
+            upstream_data = node.data_stored_by_preprocess_interrupt
+            # TODO: Check if preprocessed_data can be thrown away here
+        # Modules that were interrupted are waiting for some external event, so their results are never cached. Modules
+        # that are run repeatedly are run to measure their time, which a cached result would defeat.
+        use_cache = node.module.cacheable and not node.interrupted_during_preprocess and not node.repeated
+        cache = options.cache if use_cache else None
+        cache_key = None if cache is None else cache.key(node.module_info, node.module, upstream_data)
+        cached: CachedPreprocess | None = None
+        preprocess_times: list[float] = []
+        measurement = None if options.instrumentation is None else options.instrumentation.measure()
+        profile = None if options.profiler is None else options.profiler.profile(node, "preprocess")
+        try:
+            t1 = perf_counter()
+            with measurement or nullcontext(), profile or nullcontext():
+                if cache is not None and cache_key is not None:
+                    cached = cache.load(cache_key)
+                if cached is None:
+                    # Preprocessing step, every repetition receives the same upstream data
+                    preprocessing_result, preprocess_times = _run_repeatedly(
+                        partial(node.module.preprocess, upstream_data),
+                        node,
+                    )
+                else:
+                    factory.release(node.module_info.name, node.module_info.params, node.module)
+                    node.module = cached.module  # Restores any state the module kept from its preprocess step
+                    preprocessing_result = Data(cached.data)
+        except Exception as e:
+            if options.failfast:
+                raise
+            logging.exception("") # TODO: check if "" can be replaced by e
+            log_step("preprocess_failed", reason=str(e))
+            node.parent = None  # This node and all its descendents failed and can be deleted
+            _release_module(node, reuse=False)
+            yield FailedPipelineRun(reason=str(e), metrics_up_to_now=[], origin=node.position)
+            return
+        match preprocessing_result:
+            case Sleep(
+                stored_data,
+            ):  # This module wants to interrupt the execution and store some data for later
+                node.interrupted_during_preprocess = True
+                node.data_stored_by_preprocess_interrupt = stored_data
+                yield PausedPipelineRun()
+                return
+            case Backtrack(_):
+                # TODO
+                # Instead of going to the downstream nodes, this module wants to backtrack to the parent node
+                # return backtracked_pipeline_run
+                raise NotImplementedError
+            case Failed(reason):
+                logging.error(reason)
+                log_step("preprocess_failed", reason=reason)
+                node.parent = None  # This node and all its descendents failed and can be deleted
+                _release_module(node, reuse=True)
+                yield FailedPipelineRun(reason=reason, metrics_up_to_now=[], origin=node.position)
+                return
+
+            case Data(preprocessed_data):
+                node.preprocess_time = perf_counter() - t1
+                if node.repeated:
+                    node.preprocess_time_stats = timing_statistics(preprocess_times)
+                    node.preprocess_time = node.preprocess_time_stats["median"]
+                if measurement is not None:
+                    node.preprocess_resource_usage = {
+                        **measurement.usage,
+                        "preprocessed_data_size": deep_sizeof(preprocessed_data),
+                    }
+                if profile is not None:
+                    node.preprocess_profile = profile.path.name
+                node.preprocess_circuit_statistics = _circuit_statistics(preprocessed_data)
+                cache_entry = None  # The cache and the key of the entry holding the preprocess result, if any
+                if cache is not None and cache_key is not None:
+                    node.preprocess_cache_hit = cached is not None
+                    if cached is not None:
+                        node.preprocess_time_saved = cached.preprocess_time - node.preprocess_time
+                        logging.info(f"Preprocess for module {node.module_info} loaded from cache")
+                        cache_entry = (cache, cache_key)
+                    elif cache.store(
+                        cache_key,
+                        CachedPreprocess(preprocessed_data, node.module, node.preprocess_time),
+                    ):
+                        cache_entry = (cache, cache_key)
+                logging.info(f"Preprocess for module {node.module_info} took {node.preprocess_time} seconds")
+                log_step("preprocess", seconds=node.preprocess_time, cache_hit=node.preprocess_cache_hit)
+                node.preprocess_finished = True
+                node.preprocessed_data = preprocessed_data
+                if options.journal is not None:
+                    options.journal.record_preprocess(node, cache_entry)
+            case _:
+                msg = "The preprocessing function must return a Result type"
+                raise TypeError(msg)
+
+    paused = False  # Whether any of the pipeline runs passing through this node is sleeping
+    postprocess_raised = False  # Whether the postprocess step raised an exception for any of the pipeline runs
+
+    downstream_results: Iterator[Iterable[PipelineRunStatus]]
+    if not node.children and node.pending_children is None:
+        downstream_results = iter(
+            [[InProgressPipelineRun(downstream_data=None, metrics_up_to_now=[], origin=node.position)]],
+        )
+    elif options.pool is not None and node.num_children > 1:
+        downstream_results = _run_children_in_pool(node, options.pool, preprocessed_data, depth + 1, options)
+    else:
+        downstream_results = (_run_node(child, preprocessed_data, depth + 1, options) for child in node.all_children())
+    # This decides if the recursion continues or stops depending on if there are children left
+    if node.data_stored_by_postprocess_interrupt is not None:
+        downstream_results = chain(downstream_results, iter([node.data_stored_by_postprocess_interrupt]))
+        # Handles postprocessing sleeps
+
+    for downstream_result in downstream_results: # TODO case distinction for backtracked pipeline runs
+        # case backtracked_pipeline_run(data):
+        #     backtrack_result = module.handle_backtrack(data)
+        #     call its own handle_backtrack function (backtracked_pipeline_run.preprocessed_data)
+        # case all good (backtracking over or no backtracking needed):
+        for pipeline_run_status in downstream_result:
+            set_logging_context(depth, node.module_info)
+            match pipeline_run_status:
+                case PausedPipelineRun():
+                    paused = True
+                    yield pipeline_run_status
+                case FailedPipelineRun():
+                    yield pipeline_run_status
+                case InProgressPipelineRun(downstream_data, metrics_up_to_now, origin):
+                    logging.info(f"Running postprocess for module {node.module_info}")
+                    measurement = None if options.instrumentation is None else options.instrumentation.measure()
+                    profile = None if options.profiler is None else options.profiler.profile(node, "postprocess")
+                    try:
+                        with measurement or nullcontext(), profile or nullcontext():
+                            # Postprocessing step
+                            postprocessing_result, postprocess_times = _run_repeatedly(
+                                partial(node.module.postprocess, downstream_data),
+                                node,
+                            )
+                    except Exception as e:
+                        if options.failfast:
+                            raise
+                        logging.exception("")
+                        log_step("postprocess_failed", reason=str(e))
+                        postprocess_raised = True
+                        yield FailedPipelineRun(reason=str(e), metrics_up_to_now=metrics_up_to_now, origin=origin)
+                    else:
+                        match postprocessing_result:
+                            case Sleep(stored_data):
+                                # TODO
+                                raise NotImplementedError
+                            case Backtrack():
+                                # TODO
+                                raise NotImplementedError
+                            case Failed(reason):
+                                logging.error(reason)
+                                log_step("postprocess_failed", reason=reason)
+                                yield FailedPipelineRun(
+                                    reason=reason,
+                                    metrics_up_to_now=metrics_up_to_now,
+                                    origin=origin,
+                                )
+                            case Data(postprocessed_data):
+                                postprocess_time_stats = None
+                                postprocess_time = postprocess_times[-1]
+                                if node.repeated:
+                                    postprocess_time_stats = timing_statistics(postprocess_times)
+                                    postprocess_time = postprocess_time_stats["median"]
+                                logging.info(
+                                    f"Postprocess for module {node.module_info} took {postprocess_time} seconds",
+                                )
+                                log_step("postprocess", seconds=postprocess_time)
+                                module_run_metrics = ModuleRunMetrics.create(
+                                    module_info=node.module_info,
+                                    module=node.module,
+                                    preprocess_time=node.preprocess_time,  # type: ignore
+                                    postprocess_time=postprocess_time,
+                                    preprocess_cache_hit=node.preprocess_cache_hit,
+                                    preprocess_time_saved=node.preprocess_time_saved,
+                                    preprocess_time_stats=node.preprocess_time_stats,
+                                    postprocess_time_stats=postprocess_time_stats,
+                                    preprocess_resource_usage=node.preprocess_resource_usage,
+                                    postprocess_resource_usage=None if measurement is None else measurement.usage,
+                                    preprocess_profile=node.preprocess_profile,
+                                    postprocess_profile=None if profile is None else profile.path.name,
+                                    preprocess_circuit_statistics=node.preprocess_circuit_statistics,
+                                    postprocess_circuit_statistics=_circuit_statistics(postprocessed_data),
+                                )
+                                yield InProgressPipelineRun(
+                                    downstream_data=postprocessed_data,
+                                    metrics_up_to_now=[*metrics_up_to_now, module_run_metrics],
+                                    origin=origin,
+                                )
+                            case _:
+                                msg = "The postprocessing function must return a Result type"
+                                raise TypeError(msg)
+    if not paused:
+        # This node and all its descendents ran or failed and can be deleted. Nodes with sleeping descendents must stay
+        # part of the tree, as it is stored to resume the sleeping pipelines later.
+        node.parent = None
+        _release_module(node, reuse=not postprocess_raised)
+
+
+PipelineRunSink = Callable[[FinishedPipelineRun | FailedPipelineRun], None]
+
+
+def run_pipeline_tree(
+    pipeline_tree: ModuleNode,
+    options: RunOptions | None = None,
+    sink: PipelineRunSink | None = None,
+) -> TreeRunResult:
     """Run pipelines by traversing the given pipeline tree.
 
     The pipeline tree represents one or more pipelines, where each node is a module. A node provides its output to
@@ -184,146 +815,73 @@ def run_pipeline_tree(pipeline_tree: ModuleNode, *, failfast: bool = False) -> T
     recursively in a depth-first manner, storing the result from each preprocess step to re-use as input for each child
     node. The return value of recursively calling a child node includes all metrics from all pipeline runs represented
     by the subtree starting at that child.
-    """
 
-    def imp(
-        node: ModuleNode,
-        upstream_data: Any, # TODO: InterfaceType,
-        depth: int,
-    ) -> list[PipelineRunStatus]:
-        set_logging_depth(depth)
-        logging.info(f"Running preprocess for module {node.module_info}")
-
-        preprocessed_data: Any
-        if node.module is None:  # This is the first time this node is visited
-            # Only false if resumed
-            logging.info(f"Creating module instance for {node.module_info}")
-            node.module = factory.create(node.module_info.name, node.module_info.params)
-        if node.preprocess_finished:
-            # Can only be true if resumed
-            # If the preprocess is already finished but the iteration still arrives here, this means that this run is
-            # being resumed from an interrupted state. Some node further down the line interrupted the execution.
-            logging.info(f"Preprocessing of module {node.module_info} already done, skipping")
-            preprocessed_data = node.preprocessed_data
-        else:  # Node is not already finished, preprocessing can begin.
-            if node.interrupted_during_preprocess:
-                # This is one of the nodes that interrupted the execution in a previous run. The upstream data is
-                # replaced by the stored data.
-                upstream_data = node.data_stored_by_preprocess_interrupt
-                # TODO: Check if preprocessed_data can be thrown away here
-            try:
-                t1 = perf_counter()
-                preprocessing_result = node.module.preprocess(upstream_data)  # Preprocessing step
-            except Exception as e:
-                if failfast:
-                    raise
-                logging.exception("") # TODO: check if "" can be replaced by e
-                return [FailedPipelineRun(reason=str(e), metrics_up_to_now=[])]
-            match preprocessing_result:
-                case Sleep(
-                    stored_data,
-                ):  # This module wants to interrupt the execution and store some data for later
-                    node.interrupted_during_preprocess = True
-                    node.data_stored_by_preprocess_interrupt = stored_data
-                    return [PausedPipelineRun()]
-                case Backtrack(_):
-                    # TODO
-                    # Instead of going to the downstream nodes, this module wants to backtrack to the parent node
-                    # return backtracked_pipeline_run
-                    raise NotImplementedError
-                case Failed(reason):
-                    logging.error(reason)
-                    return [FailedPipelineRun(reason=reason, metrics_up_to_now=[])]
-
-                case Data(preprocessed_data):
-                    node.preprocess_time = perf_counter() - t1
-                    logging.info(f"Preprocess for module {node.module_info} took {node.preprocess_time} seconds")
-                    node.preprocess_finished = True
-                    node.preprocessed_data = preprocessed_data
-                case _:
-                    msg = "The preprocessing function must return a Result type"
-                    raise TypeError(msg)
-
-        results: list[PipelineRunStatus] = []  # Accumulates the return value
-
-        downstream_results = (
-            (imp(child, preprocessed_data, depth + 1) for child in node.children)
-            if node.children
-            else iter([[InProgressPipelineRun(downstream_data=None, metrics_up_to_now=[])]])
-        )
-        # This decides if the recursion continues or stops depending on if there are children left
-        if node.data_stored_by_postprocess_interrupt is not None:
-            downstream_results = chain(downstream_results, iter([node.data_stored_by_postprocess_interrupt]))
-            # Handles postprocessing sleeps
-
-        for downstream_result in downstream_results: # TODO case distinction for backtracked pipeline runs
-            # case backtracked_pipeline_run(data):
-            #     backtrack_result = module.handle_backtrack(data)
-            #     call its own handle_backtrack function (backtracked_pipeline_run.preprocessed_data)
-            # case all good (backtracking over or no backtracking needed):
-            set_logging_depth(depth)
-            for pipeline_run_status in downstream_result:
-                match pipeline_run_status:
-                    case status if isinstance(status, (PausedPipelineRun, FailedPipelineRun)):
-                        results.append(status)
-                    case InProgressPipelineRun(downstream_data, metrics_up_to_now):
-                        logging.info(f"Running postprocess for module {node.module_info}")
-                        try:
-                            t1 = perf_counter()
-                            postprocessing_result = node.module.postprocess(downstream_data)  # Postprocessing step
-                        except Exception as e:
-                            if failfast:
-                                raise
-                            logging.exception("")
-                            results.append(FailedPipelineRun(reason=str(e), metrics_up_to_now=metrics_up_to_now))
-                        else:
-                            match postprocessing_result:
-                                case Sleep(stored_data):
-                                    # TODO
-                                    raise NotImplementedError
-                                case Backtrack():
-                                    # TODO
-                                    raise NotImplementedError
-                                case Failed(reason):
-                                    logging.error(reason)
-                                    results.append(
-                                        FailedPipelineRun(reason=reason, metrics_up_to_now=metrics_up_to_now),
-                                    )
-                                case Data(postprocessed_data):
-                                    postprocess_time = perf_counter() - t1
-                                    logging.info(
-                                        f"Postprocess for module {node.module_info} took {postprocess_time} seconds",
-                                    )
-                                    module_run_metrics = ModuleRunMetrics.create(
-                                        module_info=node.module_info,
-                                        module=node.module,
-                                        preprocess_time=node.preprocess_time,  # type: ignore
-                                        postprocess_time=postprocess_time,
-                                    )
-                                    results.append(
-                                        InProgressPipelineRun(
-                                            downstream_data=postprocessed_data,
-                                            metrics_up_to_now=[*metrics_up_to_now, module_run_metrics],
-                                        ),
-                                    )
-                                case _:
-                                    msg = "The postprocessing function must return a Result type"
-                                    raise TypeError(msg)
-                        node.parent = None  # This node and all its descendents ran or failed and can be deleted
-        return results
-
-    results = imp(pipeline_tree, None, 0)
-
-    finished_pipeline_runs = [
-        FinishedPipelineRun(result=r.downstream_data, steps=r.metrics_up_to_now)
-        for r in results
-        if isinstance(r, InProgressPipelineRun)
-    ]
-
-    if any(isinstance(r, (PausedPipelineRun, FailedPipelineRun)) for r in results):
+    If options.workers is greater than 1, the children of the first node with more than one child are distributed over
+    a pool of that many processes once the node's preprocess step is finished. The pool given by options.pool is used if
+    there is one, otherwise one is started for this tree only. The results are the same as in serial mode and are
+    returned in the same order.
+
+    If a sink is given, each finished or failed pipeline run is passed to it as soon as the postprocess step of the root
+    module returns, instead of being collected in the returned tree run result.
+    """
+    options = options or RunOptions()
+    if options.workers > 1 and options.pool is None:
+        pool = WorkerPool(options.workers)
+        try:
+            return run_pipeline_tree(pipeline_tree, replace(options, pool=pool), sink)
+        finally:
+            pool.close()
+
+    finished_pipeline_runs: list[FinishedPipelineRun] = []
+    failed_pipeline_runs: list[FailedPipelineRun] = []
+    paused = False
+    failed = False
+    for status in _run_node(pipeline_tree, None, 0, options):
+        pipeline_run: FinishedPipelineRun | FailedPipelineRun
+        match status:
+            case PausedPipelineRun():
+                paused = True
+                continue
+            case FailedPipelineRun():
+                failed = True
+                pipeline_run = status
+            case InProgressPipelineRun(downstream_data, metrics_up_to_now, origin):
+                pipeline_run = FinishedPipelineRun(result=downstream_data, steps=metrics_up_to_now, origin=origin)
+        if sink is not None:
+            sink(pipeline_run)
+        elif isinstance(pipeline_run, FinishedPipelineRun):
+            finished_pipeline_runs.append(pipeline_run)
+        else:
+            failed_pipeline_runs.append(pipeline_run)
+
+    if paused or failed:
         return InterruptedTreeRun(
             finished_pipeline_runs=finished_pipeline_runs,
-            failed_pipeline_runs=[x for x in results if isinstance(x, FailedPipelineRun)],
-            rest_tree=(pipeline_tree if any(isinstance(r, PausedPipelineRun) for r in results) else None),
+            failed_pipeline_runs=failed_pipeline_runs,
+            rest_tree=pipeline_tree if paused else None,
         )
     return FinishedTreeRun(finished_pipeline_runs=finished_pipeline_runs)
+
+
+def run_pipeline_trees(
+    pipeline_trees: list[PipelineTree],
+    options: RunOptions | None = None,
+    sink: PipelineRunSink | None = None,
+) -> Iterator[TreeRunResult]:
+    """Run each of the given pipeline trees with run_pipeline_tree, one after another, and yield their results.
+
+    Pending roots, see config_parsing.PendingChildren, are created one at a time, each once the tree of the previous one
+    is run. With more than one worker, a single worker pool is started for all trees, and shut down once they are done.
+    """
+    options = options or RunOptions()
+    if options.workers <= 1 or options.pool is not None:
+        for pipeline_tree in pipeline_trees:
+            roots = [pipeline_tree] if isinstance(pipeline_tree, ModuleNode) else pipeline_tree.create_children(None)
+            for root in roots:
+                yield run_pipeline_tree(root, options, sink)
+        return
+    pool = WorkerPool(options.workers)
+    try:
+        yield from run_pipeline_trees(pipeline_trees, replace(options, pool=pool), sink)
+    finally:
+        pool.close()
@@ -0,0 +1,295 @@
+"""An append-only journal of the progress of a run, allowing it to be resumed after an unclean exit.
+
+Each finished preprocess step and each finished or failed pipeline run is appended to the journal as soon as it is
+done. Resuming from the journal rebuilds the pipeline trees from the config file of the run, removes every node whose
+pipeline runs are all done, and restores the preprocess results of the remaining nodes, so that no completed work is
+repeated.
+
+Every process writes its own journal file, so the worker processes of a run never have to coordinate their writes.
+Records are flushed to the operating system immediately, which is enough to survive a crash of QUARK itself. Syncing
+them to disk, which is needed to survive a crash of the whole machine, is batched to keep journal writes cheap. To keep
+large preprocess results from being written twice, a result that is in the preprocess cache is only journaled as a
+reference to its cache entry, and other results are only journaled up to a maximum size.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import pickle
+import sys
+from dataclasses import dataclass
+from time import monotonic, time_ns
+from typing import IO, TYPE_CHECKING, Any
+
+from quark.benchmarking import ModuleNode
+from quark.results import FailedPipelineRunSummary, FinishedPipelineRunSummary
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from quark.config_parsing import PipelineTree
+    from quark.preprocess_cache import PreprocessCache
+
+JOURNAL_DIR_NAME: str = "journal"
+JOURNAL_FILE_PREFIX: str = "journal-"
+JOURNAL_FILE_SUFFIX: str = ".pkl"
+FSYNC_INTERVAL: float = 5.0  # Maximum time in seconds between syncing journal records to disk
+DEFAULT_MAX_DATA_SIZE: int = 10_000_000  # Maximum size in bytes of a journaled preprocess result, see CheckpointJournal
+
+# Attributes of a ModuleNode that are set by its preprocess step, and therefore journaled and restored
+PREPROCESS_ATTRIBUTES: tuple[str, ...] = (
+    "module",
+    "preprocess_time",
+    "preprocess_time_stats",
+    "preprocess_resource_usage",
+    "preprocess_profile",
+    "preprocess_circuit_statistics",
+    "preprocessed_data",
+    "preprocess_cache_hit",
+    "preprocess_time_saved",
+)
+
+
+class _RecordTooLargeError(Exception):
+    """Raised by _BoundedBuffer once more bytes are written to it than its limit allows."""
+
+
+class _BoundedBuffer(io.BytesIO):
+    """A buffer that a record is pickled into, stopping the pickling as soon as the record exceeds a maximum size."""
+
+    def __init__(self, max_size: int) -> None:
+        super().__init__()
+        self.max_size = max_size
+
+    def write(self, data: Any) -> int:  # noqa: ANN401  Anything supporting the buffer protocol, like BytesIO.write
+        if self.tell() + memoryview(data).nbytes > self.max_size:
+            raise _RecordTooLargeError
+        return super().write(data)
+
+
+class _JournalWriter:
+    """Appends records to one journal file, which is only ever written by a single process."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file: IO[bytes] = path.open("ab")
+        self.last_sync = monotonic()
+
+    def write(self, record: bytes | memoryview) -> None:
+        # Records are pickled by the caller, so that a record that cannot be pickled leaves no partial write behind
+        self.file.write(record)
+        self.file.flush()
+        if monotonic() - self.last_sync >= FSYNC_INTERVAL:
+            os.fsync(self.file.fileno())
+            self.last_sync = monotonic()
+
+    def close(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+# Keyed by the journal directory and the process id, as forked worker processes inherit this dict from their parent
+_writers: dict[tuple[Path, int], _JournalWriter] = {}
+
+
+@dataclass(frozen=True)
+class Replay:
+    """The state recovered from a journal."""
+
+    pipeline_trees: list[PipelineTree]
+    finished_summaries: list[FinishedPipelineRunSummary]
+    failed_summaries: list[FailedPipelineRunSummary]
+
+
+@dataclass(frozen=True)
+class CheckpointJournal:
+    """The journal of a run, stored in a directory inside the run directory.
+
+    Only the path and the size limit are stored in an instance, so it can be sent to worker processes cheaply. The
+    journal file of a process is opened on its first write.
+    """
+
+    directory: Path
+    # Maximum size in bytes of a preprocess record containing the module instance and the preprocessed data
+    max_data_size: int = DEFAULT_MAX_DATA_SIZE
+
+    def _writer(self) -> _JournalWriter:
+        key = (self.directory, os.getpid())
+        if key not in _writers:
+            # Starting the name with the current time sorts journal files in the order they were created
+            file_name = f"{JOURNAL_FILE_PREFIX}{time_ns()}-{os.getpid()}{JOURNAL_FILE_SUFFIX}"
+            _writers[key] = _JournalWriter(self.directory.joinpath(file_name))
+        return _writers[key]
+
+    def record_preprocess(self, node: ModuleNode, cache_entry: tuple[PreprocessCache, str] | None = None) -> None:
+        """Record the finished preprocess step of a node.
+
+        If the result of the step is in the preprocess cache, only the key of its cache entry is recorded, and the
+        module instance and the preprocessed data are loaded from the cache when the journal is replayed. Otherwise,
+        they are recorded themselves, unless the record would be larger than max_data_size. The preprocess step is run
+        again when the run is resumed then.
+
+        :param cache_entry: The preprocess cache holding the result of the step, and the key of its entry, if any
+        """
+        attributes = {attribute: getattr(node, attribute) for attribute in PREPROCESS_ATTRIBUTES}
+        record: tuple
+        if cache_entry is None:
+            record = ("preprocess", node.position, attributes)
+        else:
+            del attributes["module"], attributes["preprocessed_data"]
+            record = ("preprocess_cached", node.position, attributes, cache_entry)
+        buffer = _BoundedBuffer(self.max_data_size if cache_entry is None else sys.maxsize)
+        try:
+            pickle.dump(record, buffer, protocol=pickle.HIGHEST_PROTOCOL)
+        except _RecordTooLargeError:
+            logging.info(f"Preprocess result of module {node.module_info} is too large to be journaled")
+            return
+        except (pickle.PicklingError, TypeError, AttributeError):  # Not every preprocess result can be pickled
+            logging.warning(f"Preprocess result of module {node.module_info} cannot be pickled, not journaling it")
+            return
+        self._writer().write(buffer.getbuffer())
+
+    def record_done(self, origin: str, summary: FinishedPipelineRunSummary | FailedPipelineRunSummary) -> None:
+        """Record a finished or failed pipeline run, identified by the position of the node it originated from."""
+        self._writer().write(pickle.dumps(("done", origin, summary), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def close(self) -> None:
+        """Close the journal file of the current process, syncing all of its records to disk."""
+        writer = _writers.pop((self.directory, os.getpid()), None)
+        if writer is not None:
+            writer.close()
+
+    def files(self) -> list[Path]:
+        """Return all journal files in the order they were created."""
+        return sorted(self.directory.glob(JOURNAL_FILE_PREFIX + "*" + JOURNAL_FILE_SUFFIX))
+
+    def delete(self, files: list[Path] | None = None) -> None:
+        """Delete the given journal files, or all of them if none are given."""
+        self.close()
+        for path in self.files() if files is None else files:
+            path.unlink(missing_ok=True)
+        if files is None and self.directory.is_dir():
+            self.directory.rmdir()
+
+    def _records(self, skipped_files: set[str]) -> list[tuple]:
+        records = []
+        for path in self.files():
+            if path.name in skipped_files:
+                continue
+            with path.open("rb") as f:
+                while True:
+                    start = f.tell()
+                    try:
+                        records.append(pickle.load(f))  # noqa: S301
+                    except (pickle.UnpicklingError, EOFError, ValueError):
+                        # Either the end of the file was reached, or the last record is incomplete, as the process was
+                        # killed while writing it
+                        if f.seek(0, os.SEEK_END) > start:
+                            logging.warning(f"Journal file {path} ends with an incomplete record, ignoring it")
+                        break
+        return records
+
+    def replay(
+        self,
+        pipeline_trees: list[PipelineTree],
+        skipped_files: set[str] | None = None,
+    ) -> Replay:
+        """Apply the records of this journal to the given pipeline trees.
+
+        Pending children and pending roots that records refer to are created, so that only the pipelines of a sweep that
+        are not done are run again, see config_parsing.PendingChildren.
+
+        :param pipeline_trees: The pipeline trees the journaled run started with, which are modified in place
+        :param skipped_files: Names of journal files whose records are already reflected in the pipeline trees
+        :return: The remaining pipeline trees and the summaries of the journaled pipeline runs
+        """
+        records = self._records(skipped_files or set())
+        trees = [tree for tree in pipeline_trees if isinstance(tree, ModuleNode)]
+        pending_roots = [tree for tree in pipeline_trees if not isinstance(tree, ModuleNode)]
+        nodes = {node.position: node for tree in trees for node in (tree, *tree.descendants)}
+
+        def resolve(position: str) -> ModuleNode | None:
+            """Return the node at a position, creating it and its ancestors if they are pending children or roots."""
+            if position in nodes:
+                return nodes[position]
+            parent_position, _, index = position.rpartition(".")
+            if not parent_position:
+                pending = next((pending for pending in pending_roots if int(index) in pending.root_positions()), None)
+                node = None if pending is None else pending.take(int(index) - pending.first_root_position, None)
+            else:
+                parent = resolve(parent_position)
+                if parent is None or parent.pending_children is None:
+                    return None
+                node = parent.pending_children.take(int(index), parent)
+            if node is not None:
+                nodes[position] = node
+            return node
+
+        finished_summaries = []
+        failed_summaries = []
+
+        # Pipeline runs are replayed first, so that no preprocess result is restored for a node that is removed anyway
+        for record in records:
+            match record:
+                case ("done", origin, summary):
+                    match summary:
+                        case FinishedPipelineRunSummary():
+                            finished_summaries.append(summary)
+                        case FailedPipelineRunSummary():
+                            failed_summaries.append(summary)
+                    node = resolve(origin)
+                    if node is None:  # Already removed, or not part of the given pipeline trees
+                        continue
+                    # The origin is a leaf, unless its preprocess step failed, which failed all of its descendants too.
+                    # Either way, every pipeline run through it is done, as are the runs through all of its ancestors
+                    # that are left without children.
+                    for descendant in node.descendants:
+                        nodes.pop(descendant.position, None)
+                    node.children = []
+                    node.pending_children = None
+                    while node is not None and not node.num_children:
+                        parent = node.parent
+                        node.parent = None
+                        nodes.pop(node.position, None)
+                        node = parent
+
+        for record in records:
+            match record:
+                case ("preprocess", position, attributes):
+                    node = resolve(position)
+                case ("preprocess_cached", position, attributes, (cache, key)):
+                    node = resolve(position)
+                    entry = None if node is None else cache.load(key)
+                    if entry is None:  # The entry was evicted since, so the preprocess step is run again
+                        continue
+                    attributes = {**attributes, "module": entry.module, "preprocessed_data": entry.data}
+                case _:
+                    continue
+            if node is None:
+                continue
+            for attribute, value in attributes.items():
+                setattr(node, attribute, value)
+            node.preprocess_finished = True
+            # An interruption in a previous run is overridden by the finished preprocess step
+            node.interrupted_during_preprocess = False
+            node.data_stored_by_preprocess_interrupt = None
+
+        remaining_trees: list[PipelineTree] = []
+        for tree in pipeline_trees:
+            if isinstance(tree, ModuleNode):
+                if tree.position in nodes:
+                    remaining_trees.append(tree)
+                continue
+            # The roots created for the records are run before those still pending
+            positions = (str(tree.first_root_position + index) for index in sorted(tree.taken))
+            remaining_trees.extend(nodes[position] for position in positions if position in nodes)
+            if tree.remaining:
+                remaining_trees.append(tree)
+        return Replay(
+            pipeline_trees=remaining_trees,
+            finished_summaries=finished_summaries,
+            failed_summaries=failed_summaries,
+        )
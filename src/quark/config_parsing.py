@@ -1,22 +1,29 @@
+from __future__ import annotations
+
 import functools
+import math
 import operator
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any
-
-import yaml
+from typing import TYPE_CHECKING, Any
 
 from quark.benchmarking import ModuleInfo, ModuleNode
+from quark.sweeps import SWEEP_SETTINGS, Sweep
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from quark.plugin_manager.loader import PluginSpec
 
 
 @dataclass(frozen=True)
 class Config:
     """A wrapper for the relevant config data, parsed from a config yml file."""
 
-    plugins: list[str]
+    plugins: list[PluginSpec]  # Plugins given with the names of their modules are only imported when needed
     # Parsing directly to trees in form of ModuleNodes introduces some unfortunate coupling to the benchmarking module.
     # However, doing so prevents returning pipeline_trees in form of some ugly intermediate type.
-    pipeline_trees: list[ModuleNode]
+    pipeline_trees: list[PipelineTree]
 
 
 # ====== Types allowed to use in the configuration file ======
@@ -26,13 +33,41 @@ class Config:
 # A pipeline module can be specified in two ways:
 # -A single string is interpreted as a single module without parameters
 # -A dictionary with a single key-value pair is interpreted as a single module where the value is another dictionary
-# containing the parameters
+# containing the parameters. The dictionary can additionally contain timing settings, see TIMING_SETTINGS, and sweep
+# settings, see sweeps.SWEEP_SETTINGS.
 ModuleFormat = str | dict[str, dict[str, Any]]
 
 # If one layer of the pipeline consists of multiple modules, each one describes a separate pipeline
 PipelineLayer = ModuleFormat | list[ModuleFormat]
+
+# A pipeline is either given as a list of layers, or as a dictionary containing this list under the "pipeline" key,
+# together with timing settings for the last module of each pipeline described by it
+PipelineFormat = list[PipelineLayer] | dict[str, Any]
 # ============================================================
 
+# Keys of the timing settings, which can be given for a single module, for a pipeline, or at the top level of the config
+# file for all pipelines. Settings of a module override those of its pipeline, which override the top level ones.
+# -repetitions: How often the pre- and postprocess steps of a module are run and measured
+# -warmup: How often they are run beforehand without being measured
+TIMING_SETTINGS: tuple[str, ...] = ("repetitions", "warmup")
+
+
+def _init_timing_settings(data: dict[str, Any]) -> dict[str, int]:
+    """Extract the timing settings from a module, pipeline or config dictionary.
+
+    :param data: A dictionary that may contain any of the keys in TIMING_SETTINGS
+    :return: A dictionary containing only the timing settings found
+    """
+    settings = {key: data[key] for key in TIMING_SETTINGS if key in data}
+    match settings:
+        case {"repetitions": repetitions} if not isinstance(repetitions, int) or repetitions < 1:
+            msg = f"repetitions must be a positive integer, got {repetitions}"
+            raise ValueError(msg)
+        case {"warmup": warmup} if not isinstance(warmup, int) or warmup < 0:
+            msg = f"warmup must be a non-negative integer, got {warmup}"
+            raise ValueError(msg)
+    return settings
+
 
 def _init_module_info(module: ModuleFormat) -> ModuleInfo:
     """Create a ModuleInfo object from data adhering to ModuleFormat.
@@ -46,7 +81,7 @@ def _init_module_info(module: ModuleFormat) -> ModuleInfo:
         case str():  # Single module
             return ModuleInfo(name=module, params={})
         case dict():  # Single module with parameters
-            name = next(iter(module))
+            name = next(key for key in module if key not in TIMING_SETTINGS + SWEEP_SETTINGS)
             params = module[name]
             return ModuleInfo(name=name, params=params)
         case _:
@@ -54,7 +89,203 @@ def _init_module_info(module: ModuleFormat) -> ModuleInfo:
             raise TypeError(msg)
 
 
-def _init_pipeline_trees(pipeline: list[PipelineLayer]) -> list[ModuleNode]:
+def _init_sweep(module: ModuleFormat) -> Sweep | None:
+    """Create the sweep of a module from data adhering to ModuleFormat, or return None if the module is not swept."""
+    if not isinstance(module, dict) or not any(key in module for key in SWEEP_SETTINGS):
+        return None
+    return Sweep.from_settings(_init_module_info(module).params or {}, module)
+
+
+def _init_module_node(
+    module: ModuleFormat,
+    parent: ModuleNode | None,
+    leaf_timing_settings: dict[str, int] | None,
+    module_info: ModuleInfo | None = None,
+) -> ModuleNode:
+    """Create a ModuleNode from data adhering to ModuleFormat.
+
+    :param module: Data adhering to ModuleFormat
+    :param parent: The parent node, or None for a root node
+    :param leaf_timing_settings: The timing settings of the pipeline if the node is the last one of it, otherwise None
+    :param module_info: The module information of the node, if it differs from the one given by the module, e.g. for
+        one combination of the parameters of a sweep
+    :return: The created node
+    """
+    node = ModuleNode(module_info or _init_module_info(module), parent)
+    settings = {**(leaf_timing_settings or {}), **(_init_timing_settings(module) if isinstance(module, dict) else {})}
+    node.repetitions = settings.get("repetitions", node.repetitions)
+    node.warmup = settings.get("warmup", node.warmup)
+    return node
+
+
+# A layer of a pipeline containing parameter sweeps, each module given together with its sweep, or None if not swept
+SweptLayer = list[tuple[ModuleFormat, Sweep | None]]
+
+
+@dataclass
+class PendingChildren:
+    """The children of a node that are only created once they are run, one at a time.
+
+    Used for the pipelines of a config file containing parameter sweeps, whose pipeline trees would be too large to be
+    created before running them. Every layer of such a pipeline below its first one is described by the config data of
+    its modules instead of by nodes, so that a pipeline tree only ever holds the path to the node that is currently run,
+    plus the nodes that are sleeping.
+
+    The roots of such pipelines are pending as well, being created with no parent while the pipeline trees are run, see
+    benchmarking.run_pipeline_trees. This way, the first layer of a pipeline is not created up front either.
+
+    The children are numbered in the order they are created, which is the order of the modules of the layer, the
+    combinations of the sweep of each module being created in the order given by sweeps.Sweep. A child is given the
+    position of its parent followed by its index, and a root the index of the first root plus its index, so that it is
+    the same whenever the config file is parsed.
+    """
+
+    layers: list[SweptLayer]  # The remaining layers of the pipeline, the first one being that of the children
+    timing_settings: dict[str, int]  # The timing settings of the pipeline, which apply to the modules of its last layer
+    # Only the pipelines start..stop, as numbered in traversal order, are run. Set when the pipelines are sharded.
+    start: int = 0
+    stop: int | None = None
+    next_index: int = 0  # All children with a lower index were created already
+    taken: set[int] = field(default_factory=set)  # Indices of children created out of order, see take
+    first_root_position: int = 0  # Position of the first child if the children are roots, set by _assign_positions
+
+    def layer_sizes(self) -> list[int]:
+        """Return the number of nodes each node of a layer has as its children, starting with the layer above the first.
+
+        This is also the number of children created by this instance, followed by the number of children created by
+        each of its descendants.
+        """
+        return [sum(1 if sweep is None else len(sweep) for _, sweep in layer) for layer in self.layers]
+
+    def layer_modules(self, depth: int) -> Iterator[tuple[ModuleInfo, Sweep | None, int]]:
+        """Yield every module of one layer, without creating a node for any combination of its sweep.
+
+        :param depth: The index of the layer, 0 being the layer of the children
+        :return: The module information, i.e. the parameters that are not swept, the sweep of the module, or None if it
+            is not swept, and how often each of its steps is run, counting warmup runs and repetitions
+        """
+        leaf_timing_settings = {} if self.layers[depth + 1 :] else self.timing_settings
+        for module, sweep in self.layers[depth]:
+            module_timing_settings = _init_timing_settings(module) if isinstance(module, dict) else {}
+            settings = {**leaf_timing_settings, **module_timing_settings}
+            yield _init_module_info(module), sweep, settings.get("warmup", 0) + settings.get("repetitions", 1)
+
+    @property
+    def num_children(self) -> int:
+        """Return the number of children, including those outside of start..stop."""
+        return self.layer_sizes()[0]
+
+    @property
+    def pipelines_per_child(self) -> int:
+        """Return the number of pipelines passing through each child."""
+        return math.prod(self.layer_sizes()[1:])
+
+    @property
+    def num_pipelines(self) -> int:
+        """Return the number of pipelines passing through the children that were not created yet."""
+        per_child = self.pipelines_per_child
+        stop = self.num_children * per_child if self.stop is None else self.stop
+        first = max(self.next_index, self.start // per_child)
+        return max(stop - max(self.start, first * per_child), 0) - sum(
+            min(stop, (i + 1) * per_child) - max(self.start, i * per_child) for i in self.taken if i >= first
+        )
+
+    @property
+    def num_nodes(self) -> int:
+        """Return the number of nodes created for the pipelines start..stop, i.e. the children and their descendants.
+
+        Only valid before any child is created, e.g. to plan a run.
+        """
+        sizes = self.layer_sizes()
+        stop = math.prod(sizes) if self.stop is None else self.stop
+        if stop <= self.start:
+            return 0
+        # Every node of a layer has the same number of pipelines passing through it
+        per_node = [math.prod(sizes[depth + 1 :]) for depth in range(len(sizes))]
+        return sum((stop - 1) // n - self.start // n + 1 for n in per_node)
+
+    @property
+    def remaining(self) -> int:
+        """Return the number of children that were not created yet."""
+        first, stop = self._index_range()
+        first = max(first, self.next_index)
+        return max(stop - first, 0) - len([i for i in self.taken if i >= first])
+
+    def _index_range(self) -> tuple[int, int]:
+        """Return the indices of the first child, and of the one after the last, within start..stop."""
+        per_child = self.pipelines_per_child
+        if self.stop is None:
+            return self.start // per_child, self.num_children
+        return self.start // per_child, -(-self.stop // per_child)
+
+    def root_positions(self) -> range:
+        """Return the positions of the children within start..stop, if the children are roots."""
+        first, stop = self._index_range()
+        return range(self.first_root_position + first, self.first_root_position + stop)
+
+    def restrict(self, start: int, stop: int) -> None:
+        """Only run the pipelines start..stop of those not run otherwise, before any child is created."""
+        self.start, self.stop = self.start + start, self.start + stop
+
+    def _locate(self, index: int) -> tuple[ModuleFormat, Sweep | None, int]:
+        """Return the module of the child with the given index, its sweep, and the index within the sweep."""
+        for module, sweep in self.layers[0]:
+            size = 1 if sweep is None else len(sweep)
+            if index < size:
+                return module, sweep, index
+            index -= size
+        message = f"Child index out of range, there are only {self.num_children} children"
+        raise IndexError(message)
+
+    def _create(self, index: int, parent: ModuleNode | None) -> ModuleNode:
+        """Create the child with the given index and attach it to the given parent."""
+        module, sweep, i = self._locate(index)
+        module_info = None if sweep is None else ModuleInfo(name=_init_module_info(module).name, params=sweep[i])
+        node = _init_module_node(module, parent, None if self.layers[1:] else self.timing_settings, module_info)
+        node.position = f"{parent.position}.{index}" if parent is not None else str(self.first_root_position + index)
+        if self.layers[1:]:
+            per_child = self.pipelines_per_child
+            node.pending_children = PendingChildren(self.layers[1:], self.timing_settings)
+            start = max(self.start - index * per_child, 0)
+            stop = per_child if self.stop is None else min(self.stop - index * per_child, per_child)
+            if (start, stop) != (0, per_child):
+                node.pending_children.restrict(start, stop)
+        return node
+
+    def create_children(self, parent: ModuleNode | None) -> Iterator[ModuleNode]:
+        """Create the children that were not created yet, one at a time, each attached to the given parent.
+
+        A child is only created once the previous one was consumed, so that it can be run, and deleted afterward, before
+        the next one is created.
+        """
+        first, stop = self._index_range()
+        for index in range(max(first, self.next_index), stop):
+            self.next_index = index + 1
+            if index not in self.taken:
+                yield self._create(index, parent)
+
+    def take(self, index: int, parent: ModuleNode | None) -> ModuleNode | None:
+        """Create the child with the given index out of order and attach it to the parent, e.g. to replay a journal.
+
+        If the children are roots, the parent is None.
+
+        :return: The child, or None if it was created before or is not within start..stop
+        """
+        first, stop = self._index_range()
+        if index < max(first, self.next_index) or index >= stop or index in self.taken:
+            return None
+        self.taken.add(index)
+        return self._create(index, parent)
+
+
+# A pipeline tree as created from the config file, or the pending roots of the pipeline trees of a sweep
+PipelineTree = ModuleNode | PendingChildren
+
+
+def _init_pipeline_trees(
+    pipeline: list[PipelineLayer],
+    timing_settings: dict[str, int] | None = None,
+) -> list[PipelineTree]:
     """Create pipeline trees from lists of data adhering to PipelineLayer.
 
     Each layer of a pipeline defined in the config file can contain one or more modules.
@@ -64,6 +295,11 @@ def _init_pipeline_trees(pipeline: list[PipelineLayer]) -> list[ModuleNode]:
     # Shouldn't it be "iteratively" instead of "recursively"? A: Logically, yes, this is what is happening. But the
     # implementation works recursively
 
+    The timing settings of the pipeline are applied to the modules of the last layer.
+
+    If any module of the pipeline is swept, see sweeps.Sweep, no node is created. Instead, the pending roots of the
+    pipeline trees are returned, one for every module of the first layer and every combination of its sweep, which are
+    only created while running, as are the further layers, see PendingChildren.
     """
 
     # TODO rewrite to simple for-loop
@@ -73,13 +309,18 @@ def _init_pipeline_trees(pipeline: list[PipelineLayer]) -> list[ModuleNode]:
                 return
             case [layer, *rest]:
                 for module in layer:
-                    module_info = _init_module_info(module)
                     # TODO write about the side effect of setting the children and parent variables by AnyTree
-                    node = ModuleNode(module_info, parent)
+                    node = _init_module_node(module, parent, None if rest else timing_settings)
                     imp(rest, parent=node)
 
     pipeline = [layer if isinstance(layer, list) else [layer] for layer in pipeline]  # <- pipeline is converted here
-    pipeline_trees = [ModuleNode(_init_module_info(layer)) for layer in pipeline[0]]
+    swept_layers = [[(module, _init_sweep(module)) for module in layer] for layer in pipeline]  # type: ignore
+    if any(sweep is not None for layer in swept_layers for _, sweep in layer):
+        return [PendingChildren(swept_layers, timing_settings or {})]
+    pipeline_trees = [
+        _init_module_node(layer, None, None if pipeline[1:] else timing_settings)  # type: ignore
+        for layer in pipeline[0]
+    ]
     for node in pipeline_trees:
         imp(pipeline[1:], parent=node)  # type: ignore
     # Why "type: ignore"? A: Pyright is not smart enough to realize that pipeline has the required type at this point.
@@ -89,23 +330,99 @@ def _init_pipeline_trees(pipeline: list[PipelineLayer]) -> list[ModuleNode]:
     return pipeline_trees
 
 
+def _merge_pipeline_trees(pipeline_trees: list[PipelineTree]) -> list[PipelineTree]:
+    """Merge pipeline trees that start with the same module into one tree.
+
+    Two nodes are merged if they have the same module information and timing settings, and both have children. The
+    merged node keeps the children of both, which are in turn merged recursively. This way, a prefix shared by several
+    pipelines is only run once, and its output is passed to every branch. Nodes without children are never merged, as
+    each of them represents a pipeline of its own. Neither are pending roots, which are not created yet.
+
+    :param pipeline_trees: Pipeline trees in the order given by the config file
+    :return: The merged pipeline trees, keeping the order in which each module appeared first
+    """
+    merged_trees: list[PipelineTree] = []
+    for tree in pipeline_trees:
+        if isinstance(tree, PendingChildren):
+            merged_trees.append(tree)
+            continue
+        match next(
+            (
+                m
+                for m in merged_trees
+                if isinstance(m, ModuleNode)
+                and m.children
+                and tree.children
+                and (m.module_info, m.repetitions, m.warmup) == (tree.module_info, tree.repetitions, tree.warmup)
+            ),
+            None,
+        ):
+            case None:
+                merged_trees.append(tree)
+            case merged_tree:
+                children = [*merged_tree.children, *tree.children]
+                tree.children = []
+                merged_tree.children = _merge_pipeline_trees(children)  # type: ignore
+    return merged_trees
+
+
+def _assign_positions(nodes: list[PipelineTree], prefix: str = "") -> None:
+    """Give every node a position made of its index and the indices of its ancestors, e.g. "0.2.1".
+
+    Pending roots are counted as the number of roots they create, which are given their positions once created.
+    Parsing the same config file always results in the same positions, which allows a run to be resumed from the config
+    file and a checkpoint journal referring to nodes by their position.
+    """
+    i = 0
+    for node in nodes:
+        if isinstance(node, PendingChildren):
+            node.first_root_position = i
+            i += node.num_children
+            continue
+        node.position = f"{prefix}{i}"
+        i += 1
+        _assign_positions(list(node.children), prefix=f"{node.position}.")
+
+
 def parse_config(path: str) -> Config:
     """Parse the config to sync formatting."""
+    import yaml  # noqa: PLC0415  # Only imported when a config file is parsed, to keep the startup of quark fast
+
     with Path(path).open() as file:
         data = yaml.load(file, Loader=yaml.FullLoader)  # noqa: S506
-        pipeline_layers_lists: list[list[PipelineLayer]] = []
+        pipelines: list[PipelineFormat] = []
         if "pipelines" in data:
-            pipeline_layers_lists = data["pipelines"]
+            pipelines = data["pipelines"]
         elif "pipeline" in data:
-            pipeline_layers_lists = [data["pipeline"]]
+            pipelines = [data["pipeline"]]
         else:
             message = "No pipeline found in configuration file"
             raise ValueError(message)
 
+        # The timing settings at the top level apply to every pipeline, unless overridden by the pipeline itself
+        default_timing_settings = _init_timing_settings(data)
+        pipeline_layers_lists: list[tuple[list[PipelineLayer], dict[str, int]]] = []
+        for pipeline in pipelines:
+            match pipeline:
+                case {"pipeline": pipeline_layers}:
+                    timing_settings = {**default_timing_settings, **_init_timing_settings(pipeline)}
+                    pipeline_layers_lists.append((pipeline_layers, timing_settings))
+                case list():
+                    pipeline_layers_lists.append((pipeline, default_timing_settings))
+                case _:
+                    message = "The config file is not in the correct format"
+                    raise TypeError(message)
+
         # TODO more documentation for this line in particular or rewrite into more clear syntax with for loop or such
         pipeline_trees = functools.reduce(
             operator.iadd,
-            (_init_pipeline_trees(pipeline_layers) for pipeline_layers in pipeline_layers_lists),
+            (
+                _init_pipeline_trees(pipeline_layers, timing_settings)
+                for pipeline_layers, timing_settings in pipeline_layers_lists
+            ),
             [],
         )
+        # Pipelines sharing a common prefix are merged, so that the shared modules are only run once
+        pipeline_trees = _merge_pipeline_trees(pipeline_trees)
+        _assign_positions(pipeline_trees)
         return Config(plugins=data["plugins"], pipeline_trees=pipeline_trees)
@@ -10,7 +10,7 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, ClassVar
 
 if TYPE_CHECKING:
     from quark.interface_types import InterfaceType
@@ -57,6 +57,16 @@ Result = Sleep | Backtrack | Data | Failed
 class Core(ABC):
     """Core module interface, implemented by all other modules that are part of a benchmarking pipeline."""
 
+    # Whether the result of the preprocess step may be stored in the preprocess cache and reused in later runs. Modules
+    # whose preprocess output is not fully determined by their parameters and upstream data should set this to False.
+    cacheable: ClassVar[bool] = True
+
+    # Whether an instance may be reused by other nodes with the same module name and parameters once its own node is
+    # done, instead of creating a new instance for every node, see plugin_manager.factory. Modules whose creation is
+    # expensive, e.g. because they set up a solver backend or load a model, can set this to True. Their preprocess step
+    # must then not depend on any state left over from the node the instance was used by before.
+    reusable: ClassVar[bool] = False
+
     @abstractmethod
     def preprocess(self, data: Any) -> Result:
         """Essential method for the benchmarking process.
@@ -91,6 +101,13 @@ class Core(ABC):
         """
         return {}
 
+    def release_resources(self) -> None:  # noqa: B027  Overriding it is optional
+        """Release the resources held by an instance of a reusable module, e.g. a connection to a solver backend.
+
+        Is called when the instance is evicted from the pool of reusable instances, and will not be used again. This
+        happens when the pool is full, and for all instances left in the pool when QUARK exits.
+        """
+
     def get_unique_name(self) -> str | None:
         """Return a string representation of the module to be used in the file names for benchmark results.
 
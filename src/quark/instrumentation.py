@@ -0,0 +1,133 @@
+# ruff: noqa: ANN401
+
+"""Measuring the resources used by the pre- and postprocess steps of modules, beyond their wall-clock time.
+
+Instrumentation is optional. If it is disabled, none of the functions in this module are called while running a
+pipeline, so it adds no overhead.
+"""
+
+from __future__ import annotations
+
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from time import process_time
+from types import FunctionType, MethodType, ModuleType
+from typing import TYPE_CHECKING, Any, Self
+
+if TYPE_CHECKING:
+    from types import TracebackType
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# ru_maxrss is given in kilobytes on Linux, but in bytes on macOS
+_MAXRSS_UNIT: int = 1 if sys.platform == "darwin" else 1024
+
+# Allocations made by QUARK itself, e.g. while measuring, are not reported as allocation sites of the measured step
+_EXCLUDED_ALLOCATION_SITES: list[tracemalloc.Filter] = [
+    tracemalloc.Filter(inclusive=False, filename_pattern=tracemalloc.__file__),
+    tracemalloc.Filter(inclusive=False, filename_pattern=str(Path(__file__).parent.joinpath("*"))),
+]
+
+# Objects that are shared by everything in the interpreter are not counted as part of some data
+_NOT_COUNTED = (type, ModuleType, FunctionType, MethodType)
+
+
+def deep_sizeof(obj: Any) -> int:
+    """Estimate the memory used by an object and everything it references, in bytes.
+
+    Containers, dicts and the attributes of objects are followed, counting each object once. The estimate relies on
+    sys.getsizeof, which includes the buffers of numpy arrays owning their data, but not of arrays that are views.
+    """
+    seen: set[int] = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _NOT_COUNTED):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o, 0)
+        match o:
+            case str() | bytes() | bytearray() | int() | float() | complex() | bool() | None:
+                pass
+            case dict():
+                stack.extend(o.keys())
+                stack.extend(o.values())
+            case list() | tuple() | set() | frozenset():
+                stack.extend(o)
+            case _:
+                if hasattr(o, "__dict__"):
+                    stack.append(vars(o))
+                stack.extend(getattr(o, slot) for slot in getattr(type(o), "__slots__", ()) if hasattr(o, slot))
+    return total
+
+
+def _max_rss() -> int | None:
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+@dataclass(frozen=True)
+class Instrumentation:
+    """Settings of the instrumentation, shared by every step of a run."""
+
+    trace_allocations: bool = False  # Tracing allocations with tracemalloc slows down the measured steps noticeably
+    top_allocations: int = 5  # Number of allocation sites reported when tracing allocations
+
+    def measure(self) -> StepMeasurement:
+        """Return a context manager measuring the resources used by the step run inside of it."""
+        return StepMeasurement(self)
+
+
+class StepMeasurement:
+    """Measures the resources used by one pre- or postprocess step.
+
+    The measured values are available in the usage dict after the context is left:
+    -cpu_time: CPU time of the process in seconds, including all threads
+    -peak_rss_increase: How much the peak resident memory of the process grew in bytes, None if unknown. It is zero if
+    the step used less memory than some earlier step, as the operating system only reports the overall peak.
+    -allocation_peak: The peak memory allocated by Python during the step in bytes, only if allocations are traced
+    -top_allocations: The lines of code with the most memory still allocated at the end of the step, as strings, only
+    if allocations are traced
+    """
+
+    def __init__(self, instrumentation: Instrumentation) -> None:  # noqa: D107
+        self.instrumentation = instrumentation
+        self.usage: dict[str, Any] = {}
+        self._started_tracing = False
+
+    def __enter__(self) -> Self:  # noqa: D105
+        if self.instrumentation.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        self._max_rss = _max_rss()
+        self._cpu_time = process_time()
+        return self
+
+    def __exit__(  # noqa: D105
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.usage["cpu_time"] = process_time() - self._cpu_time
+        max_rss = _max_rss()
+        self.usage["peak_rss_increase"] = (
+            None if max_rss is None or self._max_rss is None else max(0, max_rss - self._max_rss)
+        )
+        if self.instrumentation.trace_allocations:
+            self.usage["allocation_peak"] = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot().filter_traces(_EXCLUDED_ALLOCATION_SITES)
+            self.usage["top_allocations"] = [
+                str(statistic) for statistic in snapshot.statistics("lineno")[: self.instrumentation.top_allocations]
+            ]
+            if self._started_tracing:
+                tracemalloc.stop()
@@ -1,9 +1,64 @@
-from quark.interface_types.graph import Graph
-from quark.interface_types.ising import Ising
-from quark.interface_types.lp import LP
-from quark.interface_types.other import Other
-from quark.interface_types.qubo import Qubo
-from quark.interface_types.circuit import Circuit
-from quark.interface_types.quantum_result import SampleDistribution
-
-InterfaceType = Graph | Ising | Other | Qubo | Circuit | LP | SampleDistribution | None
+# ruff: noqa: ANN401
+
+"""The data types passed between modules.
+
+Each interface type is only imported when it is first accessed, as some of them depend on heavy packages like numpy,
+which should not be imported by every process that imports quark.
+"""
+
+import importlib
+import operator
+from functools import reduce
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from quark.interface_types.circuit import Circuit, CircuitBatch
+    from quark.interface_types.graph import Graph
+    from quark.interface_types.ising import Ising
+    from quark.interface_types.lp import LP
+    from quark.interface_types.other import Other
+    from quark.interface_types.quantum_result import SampleDistribution, SampleDistributionBatch
+    from quark.interface_types.qubo import Qubo
+
+    InterfaceType = (
+        Graph | Ising | Other | Qubo | Circuit | CircuitBatch | LP | SampleDistribution | SampleDistributionBatch | None
+    )
+
+# The submodule defining each interface type
+_MODULES: dict[str, str] = {
+    "Graph": "graph",
+    "Ising": "ising",
+    "Other": "other",
+    "Qubo": "qubo",
+    "Circuit": "circuit",
+    "CircuitBatch": "circuit",
+    "LP": "lp",
+    "SampleDistribution": "quantum_result",
+    "SampleDistributionBatch": "quantum_result",
+}
+
+__all__ = [
+    "LP",
+    "Circuit",
+    "CircuitBatch",
+    "Graph",
+    "InterfaceType",
+    "Ising",
+    "Other",
+    "Qubo",
+    "SampleDistribution",
+    "SampleDistributionBatch",
+]
+
+
+def __getattr__(name: str) -> Any:
+    """Import an interface type, or all of them for InterfaceType, when it is first accessed."""
+    if name == "InterfaceType":
+        value = reduce(operator.or_, (__getattr__(type_name) for type_name in _MODULES)) | None
+    elif name in _MODULES:
+        value = getattr(importlib.import_module(f"{__name__}.{_MODULES[name]}"), name)
+    else:
+        message = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(message)
+    globals()[name] = value
+    return value
@@ -1,9 +1,245 @@
 from __future__ import annotations
 
+import os
+import re
+from collections import Counter
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
 
 from quark.interface_types.quantum_result import SampleDistribution
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# Comments, statement delimiters and braces, and runs of any other text, in the order they appear in a QASM string
+_TOKEN = re.compile(r"//[^\n]*|/\*.*?(?:\*/|\Z)|[;{}]|[^;{}/]+|/", re.DOTALL)
+_NAME = re.compile(r"[A-Za-z_$][\w$]*")
+_DECLARATION = re.compile(r"(?:(?:input|output)\s+)?(qreg|creg|qubit|bit)\b\s*(?:\[\s*(\d+)\s*\])?\s*(.*)", re.DOTALL)
+_OPERAND = re.compile(r"([A-Za-z_$][\w$]*)\s*(?:\[\s*(\d+)\s*\])?")
+# The most common form of statement, a gate applied to single qubits, like rz(pi/2) q[0] or cx q[0], q[1]
+_INDEXED_OPERAND = r"[A-Za-z_]\w*\s*\[\s*\d+\s*\]"
+_SIMPLE_GATE = re.compile(rf"([A-Za-z_]\w*)\s*(?:\([^()]*\))?\s*({_INDEXED_OPERAND}(?:\s*,\s*{_INDEXED_OPERAND})*)")
+_INDEXED_OPERANDS = re.compile(r"([A-Za-z_]\w*)\s*\[\s*(\d+)\s*\]")
+
+# Statements that neither declare registers nor apply operations to qubits
+_NON_OPERATIONS = frozenset(
+    (
+        "OPENQASM",
+        "include",
+        "gate",
+        "opaque",
+        "def",
+        "defcal",
+        "cal",
+        "defcalgrammar",
+        "const",
+        "let",
+        "int",
+        "uint",
+        "float",
+        "angle",
+        "bool",
+        "duration",
+        "stretch",
+        "complex",
+        "array",
+        "extern",
+        "return",
+        "break",
+        "continue",
+        "end",
+        "box",
+        "pragma",
+        "for",
+        "while",
+        "if",
+        "else",
+        "switch",
+        "case",
+        "default",
+    ),
+)
+# Statements whose block is a definition, not part of the circuit, so the operations inside it are not counted
+_DEFINITIONS = frozenset(("gate", "opaque", "def", "defcal", "cal", "extern"))
+
+
+def _statements(qasm_string: str) -> Iterator[str]:
+    """Yield the statements of a QASM string one after another, without comments and gate definitions.
+
+    The string is scanned once, without creating a list of all lines or statements. A statement that opens a block,
+    like an if or a for loop, is yielded as the text before the brace, followed by the statements inside the block.
+    """
+    statement: list[str] = []
+    skipped_depth = 0  # Nesting depth inside a definition whose statements are skipped
+    for match in _TOKEN.finditer(qasm_string):
+        lexeme = match.group()
+        if lexeme.startswith(("//", "/*")):
+            continue
+        if lexeme == "{":
+            text = "".join(statement).strip()
+            statement.clear()
+            name = _NAME.match(text)
+            if skipped_depth or (name is not None and name.group() in _DEFINITIONS):
+                skipped_depth += 1
+            elif text:
+                yield text
+        elif lexeme == "}":
+            skipped_depth = max(0, skipped_depth - 1)
+            statement.clear()
+        elif lexeme == ";":
+            text = "".join(statement).strip()
+            statement.clear()
+            if text and not skipped_depth:
+                yield text
+        else:
+            statement.append(lexeme)
+
+
+def _split_parameters(text: str) -> str:
+    """Remove a parenthesized parameter list, which may contain nested parentheses, from the start of the text."""
+    if not text.startswith("("):
+        return text
+    depth = 0
+    for i, char in enumerate(text):
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        if depth == 0:
+            return text[i + 1 :]
+    return ""
+
+
+@dataclass(frozen=True)
+class CircuitStatistics:
+    """Structural statistics of a circuit, see Circuit.statistics.
+
+    Operations applied to whole registers are counted once per qubit, or pair of qubits, they are applied to. Barriers
+    are counted in the gate histogram, but are neither two-qubit gates nor part of the depth.
+    """
+
+    num_qubits: int
+    num_clbits: int
+    gate_counts: dict[str, int]  # Number of operations with each name, including measure, reset, and barrier
+    two_qubit_gates: int  # Number of operations acting on exactly two qubits
+    depth: int  # Number of layers of operations, where each qubit is used at most once per layer
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the statistics as a dictionary, e.g. to include them in the metrics of a module."""
+        return {
+            "num_qubits": self.num_qubits,
+            "num_clbits": self.num_clbits,
+            "gate_counts": dict(self.gate_counts),
+            "two_qubit_gates": self.two_qubit_gates,
+            "depth": self.depth,
+        }
+
+
+class _StatisticsCollector:
+    """Collects the statistics of a circuit from its statements."""
+
+    def __init__(self) -> None:
+        self.qubit_registers: dict[str, tuple[int, int]] = {}  # Name to offset and size
+        self.num_qubits = 0
+        self.num_clbits = 0
+        self.gate_counts: Counter[str] = Counter()
+        self.two_qubit_gates = 0
+        self.layers: dict[int, int] = {}  # Qubit to the number of layers up to its last operation
+
+    def add(self, statement: str) -> None:
+        """Add one statement, as yielded by _statements."""
+        if declaration := _DECLARATION.fullmatch(statement):
+            kind, size, names = declaration.groups()
+            names, _, value = names.partition("=")
+            self._declare(kind, size, names)
+            self._add_measurement(value)
+            return
+        if (gate := _SIMPLE_GATE.fullmatch(statement)) and gate.group(1) not in _NON_OPERATIONS:
+            registers = self.qubit_registers
+            qubits = [
+                registers[register][0] + int(index) if register in registers else self._qubits(register)[0]
+                for register, index in _INDEXED_OPERANDS.findall(gate.group(2))
+            ]
+            self._record(gate.group(1), qubits)
+            return
+        name = _NAME.match(statement)
+        if name is not None and name.group() == "if":
+            # A conditional operation in OpenQASM 2, like if(c==1) x q[0], counts like the operation itself
+            statement = _split_parameters(statement[name.end() :].strip()).strip()
+            name = _NAME.match(statement)
+        if name is None or name.group() in _NON_OPERATIONS:
+            return
+        target, assignment, value = statement.partition("=")
+        if assignment and _NAME.fullmatch(target.split("[")[0].strip()):
+            # Measurements assigning their result in OpenQASM 3, like c[0] = measure q[0]
+            self._add_measurement(value)
+            return
+        # Gate modifiers like ctrl @ are not part of the name of the gate
+        statement = statement.rpartition("@")[2].strip()
+        name = _NAME.match(statement)
+        if name is not None:
+            operands = _split_parameters(statement[name.end() :].strip())
+            self._apply(name.group(), operands.partition("->")[0])
+
+    def _add_measurement(self, value: str) -> None:
+        """Add the measurement in the assigned value of an OpenQASM 3 statement, if it is one."""
+        value = value.strip()
+        if value.startswith("measure"):
+            self._apply("measure", value[len("measure") :])
+
+    def _declare(self, kind: str, size: str | None, names: str) -> None:
+        for declared in (n.strip() for n in names.split(",")):
+            if not declared:
+                continue
+            name, register_size = declared, int(size or 1)
+            if kind in {"qreg", "creg"}:  # OpenQASM 2 declares the size after the name, like qreg q[5]
+                operand = _OPERAND.fullmatch(declared)
+                if operand is None:
+                    continue
+                name, register_size = operand.group(1), int(operand.group(2) or 1)
+            if kind in {"qreg", "qubit"}:
+                self.qubit_registers[name] = (self.num_qubits, register_size)
+                self.num_qubits += register_size
+            else:
+                self.num_clbits += register_size
+
+    def _qubits(self, operand: str) -> list[int]:
+        match = _OPERAND.fullmatch(operand.strip())
+        if match is None:
+            return []
+        name, index = match.groups()
+        if name not in self.qubit_registers:  # Physical qubits like $0 are used without being declared
+            self.qubit_registers[name] = (self.num_qubits, 1)
+            self.num_qubits += 1
+        offset, size = self.qubit_registers[name]
+        return [offset + int(index)] if index is not None else list(range(offset, offset + size))
+
+    def _apply(self, name: str, operands: str) -> None:
+        qubit_lists = [self._qubits(operand) for operand in operands.split(",") if operand.strip()]
+        if name == "barrier":
+            self.gate_counts[name] += 1
+            return
+        # Operands given as whole registers are broadcast, applying the operation once per qubit of the register
+        broadcast = max((len(qubits) for qubits in qubit_lists), default=1)
+        for i in range(broadcast):
+            self._record(name, [qubits[i] if len(qubits) > 1 else qubits[0] for qubits in qubit_lists if qubits])
+
+    def _record(self, name: str, qubits: list[int]) -> None:
+        """Record one operation on the given qubits, placing it in the layer after the last operation on any of them."""
+        self.gate_counts[name] += 1
+        if len(qubits) == 2:
+            self.two_qubit_gates += 1
+        layers = self.layers
+        layer = max([layers.get(qubit, 0) for qubit in qubits], default=0) + 1
+        for qubit in qubits:
+            layers[qubit] = layer
+
+    def statistics(self) -> CircuitStatistics:
+        return CircuitStatistics(
+            num_qubits=self.num_qubits,
+            num_clbits=self.num_clbits,
+            gate_counts=dict(self.gate_counts),
+            two_qubit_gates=self.two_qubit_gates,
+            depth=max(self.layers.values(), default=0),
+        )
+
 
 @dataclass
 class Circuit:
@@ -13,6 +249,7 @@ class Circuit:
 
     def __post_init__(self):
         self._qasm_version: str | None = None
+        self._statistics: CircuitStatistics | None = None
 
     def as_qasm_string(self) -> str:
         """Convert the circuit to an OpenQASM string."""
@@ -30,24 +267,25 @@ class Circuit:
 
     def _read_qasm_version(self) -> str | None:
         # see https://openqasm.com/language/comments.html#version-string
-        in_comment = False
-        for line in self._qasm_string.split("\n"):
-            line = line.strip()
-            if not line or line.startswith("//"):
-                continue
-            if line.startswith("/*"):
-                in_comment = True
-            if in_comment and line.endswith("*/"):
-                in_comment = False
-                continue
-            if not in_comment:
-                # first_non_comment_line
-                if line.startswith("OPENQASM"):
-                    version = line.split()[1]
-                    return version[:-1] # split off ";"
-                else:
-                    return ""
+        # Only the first statement is tokenized, the rest of the string is not scanned
+        first_statement = next(_statements(self._qasm_string), "")
+        if first_statement.startswith("OPENQASM"):
+            return first_statement.split()[1]
+        return ""
 
+    @property
+    def statistics(self) -> CircuitStatistics:
+        """Return structural statistics of the circuit, which are computed in one pass over the QASM string.
+
+        The statistics are computed when they are first requested, and then kept. Custom gates are counted by their
+        name, without expanding their definitions.
+        """
+        if self._statistics is None:
+            collector = _StatisticsCollector()
+            for statement in _statements(self._qasm_string):
+                collector.add(statement)
+            self._statistics = collector.statistics()
+        return self._statistics
 
     @classmethod
     def from_qasm_string(cls, qasm_string: str) -> Circuit:
@@ -66,7 +304,91 @@ class Circuit:
     #     # This is a placeholder for the actual conversion logic
     #     return f"Qiskit representation of {self._qasm_string}"
 
+
+@dataclass
+class CircuitBatch:
+    """A class for representing many circuits that share a header, e.g. the circuits of one iteration of a VQE.
+
+    The header, containing e.g. the version, includes, and register declarations, is stored only once. Each circuit is
+    given either by its own body, or by a parameter binding that is substituted into one shared body, so that backends
+    supporting parameterized circuits can execute the whole batch in one call. The full QASM string of a circuit is
+    only created when the circuit is requested.
+    """
+
+    _header: str
+    _bodies: list[str] | None = None  # Set if each circuit has its own body
+    _body: str | None = None  # Set if the circuits are given by parameter bindings
+    _bindings: list[dict[str, float]] | None = None
+
+    @classmethod
+    def from_bodies(cls, header: str, bodies: list[str]) -> CircuitBatch:
+        """Create a batch of circuits, where circuit i is the header followed by bodies[i]."""
+        return cls(header, _bodies=bodies)
+
+    @classmethod
+    def from_parameter_bindings(cls, header: str, body: str, bindings: list[dict[str, float]]) -> CircuitBatch:
+        """Create a batch of circuits from one parameterized body and one parameter binding per circuit.
+
+        :param header: The shared header, which must not declare the parameters
+        :param body: The shared body, referring to each parameter by its name, e.g. rz(theta) q[0]
+        :param bindings: The values of the parameters of each circuit
+        """
+        return cls(header, _body=body, _bindings=bindings)
+
+    @classmethod
+    def from_circuits(cls, circuits: Iterable[Circuit]) -> CircuitBatch:
+        """Create a batch from separate circuits, using their longest common prefix of whole lines as the header."""
+        qasm_strings = [circuit.as_qasm_string() for circuit in circuits]
+        prefix = os.path.commonprefix(qasm_strings)  # noqa: RUF071  # Compared by character, then cut at a line break
+        header_length = prefix.rfind("\n") + 1
+        return cls.from_bodies(prefix[:header_length], [qasm[header_length:] for qasm in qasm_strings])
+
+    @property
+    def header(self) -> str:
+        """Return the header shared by all circuits."""
+        return self._header
+
+    @property
+    def parameterized_body(self) -> str | None:
+        """Return the shared body if the circuits are given by parameter bindings, and None otherwise."""
+        return self._body
+
+    @property
+    def parameter_bindings(self) -> list[dict[str, float]] | None:
+        """Return the parameter binding of each circuit if the circuits are given by them, and None otherwise."""
+        return self._bindings
+
+    def __len__(self) -> int:
+        """Return the number of circuits."""
+        return len(self._bodies if self._bodies is not None else self._bindings)  # type: ignore
+
+    def body(self, i: int) -> str:
+        """Return the body of circuit i, with its parameter binding substituted if the batch is parameterized."""
+        if self._bodies is not None:
+            return self._bodies[i]
+        binding: dict[str, float] = self._bindings[i]  # type: ignore
+        if not binding:
+            return self._body  # type: ignore
+        names = re.compile(r"(?<![\w$])(" + "|".join(re.escape(name) for name in binding) + r")(?![\w$])")
+        return names.sub(lambda match: repr(float(binding[match.group()])), self._body)  # type: ignore
+
+    def iter_bodies(self) -> Iterator[str]:
+        """Yield the body of each circuit, without the header, see body."""
+        for i in range(len(self)):
+            yield self.body(i)
+
+    def circuit(self, i: int) -> Circuit:
+        """Return circuit i as a separate Circuit, which contains its own copy of the header."""
+        return Circuit.from_qasm_string(self._header + self.body(i))
+
+    def __iter__(self) -> Iterator[Circuit]:
+        """Yield each circuit as a separate Circuit, creating only one of them at a time."""
+        for i in range(len(self)):
+            yield self.circuit(i)
+
+
 __all__ = [
     "Circuit",
+    "CircuitBatch",
     "SampleDistribution",
 ]
@@ -2,17 +2,27 @@ from __future__ import annotations
 
 from typing import TYPE_CHECKING
 
-import networkx as nx
+import numpy as np
 
 # Check back with RUFF T0002: https://docs.astral.sh/ruff/rules/typing-only-third-party-import/
 if TYPE_CHECKING:
-    import numpy as np
+    import networkx as nx
 
 
 class Graph:
-    """A class for representing a graph problem."""
+    """A class for representing an undirected graph problem.
 
-    _g: nx.Graph
+    A graph is stored either as a networkx.Graph, or compactly as arrays of edges with optional weights, where the
+    nodes are numbered from 0. Every other representation, including the networkx.Graph for a graph created from
+    arrays, is only created once it is requested, and then kept. A graph must therefore not be modified after it was
+    created.
+    """
+
+    _g: nx.Graph | None = None
+    _edges: tuple[np.ndarray, np.ndarray, np.ndarray | None] | None = None  # Sources, targets, and weights if weighted
+    _num_nodes: int | None = None
+    _csr: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+    _adjacency_matrix: np.ndarray | None = None
 
     @staticmethod
     def from_nx_graph(g: nx.Graph) -> Graph:
@@ -23,15 +33,134 @@ class Graph:
 
     def as_nx_graph(self) -> nx.Graph:
         """Create a networkx.Graph object from this Graph object."""
+        if self._g is None:
+            import networkx as nx  # noqa: PLC0415  # Only imported once a networkx.Graph is actually needed
+
+            sources, targets, weights = self.as_edges()
+            g = nx.Graph()
+            g.add_nodes_from(range(self.num_nodes))
+            if weights is None:
+                g.add_edges_from(zip(sources.tolist(), targets.tolist(), strict=True))
+            else:
+                g.add_weighted_edges_from(zip(sources.tolist(), targets.tolist(), weights.tolist(), strict=True))
+            self._g = g
         return self._g
 
+    @staticmethod
+    def from_edges(
+        sources: np.ndarray,
+        targets: np.ndarray,
+        weights: np.ndarray | None = None,
+        num_nodes: int | None = None,
+    ) -> Graph:
+        """Create a Graph object from arrays of edges, each given once in either direction.
+
+        :param sources: One node of each edge
+        :param targets: The other node of each edge
+        :param weights: The weight of each edge, or None for an unweighted graph
+        :param num_nodes: The number of nodes, inferred from the largest node if not given
+        """
+        v = Graph()
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        v._edges = (sources, targets, None if weights is None else np.asarray(weights, dtype=np.float64))
+        v._num_nodes = (
+            num_nodes if num_nodes is not None else int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+        )
+        return v
+
+    def as_edges(self) -> tuple[np.ndarray, np.ndarray, np.ndarray | None]:
+        """Return the edges of this Graph object as arrays of sources, targets, and weights.
+
+        The weights are None for an unweighted graph. For a graph created from a networkx.Graph, the nodes are numbered
+        in the order of g.nodes, and the graph is weighted if any of its edges has a "weight" attribute.
+        """
+        if self._edges is None:
+            g: nx.Graph = self._g  # type: ignore
+            index = {node: i for i, node in enumerate(g.nodes)}
+            edges = list(g.edges(data="weight"))
+            sources = np.fromiter((index[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+            targets = np.fromiter((index[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+            weights = None
+            if any(w is not None for _, _, w in edges):
+                # Like networkx, edges without a weight are given a weight of 1
+                weights = np.fromiter((1 if w is None else w for _, _, w in edges), dtype=np.float64, count=len(edges))
+            self._edges = (sources, targets, weights)
+            self._num_nodes = len(index)
+        return self._edges
+
+    @property
+    def num_nodes(self) -> int:
+        """Return the number of nodes."""
+        if self._num_nodes is None:
+            self._num_nodes = self._g.number_of_nodes()  # type: ignore
+        return self._num_nodes
+
+    @property
+    def num_edges(self) -> int:
+        """Return the number of edges."""
+        if self._edges is None:
+            return self._g.number_of_edges()  # type: ignore
+        return len(self._edges[0])
+
+    @staticmethod
+    def from_csr(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray | None = None) -> Graph:
+        """Create a Graph object from a symmetric adjacency matrix in compressed sparse row format.
+
+        :param indptr: The row pointers, with one more element than there are nodes
+        :param indices: The column index of each entry
+        :param data: The weight of each entry, or None for an unweighted graph
+        """
+        indptr = np.asarray(indptr, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        upper = rows <= indices  # Each edge appears twice in a symmetric matrix, except for self loops
+        data = None if data is None else np.asarray(data, dtype=np.float64)
+        v = Graph()
+        v._edges = (rows[upper], indices[upper], None if data is None else data[upper])
+        v._num_nodes = len(indptr) - 1
+        v._csr = (indptr, indices, np.ones(len(indices)) if data is None else data)
+        return v
+
+    def as_csr(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the symmetric adjacency matrix in compressed sparse row format, without creating a dense matrix.
+
+        :return: The row pointers, the column index of each entry, and the weight of each entry, which is 1 for an
+            unweighted graph
+        """
+        if self._csr is None:
+            sources, targets, weights = self.as_edges()
+            weights = np.ones(len(sources)) if weights is None else weights
+            loops = sources == targets
+            rows = np.concatenate((sources, targets[~loops]))
+            cols = np.concatenate((targets, sources[~loops]))
+            data = np.concatenate((weights, weights[~loops]))
+            order = np.lexsort((cols, rows))
+            indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=self.num_nodes), out=indptr[1:])
+            self._csr = (indptr, cols[order], data[order])
+        return self._csr
+
     @staticmethod
     def from_adjacency_matrix(matrix: np.ndarray) -> Graph:
         """Create a Graph object from an adjacency matrix, given as a numpy.ndarray."""
+        sources, targets = np.nonzero(np.triu(matrix))
         v = Graph()
-        v._g = nx.from_numpy_array(matrix)
+        v._edges = (sources.astype(np.int64), targets.astype(np.int64), matrix[sources, targets].astype(np.float64))
+        v._num_nodes = matrix.shape[0]
+        v._adjacency_matrix = matrix
         return v
 
     def as_adjacency_matrix(self) -> np.ndarray:
-        """Create an adjacency matrix as a numpy.ndarray from this Graph object."""
-        return nx.to_numpy_array(self._g)
+        """Create an adjacency matrix as a numpy.ndarray from this Graph object.
+
+        The dense matrix needs memory quadratic in the number of nodes, so as_csr or as_edges should be preferred for
+        large graphs.
+        """
+        if self._adjacency_matrix is None:
+            sources, targets, weights = self.as_edges()
+            matrix = np.zeros((self.num_nodes, self.num_nodes))
+            matrix[sources, targets] = 1 if weights is None else weights
+            matrix[targets, sources] = 1 if weights is None else weights
+            self._adjacency_matrix = matrix
+        return self._adjacency_matrix
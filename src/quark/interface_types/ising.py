@@ -1,8 +1,252 @@
 from __future__ import annotations
 
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from quark.interface_types.qubo import _ENERGY_CHUNK_ELEMENTS, Qubo, _sparse_module
+
+if TYPE_CHECKING:
+    from numpy.typing import DTypeLike
+
+
+def _sum_upper_triangle(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    values: np.ndarray,
+    n: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Move entries to the upper triangle and sum duplicate entries, like the coupling matrix in Ising.from_arrays."""
+    rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+    linear, inverse = np.unique(rows.astype(np.int64) * n + cols, return_inverse=True)
+    sums = np.zeros(len(linear), dtype=values.dtype)
+    np.add.at(sums, inverse, values)
+    return linear // n, linear % n, sums
+
 
 class Ising:
-    """TODO: Not implemented yet."""
+    """A class for representing an Ising problem with the energy h^T s + sum_{i<j} J_ij s_i s_j + offset.
+
+    Each spin s_i is either -1 or 1. The linear factors h are always stored as an array, while the couplings J are
+    stored either densely as a strictly upper triangular matrix, or sparsely as its entries in coordinate format,
+    depending on how the problem was created. The dense matrix of a sparse problem is only created once it is requested,
+    and then kept.
+
+    Spins are related to the binary variables of a QUBO by s = 2x - 1, see from_qubo and as_qubo.
+    """
+
+    _h: np.ndarray
+    _offset: float = 0.0
+    _j_matrix: np.ndarray | None = None  # Dense storage
+    _j_upper: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None  # Sparse storage as rows, cols and values
+
+    @property
+    def size(self) -> int:
+        """Return the number of spins."""
+        return len(self._h)
+
+    @property
+    def h(self) -> np.ndarray:
+        """Return the linear factors of the spins."""
+        return self._h
+
+    @property
+    def offset(self) -> float:
+        """Return the constant part of the energy."""
+        return self._offset
+
+    @property
+    def is_sparse(self) -> bool:
+        """Return whether the couplings are stored sparsely, i.e. they were created from entries instead of a matrix."""
+        return self._j_upper is not None
+
+    @classmethod
+    def from_arrays(cls, h: np.ndarray, j: np.ndarray, offset: float = 0.0, dtype: DTypeLike = None) -> Ising:
+        """Create an Ising problem with dense couplings.
+
+        :param h: The linear factors of the spins
+        :param j: A square matrix of couplings. Both entries J_ij and J_ji are added to the coupling of spins i and j,
+            like in from_coo and from_dicts, and the diagonal is added to the offset, as s_i * s_i is always 1.
+        :param offset: The constant part of the energy
+        :param dtype: The data type of the factors, the common type of h and j is used if not given
+        """
+        h = np.asarray(h, dtype=dtype)
+        j = np.asarray(j, dtype=dtype)
+        if j.shape != (len(h), len(h)):
+            msg = f"Expected a coupling matrix of shape {(len(h), len(h))}, got shape {j.shape}"
+            raise ValueError(msg)
+        dtype = np.result_type(h, j)
+        ising = cls()
+        ising._h = h.astype(dtype, copy=False)
+        ising._j_matrix = np.triu(j, 1) + np.tril(j, -1).T
+        ising._offset = float(offset + np.trace(j))
+        return ising
+
+    def as_matrix(self) -> np.ndarray:
+        """Return the couplings as a strictly upper triangular matrix."""
+        if self._j_matrix is None:
+            rows, cols, values = self._j_upper  # type: ignore
+            matrix = np.zeros((self.size, self.size), dtype=values.dtype)
+            matrix[rows, cols] = values
+            self._j_matrix = matrix
+        return self._j_matrix
+
+    @classmethod
+    def from_coo(
+        cls,
+        h: np.ndarray,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        values: np.ndarray,
+        offset: float = 0.0,
+        dtype: DTypeLike = None,
+    ) -> Ising:
+        """Create an Ising problem with sparse couplings given in coordinate format.
+
+        Entries in the lower triangle are moved to the upper triangle. If an entry is given more than once, either
+        directly or mirrored, all of its values are added to the coupling, like in from_arrays. Entries on the diagonal
+        are added to the offset.
+
+        :param h: The linear factors of the spins, which also determine the number of spins
+        :param offset: The constant part of the energy
+        :param dtype: The data type of the factors, the common type of h and the values is used if not given
+        """
+        h = np.asarray(h, dtype=dtype)
+        values = np.asarray(values, dtype=dtype)
+        dtype = np.result_type(h, values)
+        rows, cols, values = _sum_upper_triangle(
+            np.asarray(rows, dtype=np.int64),
+            np.asarray(cols, dtype=np.int64),
+            values.astype(dtype, copy=False),
+            len(h),
+        )
+        diagonal = rows == cols
+        ising = cls()
+        ising._h = h.astype(dtype, copy=False)
+        ising._j_upper = (rows[~diagonal], cols[~diagonal], values[~diagonal])
+        ising._offset = float(offset + values[diagonal].sum())
+        return ising
+
+    def as_coo(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the couplings in coordinate format, where each row index is less than the corresponding column index.
+
+        For sparse couplings, these are the stored entries. For dense couplings, these are the nonzero entries.
+        """
+        if self._j_upper is not None:
+            return self._j_upper
+        rows, cols = np.nonzero(self._j_matrix)
+        return rows, cols, self._j_matrix[rows, cols]  # type: ignore
+
+    @classmethod
+    def from_dicts(cls, h: dict[int, float], j: dict[tuple[int, int], float], offset: float = 0.0) -> Ising:
+        """Create an Ising problem with sparse couplings from dictionaries, as used by D-Wave samplers.
+
+        :param h: Dictionary mapping spins to their linear factors, missing spins below the largest one have a factor 0
+        :param j: Dictionary mapping pairs of spins to their couplings. If both (i, j) and (j, i) are given, their
+            couplings are added, see from_coo.
+        :param offset: The constant part of the energy
+        """
+        pairs = np.fromiter((index for pair in j for index in pair), dtype=np.int64, count=2 * len(j)).reshape(-1, 2)
+        size = int(max(max(h, default=-1), pairs.max(initial=-1))) + 1
+        linear = np.zeros(size)
+        linear[np.fromiter(h.keys(), dtype=np.int64, count=len(h))] = np.fromiter(h.values(), dtype=np.float64)
+        return cls.from_coo(linear, pairs[:, 0], pairs[:, 1], np.fromiter(j.values(), dtype=np.float64), offset)
+
+    def as_dicts(self) -> tuple[dict[int, float], dict[tuple[int, int], float]]:
+        """Return the linear factors of all spins and the couplings as dictionaries, as used by D-Wave samplers.
+
+        The offset is not included, see the offset property.
+        """
+        rows, cols, values = self.as_coo()
+        h = dict(enumerate(self._h.tolist()))
+        j = dict(zip(zip(rows.tolist(), cols.tolist(), strict=True), values.tolist(), strict=True))
+        return h, j
+
+    @classmethod
+    def from_qubo(cls, qubo: Qubo, offset: float = 0.0) -> Ising:
+        """Create the Ising problem equivalent to a QUBO, i.e. with the same energy for spins s = 2x - 1.
+
+        The couplings are stored densely for a dense QUBO and sparsely for a sparse QUBO.
+
+        :param qubo: The QUBO with the energy x^T Q x
+        :param offset: A constant part of the energy of the QUBO, which is added to the offset of the Ising problem
+        """
+        # With x = (1 + s) / 2, Q_ii x_i becomes Q_ii / 2 * (1 + s_i) and 2 Q_ij x_i x_j with i < j becomes
+        # Q_ij / 2 * (1 + s_i + s_j + s_i s_j)
+        dtype = np.result_type(qubo.dtype, np.float64)
+        if qubo.is_sparse:
+            rows, cols, values = qubo.as_coo()
+            values = values.astype(dtype) / 2
+            diagonal = rows == cols
+            h = np.zeros(qubo.size, dtype=dtype)
+            np.add.at(h, rows, values)
+            np.add.at(h, cols[~diagonal], values[~diagonal])
+            return cls.from_coo(h, rows[~diagonal], cols[~diagonal], values[~diagonal], offset + values.sum())
+        matrix = qubo.as_matrix().astype(dtype) / 2
+        j = np.triu(matrix, 1)
+        h = np.diagonal(matrix) + j.sum(axis=0) + j.sum(axis=1)
+        ising = cls()
+        ising._h = h
+        ising._j_matrix = j
+        ising._offset = float(offset + np.trace(matrix) + j.sum())
+        return ising
+
+    def as_qubo(self) -> tuple[Qubo, float]:
+        """Return the QUBO equivalent to this Ising problem, i.e. with the same energy for x = (1 + s) / 2.
+
+        The QUBO is dense for dense couplings and sparse for sparse couplings. As a QUBO has no constant part, the
+        offset of its energy is returned as well, so that from_qubo(*as_qubo()) restores this Ising problem.
+
+        :return: The QUBO and the offset of its energy
+        """
+        # With s = 2x - 1, h_i s_i becomes 2 h_i x_i - h_i and J_ij s_i s_j becomes J_ij (4 x_i x_j - 2 x_i - 2 x_j + 1)
+        dtype = np.result_type(self._h.dtype, np.float64)
+        if self.is_sparse:
+            rows, cols, values = self.as_coo()
+            values = values.astype(dtype)
+            diagonal = 2 * self._h.astype(dtype)
+            np.subtract.at(diagonal, rows, 2 * values)
+            np.subtract.at(diagonal, cols, 2 * values)
+            indices = np.arange(self.size)
+            qubo = Qubo.from_coo(
+                np.concatenate((indices, rows)),
+                np.concatenate((indices, cols)),
+                np.concatenate((diagonal, 2 * values)),
+                n=self.size,
+            )
+            return qubo, self._offset - float(self._h.sum()) + float(values.sum())
+        j = self._j_matrix.astype(dtype)  # type: ignore
+        matrix = 2 * (j + j.T)
+        np.fill_diagonal(matrix, 2 * self._h - 2 * (j.sum(axis=0) + j.sum(axis=1)))
+        return Qubo.from_matrix(matrix), self._offset - float(self._h.sum()) + float(j.sum())
+
+    def evaluate_energies(self, spins: np.ndarray, chunk_size: int | None = None) -> np.ndarray:
+        """Compute the energy of every assignment of spins, see Qubo.evaluate_energies.
 
-    # Every entry represents a coefficient of the qubo matrix
-    # _Q: dict[int, dict[int, int]]
+        :param spins: A 2-D array with one assignment of -1 and 1 values per row
+        :param chunk_size: Number of assignments processed at once. If None, it is chosen to keep the temporary arrays
+            below a fixed number of elements.
+        :return: A 1-D array containing the energy of each assignment
+        """
+        if spins.ndim != 2 or spins.shape[1] != self.size:
+            msg = f"Expected a 2-D array with {self.size} columns, got an array of shape {spins.shape}"
+            raise ValueError(msg)
+        dtype = np.result_type(self._h.dtype, np.float64)
+        energies = np.empty(spins.shape[0], dtype=dtype)
+        couplings = self._j_matrix
+        if couplings is None:
+            rows, cols, values = self._j_upper  # type: ignore
+            try:
+                # Sparse matrix products are considerably faster than gathering the spins of each coupling
+                couplings = _sparse_module().csr_array((values, (rows, cols)), shape=(self.size, self.size))
+            except ImportError:
+                chunk_size = chunk_size or max(1, _ENERGY_CHUNK_ELEMENTS // max(1, len(values)))
+                for start in range(0, spins.shape[0], chunk_size):
+                    s = spins[start : start + chunk_size].astype(dtype)
+                    energies[start : start + chunk_size] = s @ self._h + (s[:, rows] * s[:, cols]) @ values
+                return energies + self._offset
+        chunk_size = chunk_size or max(1, _ENERGY_CHUNK_ELEMENTS // max(1, self.size))
+        for start in range(0, spins.shape[0], chunk_size):
+            s = spins[start : start + chunk_size].astype(dtype)
+            energies[start : start + chunk_size] = s @ self._h + np.einsum("ij,ij->i", (couplings.T @ s.T).T, s)
+        return energies + self._offset
@@ -1,16 +1,72 @@
 from __future__ import annotations
 
+import mmap
+import re
+from dataclasses import asdict, dataclass
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+# Numbers come first, so that exponents like the e5 in 1e5 are not taken as variable names
+_LP_TOKEN = re.compile(
+    r"""(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)"""
+    r"""|(?P<name>[A-Za-z_!"#$%&()/,;?@`'{}|~][\w!"#$%&()/,.;?@`'{}|~]*)"""
+    r"""|(?P<comparison>[<>=]=?|=[<>])""",
+)
+_LP_LABEL = re.compile(r"\s*[^\s:]+\s*:")
+_LP_SECTIONS: dict[str, str] = {
+    "minimize": "objective", "minimum": "objective", "min": "objective",
+    "maximize": "objective", "maximum": "objective", "max": "objective",
+    "subject to": "constraints", "such that": "constraints", "st": "constraints", "s.t.": "constraints",
+    "bounds": "bounds", "bound": "bounds",
+    "general": "general", "generals": "general", "gen": "general", "integer": "general", "integers": "general",
+    "binary": "binary", "binaries": "binary", "bin": "binary",
+    "semi-continuous": "semi-continuous", "semi": "semi-continuous", "semis": "semi-continuous",
+    "sos": "sos",
+    "end": "end",
+}  # fmt: skip
+_LP_KEYWORDS = frozenset(("inf", "infinity", "free"))  # Words in the bounds section that are not variables
+
+
+@dataclass(frozen=True)
+class LPStatistics:
+    """Size statistics of a linear program in CPLEX LP format, see LP.statistics."""
+
+    sense: str | None  # Either "minimize" or "maximize", None if the LP has no objective section
+    num_variables: int
+    num_constraints: int
+    num_nonzeros: int  # Number of variable terms in all constraints
+    num_integer_variables: int  # Variables listed in the general section
+    num_binary_variables: int
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the statistics as a dictionary, e.g. to include them in the metrics of a module."""
+        return asdict(self)
 
 
 class LP:
-    """A class for representing linear programs (LP) readable by common LP solvers."""
+    """A class for representing linear programs (LP) readable by common LP solvers.
+
+    An LP is stored either as a string, or as the path of an LP file. A file-backed LP reads the file through a memory
+    map, so its contents are never copied into a Python string unless as_str is called. It is pickled as its path, so
+    the file must still exist, unchanged, wherever the LP is unpickled.
+    """
 
-    _lp_string: str
+    _lp_string: str | None = None
+    _path: Path | None = None  # Only set for file-backed LPs
+    _mmap: mmap.mmap | None = None  # Opened when the file is first read
+    _statistics: LPStatistics | None = None
 
     def as_str(self) -> str:
-        """Return the LP from a string."""
-        return self._lp_string
+        """Return the LP from a string.
+
+        For a file-backed LP, the whole file is decoded, so iter_lines or path should be preferred for large files.
+        """
+        if self._lp_string is not None:
+            return self._lp_string
+        return self._map()[:].decode()
 
     @classmethod
     def from_str(cls, string: str) -> LP:
@@ -21,11 +77,121 @@ class LP:
         return lp
 
     @classmethod
-    def from_file(cls, file_path: str | Path) -> LP:
-        """Create an LP from a file."""
+    def from_file(cls, file_path: str | Path, *, file_backed: bool = False) -> LP:
+        """Create an LP from a file.
+
+        :param file_path: The path of the LP file
+        :param file_backed: If True, the file is read lazily through a memory map instead of being read into a string
+        """
         lp = cls()
 
+        if file_backed:
+            lp._path = Path(file_path).resolve()
+            return lp
         with Path(file_path).open("r") as file:
             lp._lp_string = file.read()
 
         return lp
+
+    @property
+    def path(self) -> Path | None:
+        """Return the path of the LP file of a file-backed LP, which solvers can read directly, and None otherwise."""
+        return self._path
+
+    def _map(self) -> mmap.mmap | bytes:
+        """Return the contents of the file of a file-backed LP, mapped into memory once it is first needed."""
+        if self._mmap is None:
+            with self._path.open("rb") as file:  # type: ignore
+                if file.seek(0, 2) == 0:
+                    return b""  # Empty files cannot be mapped
+                self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def iter_lines(self, chunk_size: int = 1 << 20) -> Iterator[str]:
+        """Yield the lines of the LP one after another, without line breaks.
+
+        A file-backed LP is decoded in chunks of about chunk_size bytes, each ending at a line break, so only one chunk
+        is held as a string at a time.
+        """
+        if self._lp_string is not None:
+            data: str | mmap.mmap | bytes = self._lp_string
+            newline: str | bytes = "\n"
+        else:
+            data = self._map()
+            newline = b"\n"
+        start = 0
+        while start < len(data):
+            end = data.rfind(newline, start, start + chunk_size) + 1  # type: ignore
+            if end <= start:  # No line break in this chunk, so the chunk is extended to the end of its line
+                end = data.find(newline, start + chunk_size) + 1  # type: ignore
+                end = end if end > 0 else len(data)
+            chunk = data[start:end]
+            yield from chunk.splitlines() if isinstance(chunk, str) else chunk.decode().splitlines()
+            start = end
+
+    @property
+    def statistics(self) -> LPStatistics:
+        """Return the size statistics of the LP, which are collected in one pass over its lines and then kept.
+
+        The statistics are meant to characterize the size of a problem cheaply, without building a model. Each line is
+        only tokenized, so the statistics of an LP that is not valid are not meaningful.
+        """
+        if self._statistics is None:
+            self._statistics = self._collect_statistics()
+        return self._statistics
+
+    def _collect_statistics(self) -> LPStatistics:
+        section = None
+        sense = None
+        variables: set[str] = set()
+        integer_variables: set[str] = set()
+        binary_variables: set[str] = set()
+        num_constraints = 0
+        num_nonzeros = 0
+        for raw_line in self.iter_lines():
+            line = raw_line.partition("\\")[0].strip()  # A backslash starts a comment
+            if not line:
+                continue
+            keyword = " ".join(line.lower().split())
+            if keyword in _LP_SECTIONS:
+                section = _LP_SECTIONS[keyword]
+                if section == "objective":
+                    sense = "maximize" if keyword.startswith("max") else "minimize"
+                continue
+            if section == "sos":  # Special ordered sets only refer to variables that are declared elsewhere
+                continue
+            if section in {"objective", "constraints"} and (label := _LP_LABEL.match(line)):
+                line = line[label.end() :]
+            names = []
+            comparison = False
+            for token in _LP_TOKEN.finditer(line):
+                if token.lastgroup == "name":
+                    names.append(token.group())
+                elif token.lastgroup == "comparison":
+                    comparison = True
+            match section:
+                case "bounds":
+                    names = [name for name in names if name.lower() not in _LP_KEYWORDS]
+                case "constraints":
+                    # A constraint may continue over several lines, but only its last line contains the comparison
+                    num_constraints += comparison
+                    num_nonzeros += len(names)
+                case "general":
+                    integer_variables.update(names)
+                case "binary":
+                    binary_variables.update(names)
+            variables.update(names)
+        return LPStatistics(
+            sense=sense,
+            num_variables=len(variables),
+            num_constraints=num_constraints,
+            num_nonzeros=num_nonzeros,
+            num_integer_variables=len(integer_variables),
+            num_binary_variables=len(binary_variables),
+        )
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Return the state of the LP for pickling, which for a file-backed LP only includes its path."""
+        state = self.__dict__.copy()
+        state.pop("_mmap", None)
+        return state
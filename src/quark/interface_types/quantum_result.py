@@ -1,17 +1,69 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
 
+import numpy as np
 
-@dataclass
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Sequence
+
+_WORD_BITS: int = 64
+_WORD_MASK: int = (1 << _WORD_BITS) - 1
+
+
+def _words(num_qubits: int) -> int:
+    """Return the number of 64-bit words needed to store a state of the given number of qubits."""
+    return max(1, -(-num_qubits // _WORD_BITS))
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """Pack a 2-D array of bits, with qubit q in column q, into rows of 64-bit words."""
+    states = np.zeros((bits.shape[0], _words(bits.shape[1])), dtype=np.uint64)
+    for w in range(states.shape[1]):
+        word_bits = bits[:, w * _WORD_BITS : (w + 1) * _WORD_BITS].astype(np.uint64)
+        # The bits are distinct powers of two, so summing them sets each of them
+        states[:, w] = (word_bits << np.arange(word_bits.shape[1], dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+    return states
+
+
+@dataclass(eq=False)
 class SampleDistribution:
-    """A class for representing a quantum sample distribution."""
+    """A class for representing a quantum sample distribution.
+
+    A state is written as a string of "0" and "1" characters, where the last character is qubit 0. Internally, the
+    states are stored compactly as rows of 64-bit words, where bit q of the row is qubit q, together with an array of
+    the relative count or probability of each state. Either representation is only created from the other when it is
+    first needed.
+    """
 
-    _samples: list[tuple[str, float]]
+    _samples: list[tuple[str, float]] | None
     _nbshots: int
+    _states: np.ndarray | None = field(default=None, repr=False)  # Shape (number of states, words), uint64
+    _values: np.ndarray | None = field(default=None, repr=False)  # Relative count or probability of each state
+    _num_qubits: int | None = field(default=None, repr=False)
+
+    def __eq__(self, other: object) -> bool:
+        """Compare two sample distributions by their number of shots and their states, in order."""
+        if not isinstance(other, SampleDistribution):
+            return NotImplemented
+        return self._nbshots == other._nbshots and self.as_list() == other.as_list()
+
+    __hash__ = None  # type: ignore  # Sample distributions are mutable, as they cache their representations
 
     def as_list(self) -> list[tuple[str, float]]:
         """Convert the sample distribution to a list of tuples."""
+        if self._samples is None:
+            states, values = self.as_arrays()
+            # The words of each state are combined into one integer, starting with the most significant one
+            integers = [
+                int.from_bytes(row[::-1].astype(">u8").tobytes(), "big") if len(row) > 1 else int(row[0])
+                for row in states
+            ]
+            self._samples = [
+                (format(integer, f"0{self.num_qubits}b"), value)
+                for integer, value in zip(integers, values.tolist(), strict=True)
+            ]
         return self._samples
 
     @property
@@ -32,6 +84,212 @@ class SampleDistribution:
             raise ValueError(msg)
         return cls(samples, nbshots)
 
+    @property
+    def num_qubits(self) -> int:
+        """Return the number of qubits of each state."""
+        if self._num_qubits is None:
+            self._num_qubits = len(self._samples[0][0]) if self._samples else 0  # type: ignore
+        return self._num_qubits
+
+    def as_arrays(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the states and their relative counts or probabilities as arrays.
+
+        :return: The states as a uint64 array with one row per state, where bit q of the row is qubit q, and the
+            relative count or probability of each state as a float array
+        """
+        if self._states is None or self._values is None:
+            samples: list[tuple[str, float]] = self._samples  # type: ignore
+            integers = [int(state, 2) for state, _ in samples]
+            self._states = np.empty((len(samples), _words(self.num_qubits)), dtype=np.uint64)
+            for w in range(self._states.shape[1]):
+                shift = w * _WORD_BITS
+                self._states[:, w] = np.fromiter(
+                    ((integer >> shift) & _WORD_MASK for integer in integers),
+                    dtype=np.uint64,
+                    count=len(integers),
+                )
+            self._values = np.fromiter((value for _, value in samples), dtype=np.float64, count=len(samples))
+        return self._states, self._values
+
+    @classmethod
+    def from_arrays(
+        cls,
+        states: np.ndarray,
+        values: np.ndarray,
+        num_qubits: int,
+        nbshots: int,
+    ) -> SampleDistribution:
+        """Create a SampleDistribution instance from arrays, see as_arrays.
+
+        :param states: The states as a uint64 array with one row per state, or as a 1-D array if there are at most 64
+            qubits
+        :param values: The relative count or probability of each state
+        :param num_qubits: The number of qubits of each state
+        :param nbshots: See from_list
+        """
+        if not isinstance(nbshots, int) or not nbshots >= 0:
+            msg = "nbshots must be a non-negative integer (0 indicates exact probabilities)."
+            raise ValueError(msg)
+        states = np.asarray(states, dtype=np.uint64)
+        if states.ndim == 1:
+            states = states.reshape(-1, 1)
+        if states.shape[1] != _words(num_qubits) or states.shape[0] != len(values):
+            msg = f"Expected {len(values)} states of {_words(num_qubits)} words each, got shape {states.shape}"
+            raise ValueError(msg)
+        return cls(None, nbshots, states, np.asarray(values, dtype=np.float64), num_qubits)
+
+    @classmethod
+    def from_bits(cls, bits: np.ndarray, values: np.ndarray, nbshots: int) -> SampleDistribution:
+        """Create a SampleDistribution instance from a 2-D array with one state per row, where column q is qubit q."""
+        return cls.from_arrays(_pack(np.asarray(bits)), values, bits.shape[1], nbshots)
+
+    def as_bits(self) -> np.ndarray:
+        """Return the states as a 2-D boolean array with one state per row, where column q is qubit q."""
+        states, _ = self.as_arrays()
+        bits = np.empty((states.shape[0], self.num_qubits), dtype=bool)
+        for w in range(states.shape[1]):
+            columns = min(_WORD_BITS, self.num_qubits - w * _WORD_BITS)
+            shifts = np.arange(columns, dtype=np.uint64)
+            bits[:, w * _WORD_BITS : w * _WORD_BITS + columns] = (states[:, w : w + 1] >> shifts) & np.uint64(1)
+        return bits
+
+    def top_k(self, k: int) -> SampleDistribution:
+        """Return the k states with the highest relative counts or probabilities, in descending order."""
+        states, values = self.as_arrays()
+        k = min(k, len(values))
+        # Partitioning first only sorts the k best states, instead of all of them
+        best = np.argpartition(-values, k - 1)[:k] if 0 < k < len(values) else np.arange(k)
+        best = best[np.argsort(-values[best], kind="stable")]
+        return SampleDistribution.from_arrays(states[best], values[best], self.num_qubits, self._nbshots)
+
+    def marginal(self, qubits: Sequence[int]) -> SampleDistribution:
+        """Return the distribution over a subset of the qubits, summing the values of states that agree on them.
+
+        :param qubits: The qubits to keep, where qubits[i] becomes qubit i of the marginal distribution
+        """
+        _, values = self.as_arrays()
+        return SampleDistribution._grouped(_pack(self.as_bits()[:, list(qubits)]), values, len(qubits), self._nbshots)
+
+    @classmethod
+    def merge(cls, distributions: Iterable[SampleDistribution]) -> SampleDistribution:
+        """Merge distributions over the same qubits, e.g. the results of several jobs of a batch.
+
+        Distributions from sampling are weighted by their number of shots. Exact distributions, with nbshots set to 0,
+        are weighted equally, and cannot be merged with distributions from sampling.
+        """
+        distributions = list(distributions)
+        if not distributions:
+            msg = "At least one distribution is needed to merge"
+            raise ValueError(msg)
+        num_qubits = distributions[0].num_qubits
+        if any(d.num_qubits != num_qubits for d in distributions):
+            msg = "Only distributions over the same number of qubits can be merged"
+            raise ValueError(msg)
+        nbshots = sum(d.nbshots for d in distributions)
+        if nbshots and any(d.nbshots == 0 for d in distributions):
+            msg = "Exact distributions cannot be merged with distributions from sampling"
+            raise ValueError(msg)
+        weights = [d.nbshots / nbshots if nbshots else 1 / len(distributions) for d in distributions]
+        arrays = [d.as_arrays() for d in distributions]
+        return cls._grouped(
+            np.concatenate([states for states, _ in arrays]),
+            np.concatenate([values * weight for (_, values), weight in zip(arrays, weights, strict=True)]),
+            num_qubits,
+            nbshots,
+        )
+
+    @classmethod
+    def _grouped(cls, states: np.ndarray, values: np.ndarray, num_qubits: int, nbshots: int) -> SampleDistribution:
+        """Create a distribution where the values of equal states are summed up, ordered by state."""
+        unique_states, inverse = np.unique(states, axis=0, return_inverse=True)
+        summed_values = np.bincount(inverse.reshape(-1), weights=values, minlength=len(unique_states))
+        return cls.from_arrays(unique_states, summed_values, num_qubits, nbshots)
+
+    def expectation(self, observable: Callable[[np.ndarray], np.ndarray]) -> float:
+        """Return the expectation value of a diagonal observable, normalized by the total probability of all states.
+
+        :param observable: Maps a 2-D boolean array with one state per row, see as_bits, to the eigenvalue of each
+            state. For example, Qubo.evaluate_energies computes the energies of a QUBO.
+        """
+        _, values = self.as_arrays()
+        return float(np.dot(values, observable(self.as_bits())) / values.sum())
+
+    def z_expectation(self, qubits: Sequence[int]) -> float:
+        """Return the expectation value of the product of Pauli Z operators on the given qubits.
+
+        The value is normalized by the total probability of all states.
+        """
+        _, values = self.as_arrays()
+        parity = np.bitwise_xor.reduce(self.as_bits()[:, list(qubits)], axis=1) if qubits else 0
+        return float(np.dot(values, 1 - 2 * np.asarray(parity, dtype=np.float64)) / values.sum())
+
+
+@dataclass(frozen=True, eq=False)
+class SampleDistributionBatch:
+    """A class for representing the sample distributions of the circuits of a CircuitBatch, in the same order.
+
+    The states and values of all distributions are stored in two contiguous arrays, and each distribution is a slice of
+    them. A SampleDistribution is only created for a distribution when it is requested, and it shares the memory of the
+    batch.
+    """
+
+    _states: np.ndarray  # Shape (total number of states, words), uint64, see SampleDistribution.as_arrays
+    _values: np.ndarray
+    _offsets: np.ndarray  # Distribution i consists of the states from _offsets[i] to _offsets[i + 1]
+    _nbshots: np.ndarray  # Number of shots of each distribution
+    _num_qubits: int
+
+    @classmethod
+    def from_distributions(cls, distributions: Iterable[SampleDistribution]) -> SampleDistributionBatch:
+        """Create a batch from distributions over the same number of qubits."""
+        distributions = list(distributions)
+        num_qubits = distributions[0].num_qubits if distributions else 0
+        if any(d.num_qubits != num_qubits for d in distributions):
+            msg = "Only distributions over the same number of qubits can be batched"
+            raise ValueError(msg)
+        arrays = [d.as_arrays() for d in distributions]
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum([len(values) for _, values in arrays], out=offsets[1:])
+        return cls(
+            np.concatenate([states for states, _ in arrays]) if arrays else np.empty((0, 1), dtype=np.uint64),
+            np.concatenate([values for _, values in arrays]) if arrays else np.empty(0),
+            offsets,
+            np.array([d.nbshots for d in distributions], dtype=np.int64),
+            num_qubits,
+        )
+
+    @property
+    def num_qubits(self) -> int:
+        """Return the number of qubits of each state."""
+        return self._num_qubits
+
+    def __len__(self) -> int:
+        """Return the number of distributions."""
+        return len(self._nbshots)
+
+    def __getitem__(self, i: int) -> SampleDistribution:
+        """Return distribution i, whose arrays are views of the arrays of the batch."""
+        if not -len(self) <= i < len(self):
+            msg = f"Distribution {i} is out of range for a batch of {len(self)} distributions"
+            raise IndexError(msg)
+        i %= len(self)
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return SampleDistribution.from_arrays(
+            self._states[start:end],
+            self._values[start:end],
+            self._num_qubits,
+            int(self._nbshots[i]),
+        )
+
+    def __iter__(self) -> Iterator[SampleDistribution]:
+        """Yield each distribution, see __getitem__."""
+        for i in range(len(self)):
+            yield self[i]
+
+    def merged(self) -> SampleDistribution:
+        """Merge all distributions of the batch into one, see SampleDistribution.merge."""
+        return SampleDistribution.merge(self)
+
 # @dataclass
 # class ExpectationValue:
 #     """A class for representing an expectation value of an observable."""
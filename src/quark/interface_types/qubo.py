@@ -1,15 +1,107 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+from math import isqrt
+from typing import TYPE_CHECKING, Any
+
 import numpy as np
 
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from numpy.typing import DTypeLike
+
+# A pair of variables as used by D-Wave NetworkX, where each variable is indexed by a pair of integers
+DnxKey = tuple[tuple[int, int], tuple[int, int]]
+
+
+def _sparse_module() -> Any:  # noqa: ANN401
+    """Import scipy.sparse, which is only needed to exchange QUBOs with scipy."""
+    try:
+        import scipy.sparse  # noqa: PLC0415
+    except ImportError as e:
+        msg = "scipy is required for sparse matrix conversions, install it with 'pip install QUARK-framework[sparse]'"
+        raise ImportError(msg) from e
+    return scipy.sparse
+
+
+def _upper_triangle(
+    rows: np.ndarray,
+    cols: np.ndarray,
+    values: np.ndarray,
+    n: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Move entries to the upper triangle and remove duplicate entries, keeping the last one, like dict assignment."""
+    rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+    linear = rows.astype(np.int64) * n + cols
+    # np.unique returns the first occurrence, which is the last one in the reversed arrays
+    _, reversed_indices = np.unique(linear[::-1], return_index=True)
+    keep = len(linear) - 1 - reversed_indices
+    return rows[keep], cols[keep], values[keep]
+
+
+# Upper bound for the size of the temporary arrays created while evaluating energies, in elements
+_ENERGY_CHUNK_ELEMENTS: int = 2**24
+
+
+@dataclass(frozen=True)
+class EnergySummary:
+    """A summary of the energies of many samples of a QUBO, see Qubo.summarize_energies."""
+
+    best_indices: np.ndarray  # Indices of the samples with the lowest energies, ordered by their energy
+    best_energies: np.ndarray
+    histogram_counts: np.ndarray
+    histogram_edges: np.ndarray  # One more than the number of counts, as returned by numpy.histogram
+    min: float
+    mean: float
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the summary as a dictionary of plain Python objects, e.g. to include it in the metrics of a module."""
+        return {
+            "best_indices": self.best_indices.tolist(),
+            "best_energies": self.best_energies.tolist(),
+            "histogram_counts": self.histogram_counts.tolist(),
+            "histogram_edges": self.histogram_edges.tolist(),
+            "min": self.min,
+            "mean": self.mean,
+        }
+
 
 class Qubo:
-    """A class for representing a quadratic unconstrained binary optimization (QUBO) problem."""
+    """A class for representing a quadratic unconstrained binary optimization (QUBO) problem.
+
+    The QUBO is given by a symmetric matrix. It is stored either densely as this matrix, or sparsely as the entries of
+    its upper triangle in coordinate format, depending on how it was created. The dense matrix of a sparse QUBO is only
+    created once it is requested, and then kept.
+    """
 
-    _factors: np.ndarray
+    _factors: np.ndarray | None = None  # Dense storage
+    _upper: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None  # Sparse storage as rows, cols and values
+    _n: int  # Number of variables, only set for sparse storage
+
+    @property
+    def size(self) -> int:
+        """Return the number of binary variables of the QUBO."""
+        return self._factors.shape[0] if self._upper is None else self._n  # type: ignore
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Return the data type of the factors of the QUBO."""
+        return self._factors.dtype if self._factors is not None else self._upper[2].dtype  # type: ignore
+
+    @property
+    def is_sparse(self) -> bool:
+        """Return whether the QUBO is stored sparsely, i.e. it was created from entries instead of a matrix."""
+        return self._upper is not None
 
     def as_matrix(self) -> np.ndarray:
         """Return the QUBO as a matrix."""
+        if self._factors is None:
+            rows, cols, values = self._upper  # type: ignore
+            matrix = np.zeros((self._n, self._n), dtype=values.dtype)
+            matrix[rows, cols] = values
+            matrix[cols, rows] = values
+            self._factors = matrix
         return self._factors
 
     @classmethod
@@ -19,66 +111,242 @@ class Qubo:
         qubo._factors = matrix
         return qubo
 
+    def as_coo(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the entries of the upper triangle of the QUBO matrix, including the diagonal.
+
+        For a sparse QUBO, these are its stored entries. For a dense QUBO, these are its nonzero entries.
+
+        :return: The row indices, column indices, and values of the entries, where each row index is at most the
+            corresponding column index
+        """
+        if self._upper is not None:
+            return self._upper
+        rows, cols = np.nonzero(self._factors)
+        upper = rows <= cols
+        rows, cols = rows[upper], cols[upper]
+        return rows, cols, self._factors[rows, cols]  # type: ignore
+
+    @classmethod
+    def from_coo(
+        cls,
+        rows: np.ndarray,
+        cols: np.ndarray,
+        values: np.ndarray,
+        n: int | None = None,
+        dtype: DTypeLike = None,
+    ) -> Qubo:
+        """Create a sparse QUBO from entries in coordinate format.
+
+        Entries in the lower triangle are moved to the upper triangle. If an entry is given more than once, either
+        directly or mirrored, the last one is used.
+
+        :param n: The number of variables, inferred from the largest index if not given
+        :param dtype: The data type of the factors, the type of the values is kept if not given
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=dtype)
+        if n is None:
+            n = int(max(rows.max(initial=-1), cols.max(initial=-1))) + 1
+        qubo = cls()
+        qubo._upper = _upper_triangle(rows, cols, values, n)
+        qubo._n = n
+        return qubo
+
+    def as_sparse(self) -> Any:  # noqa: ANN401
+        """Return the QUBO as a symmetric scipy.sparse.csr_array, which requires scipy."""
+        rows, cols, values = self.as_coo()
+        off_diagonal = rows != cols
+        return _sparse_module().csr_array(
+            (
+                np.concatenate((values, values[off_diagonal])),
+                (np.concatenate((rows, cols[off_diagonal])), np.concatenate((cols, rows[off_diagonal]))),
+            ),
+            shape=(self.size, self.size),
+        )
+
+    @classmethod
+    def from_sparse(cls, matrix: Any, dtype: DTypeLike = None) -> Qubo:  # noqa: ANN401
+        """Create a sparse QUBO from a scipy.sparse matrix or array.
+
+        The matrix is interpreted like one given to from_coo, so it can either be symmetric or contain only the upper
+        triangle.
+        """
+        coo = _sparse_module().coo_array(matrix)
+        coo.sum_duplicates()
+        return cls.from_coo(coo.row, coo.col, coo.data, n=coo.shape[0], dtype=dtype)
+
     def as_dict(self) -> dict:
-        """Return the QUBO as a dictionary."""
-        qubo_dict = {}
-        # Factors matrix is always quadratic
-        n = self._factors.shape[0]
-        for i in range(n):
-            # Matrix is symmetric, so we only need to iterate over the upper triangle
-            for j in range(i, n):
-                if i == j:
-                    qubo_dict[f"q{i}"] = self._factors[i, j]
-                else:
-                    qubo_dict[f"q{i},q{j}"] = self._factors[i, j]
-        return qubo_dict
+        """Return the QUBO as a dictionary.
+
+        A dense QUBO results in an entry for every element of the upper triangle, while a sparse QUBO only results in
+        entries for its stored elements.
+        """
+        if self._upper is None:
+            # Factors matrix is always quadratic and symmetric, so only the upper triangle is needed
+            rows, cols = np.triu_indices(self.size)
+            values = self._factors[rows, cols]  # type: ignore
+        else:
+            rows, cols, values = self._upper
+        keys = [f"q{i}" if i == j else f"q{i},q{j}" for i, j in zip(rows.tolist(), cols.tolist(), strict=True)]
+        return dict(zip(keys, values.tolist(), strict=True))
 
     @classmethod
-    def from_dict(cls, qubo_dict: dict) -> Qubo:
-        """Create a QUBO from a dictionary.
+    def from_dict(cls, qubo_dict: dict, dtype: DTypeLike = np.float64) -> Qubo:
+        """Create a sparse QUBO from a dictionary.
 
         The keys should be in the format 'q0', 'q1', ...,
         or 'q0,q1', 'q0,q2', ... for single qubits and pairs of qubits, respectively.
         """
-        # Look for largest qubit index, assuming all single qubits (on the diagonal) have a value != 0 in the QUBO
-        n = max(int(key.split(",")[0][1:]) for key in qubo_dict) + 1  # +1 for zero-indexing
-        matrix = np.zeros((n, n))
-        for key, value in qubo_dict.items():
-            if "," in key:
-                i, j = key.split(",")
-                i = int(i[1:])  # Skip the 'q' prefix
-                j = int(j[1:])  # Skip the 'q' prefix
-                matrix[i, j] = value
-                matrix[j, i] = value  # Ensure symmetry
-            else:
-                i = int(key[1:])  # Skip the 'q' prefix
-                matrix[i, i] = value
-        return cls.from_matrix(matrix)
-
-    def as_dnx_qubo(self) -> dict:
-        """Return the QUBO as a dictionary suitable for D-Wave NetworkX."""
-        qubo_matrix = self._factors
-        n = int(np.sqrt(len(qubo_matrix)))
-        q = {}
-        for i in range(n * n):
-            for j in range(n * n):
-                if qubo_matrix[i, j] != 0:
-                    i_tuple = (i // n, i % n)
-                    j_tuple = (j // n, j % n)
-                    q[(i_tuple, j_tuple)] = qubo_matrix[i, j]
-        return q
+        # A key without a comma is on the diagonal, so it is split into the same index twice
+        pairs = [key.partition(",") for key in qubo_dict]
+        rows = np.fromiter((int(i[1:]) for i, _, _ in pairs), dtype=np.int64, count=len(pairs))  # Skip the 'q' prefix
+        cols = np.fromiter((int((j or i)[1:]) for i, _, j in pairs), dtype=np.int64, count=len(pairs))
+        values = np.fromiter(qubo_dict.values(), dtype=dtype, count=len(pairs))
+        return cls.from_coo(rows, cols, values)
+
+    def _dnx_side_length(self) -> int:
+        """Return the number of rows of the square grid of variables used by D-Wave NetworkX, e.g. cities in a TSP."""
+        n = isqrt(self.size)
+        if n * n != self.size:
+            msg = f"A QUBO with {self.size} variables cannot be indexed by pairs, as {self.size} is not a square number"
+            raise ValueError(msg)
+        return n
+
+    def _nonzero_chunks(self, chunk_size: int) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Yield the nonzero entries of both triangles of the QUBO matrix in row-major order, in chunks.
+
+        :return: Chunks of row indices, column indices and values, each of about chunk_size entries
+        """
+        if self._upper is None:
+            # The dense matrix is processed in blocks of rows, so only the nonzero entries of one block are held at once
+            rows_per_chunk = max(1, chunk_size // max(1, self.size))
+            for start in range(0, self.size, rows_per_chunk):
+                block = self._factors[start : start + rows_per_chunk]  # type: ignore
+                rows, cols = np.nonzero(block)
+                yield rows + start, cols, block[rows, cols]
+            return
+        rows, cols, values = self._upper
+        off_diagonal = rows != cols
+        rows, cols = np.concatenate((rows, cols[off_diagonal])), np.concatenate((cols, rows[off_diagonal]))
+        values = np.concatenate((values, values[off_diagonal]))
+        nonzero = values != 0
+        order = np.lexsort((cols[nonzero], rows[nonzero]))
+        rows, cols, values = rows[nonzero][order], cols[nonzero][order], values[nonzero][order]
+        for start in range(0, len(values), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            yield rows[chunk], cols[chunk], values[chunk]
+
+    def iter_dnx_qubo(self, chunk_size: int = 100_000) -> Iterator[tuple[DnxKey, float]]:
+        """Yield the items of the dictionary returned by as_dnx_qubo, without creating the whole dictionary at once.
+
+        :param chunk_size: Number of items converted from arrays to Python objects at once
+        """
+        n = self._dnx_side_length()
+        for rows, cols, values in self._nonzero_chunks(chunk_size):
+            i_tuples = zip(*(a.tolist() for a in np.divmod(rows, n)), strict=True)
+            j_tuples = zip(*(a.tolist() for a in np.divmod(cols, n)), strict=True)
+            yield from zip(zip(i_tuples, j_tuples, strict=True), values.tolist(), strict=True)
+
+    def as_dnx_qubo(self) -> dict[DnxKey, float]:
+        """Return the QUBO as a dictionary suitable for D-Wave NetworkX.
+
+        Each variable is indexed by a pair, e.g. a city and its position in a TSP tour, so the number of variables must
+        be a square number. Only nonzero entries are included, from both triangles of the matrix.
+        """
+        return dict(self.iter_dnx_qubo())
 
     @classmethod
-    def from_dnx_qubo(cls, qubo: dict, n: int) -> Qubo:
-        """Create a QUBO from a D-Wave NetworkX dictionary."""
-        qubo_matrix = np.zeros((n * n, n * n))
-        # Fill the QUBO matrix from the dictionary
-        for (i, j), value in qubo.items():
-            # Convert the tuple (i, j) to a single index in the QUBO matrix
-            qubo_matrix[i[0] * n + i[1]][j[0] * n + j[1]] = value
-        # Since the QUBO is symmetric, fill the symmetric part
-        for i in range(n * n):
-            for j in range(n * n):
-                if qubo_matrix[i, j] != 0:
-                    qubo_matrix[j, i] = qubo_matrix[i, j]
-        return cls.from_matrix(qubo_matrix)
+    def from_dnx_qubo(cls, qubo: dict[DnxKey, float], n: int, dtype: DTypeLike = np.float64) -> Qubo:
+        """Create a sparse QUBO from a D-Wave NetworkX dictionary.
+
+        If both an entry and its mirrored entry are given, the one in the upper triangle is used.
+
+        :param qubo: Dictionary mapping pairs of variables, each indexed by a pair of integers, to their factors
+        :param n: The number of rows of the square grid of variables, e.g. the number of cities in a TSP
+        """
+        # Flattened to i[0], i[1], j[0], j[1] for each key
+        indices = np.fromiter(
+            (index for (i, j) in qubo for index in (*i, *j)),
+            dtype=np.int64,
+            count=4 * len(qubo),
+        ).reshape(-1, 4)
+        # Convert each tuple to a single index in the QUBO matrix
+        rows = indices[:, 0] * n + indices[:, 1]
+        cols = indices[:, 2] * n + indices[:, 3]
+        values = np.fromiter(qubo.values(), dtype=dtype, count=len(qubo))
+        nonzero = values != 0
+        rows, cols, values = rows[nonzero], cols[nonzero], values[nonzero]
+        # from_coo keeps the last of mirrored entries, so entries of the upper triangle are moved to the end
+        order = np.argsort(rows <= cols, kind="stable")
+        return cls.from_coo(rows[order], cols[order], values[order], n=n * n)
+
+    def evaluate_energies(self, samples: np.ndarray, chunk_size: int | None = None) -> np.ndarray:
+        """Compute the energy x^T Q x of every sample x, where Q is the QUBO matrix.
+
+        A sparse QUBO is evaluated with scipy.sparse if it is installed, and with plain numpy otherwise.
+
+        :param samples: A 2-D array with one sample of 0 and 1 values, or booleans, per row
+        :param chunk_size: Number of samples processed at once. If None, it is chosen to keep the temporary arrays below
+            a fixed number of elements.
+        :return: A 1-D array containing the energy of each sample
+        """
+        if samples.ndim != 2 or samples.shape[1] != self.size:
+            msg = f"Expected a 2-D array with {self.size} columns, got an array of shape {samples.shape}"
+            raise ValueError(msg)
+        energies = np.empty(samples.shape[0], dtype=np.result_type(self.dtype, np.float64))
+        if self._upper is None:
+            chunk_size = chunk_size or max(1, _ENERGY_CHUNK_ELEMENTS // max(1, self.size))
+            for start in range(0, samples.shape[0], chunk_size):
+                x = samples[start : start + chunk_size].astype(self.dtype)
+                energies[start : start + chunk_size] = np.einsum("ij,ij->i", x @ self._factors, x)
+        else:
+            rows, cols, values = self._upper
+            # Each entry off the diagonal stands for two entries of the symmetric matrix
+            weights = np.where(rows == cols, values, 2 * values)
+            try:
+                sparse = _sparse_module()
+            except ImportError:
+                sparse = None
+            if sparse is not None:  # Sparse matrix products are considerably faster than the fallback below
+                upper_transposed = sparse.csr_array((weights, (cols, rows)), shape=(self.size, self.size))
+                chunk_size = chunk_size or max(1, _ENERGY_CHUNK_ELEMENTS // max(1, self.size))
+                for start in range(0, samples.shape[0], chunk_size):
+                    x = samples[start : start + chunk_size].astype(energies.dtype)
+                    energies[start : start + chunk_size] = np.einsum("ij,ij->i", (upper_transposed @ x.T).T, x)
+            else:
+                chunk_size = chunk_size or max(1, _ENERGY_CHUNK_ELEMENTS // max(1, len(values)))
+                for start in range(0, samples.shape[0], chunk_size):
+                    x = samples[start : start + chunk_size].astype(bool)
+                    # For binary variables, x_i * x_j is one exactly if both are set
+                    energies[start : start + chunk_size] = (x[:, rows] & x[:, cols]) @ weights
+        return energies
+
+    def summarize_energies(
+        self,
+        samples: np.ndarray,
+        k: int = 10,
+        bins: int = 20,
+        chunk_size: int | None = None,
+    ) -> EnergySummary:
+        """Evaluate the energies of all samples and summarize them by the best samples and a histogram.
+
+        :param samples: A 2-D array with one sample per row, see evaluate_energies
+        :param k: Number of samples with the lowest energies to include
+        :param bins: Number of bins of the histogram
+        :param chunk_size: See evaluate_energies
+        """
+        energies = self.evaluate_energies(samples, chunk_size)
+        k = min(k, len(energies))
+        # Partitioning first only sorts the k best energies, instead of all of them
+        best_indices = np.argpartition(energies, k - 1)[:k] if 0 < k < len(energies) else np.arange(k)
+        best_indices = best_indices[np.argsort(energies[best_indices], kind="stable")]
+        histogram_counts, histogram_edges = np.histogram(energies, bins=bins)
+        return EnergySummary(
+            best_indices=best_indices,
+            best_energies=energies[best_indices],
+            histogram_counts=histogram_counts,
+            histogram_edges=histogram_edges,
+            min=float(energies.min()) if len(energies) else float("nan"),
+            mean=float(energies.mean()) if len(energies) else float("nan"),
+        )
@@ -0,0 +1,260 @@
+"""Estimating the size and duration of a run before starting it, and ordering its pipelines by their estimated duration.
+
+Durations are estimated from the times of the pre- and postprocess steps recorded in the results of earlier runs, see
+TimingHistory. Modules are never created for an estimate.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from statistics import fmean
+from typing import TYPE_CHECKING
+
+from quark.benchmarking import ModuleInfo, ModuleNode
+from quark.results_store import load_run
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from quark.config_parsing import PendingChildren, PipelineTree
+    from quark.sweeps import Sweep
+
+
+def _key(name: str, params: dict) -> tuple[str, str]:
+    return name, json.dumps(params, sort_keys=True, default=str)
+
+
+@dataclass(frozen=True)
+class TimingHistory:
+    """The mean times of the pre- and postprocess steps of modules, as recorded in the results of earlier runs.
+
+    Times are looked up for a module with the same name and parameters first. If there is none, the mean over all
+    parameters of a module with the same name is used.
+    """
+
+    # Both map a (name, JSON encoded parameters) key or a module name to the mean time of a single run of a step
+    preprocess_times: dict[tuple[str, str] | str, float] = field(default_factory=dict)
+    postprocess_times: dict[tuple[str, str] | str, float] = field(default_factory=dict)
+
+    @classmethod
+    def from_runs(cls, run_dirs: Iterable[Path]) -> TimingHistory:
+        """Collect the times of all steps of the finished pipeline runs in the given run directories.
+
+        Directories without results, e.g. of runs that were interrupted before any pipeline run finished, are skipped.
+        A preprocess step that was loaded from the preprocess cache is counted with the time it originally took.
+        """
+        preprocess_times: defaultdict[tuple[str, str] | str, list[float]] = defaultdict(list)
+        postprocess_times: defaultdict[tuple[str, str] | str, list[float]] = defaultdict(list)
+        for run_dir in run_dirs:
+            try:
+                records = load_run(run_dir, status="finished")
+            except FileNotFoundError:
+                continue
+            for step in (step for record in records for step in record.steps):
+                name, params = step["module_info"]["name"], step["module_info"]["params"]
+                preprocess_time = step["preprocess_time"] + (step.get("preprocess_time_saved") or 0.0)
+                for key in (_key(name, params), name):
+                    preprocess_times[key].append(preprocess_time)
+                    postprocess_times[key].append(step["postprocess_time"])
+        return cls(
+            {key: fmean(times) for key, times in preprocess_times.items()},
+            {key: fmean(times) for key, times in postprocess_times.items()},
+        )
+
+    def estimate(self, module_info: ModuleInfo) -> tuple[float, float] | None:
+        """Return the estimated times of a single run of the pre- and postprocess steps of a module, if known."""
+        for key in (_key(module_info.name, module_info.params), module_info.name):
+            if key in self.preprocess_times:
+                return self.preprocess_times[key], self.postprocess_times[key]
+        return None
+
+    @cached_property
+    def _names_with_parameters(self) -> set[str]:
+        """Return the names of the modules with times recorded for specific parameters."""
+        return {key[0] for key in self.preprocess_times if isinstance(key, tuple)}
+
+    def estimate_sweep(self, module_info: ModuleInfo, sweep: Sweep) -> tuple[float, float] | None:
+        """Return the estimated times of a single run of each step of a module, summed over the combinations of a sweep.
+
+        Without times recorded for any parameters of the module, every combination is estimated by its name only.
+
+        :param module_info: The module, whose parameters are replaced by each combination of the sweep
+        """
+        if module_info.name not in self._names_with_parameters:
+            times = self.estimate(module_info)
+            return None if times is None else (times[0] * len(sweep), times[1] * len(sweep))
+        preprocess_time = postprocess_time = 0.0
+        for i in range(len(sweep)):
+            times = self.estimate(ModuleInfo(name=module_info.name, params=sweep[i]))
+            if times is None:
+                return None
+            preprocess_time, postprocess_time = preprocess_time + times[0], postprocess_time + times[1]
+        return preprocess_time, postprocess_time
+
+
+@dataclass
+class SubtreeEstimates:
+    """The estimated durations of all subtrees of some pipeline trees, see estimate_subtrees."""
+
+    # Maps the id of the root node of each subtree, or of pending roots, to its estimated duration in seconds
+    durations: dict[int, float]
+    unknown_modules: set[str]  # Names of modules without recorded times, whose steps are estimated to take no time
+
+    def __getitem__(self, node: PipelineTree) -> float:
+        """Return the estimated duration of the subtree rooted at the given node, or of the trees of pending roots."""
+        return self.durations[id(node)]
+
+
+def load_history(run_dirs: list[str] | None = None) -> TimingHistory:
+    """Collect the times of earlier runs from the given run directories, or from all directories in benchmark_runs."""
+    if run_dirs is None:
+        return TimingHistory.from_runs(sorted(path for path in Path("benchmark_runs").glob("*") if path.is_dir()))
+    return TimingHistory.from_runs(Path(run_dir) for run_dir in run_dirs)
+
+
+def _step_times(node: ModuleNode, history: TimingHistory, unknown_modules: set[str]) -> tuple[float, float]:
+    """Return the estimated times of all runs of the pre- and postprocess steps of a node, for a single pipeline."""
+    times = history.estimate(node.module_info)
+    if times is None:
+        unknown_modules.add(node.module_info.name)
+        times = (0.0, 0.0)
+    runs = node.warmup + node.repetitions
+    return runs * times[0], runs * times[1]
+
+
+def _estimate_pending(
+    pending: PendingChildren,
+    history: TimingHistory,
+    unknown_modules: set[str],
+    durations: dict[tuple[int, ...], float],
+) -> float:
+    """Estimate the duration of pending children, without creating them.
+
+    All nodes of a layer have the same number of pipelines passing through them, so each module of a layer is only
+    estimated once, and counted once for every node of the layer above. The combinations of a sweep are estimated from
+    the history without creating their nodes. Pending children restricted to some of their pipelines are estimated in
+    proportion.
+
+    :param durations: The durations of all pipelines of pending children estimated before, by the identities of their
+        layers, which are shared by all nodes of the same layer of a pipeline
+    """
+    sizes = pending.layer_sizes()
+    key = (id(pending.timing_settings), *(id(layer) for layer in pending.layers))
+    if key not in durations:
+        duration = 0.0
+        for depth in range(len(sizes)):
+            num_parents, pipelines_per_node = math.prod(sizes[:depth]), math.prod(sizes[depth + 1 :])
+            for module_info, sweep, runs in pending.layer_modules(depth):
+                times = history.estimate(module_info) if sweep is None else history.estimate_sweep(module_info, sweep)
+                if times is None:
+                    unknown_modules.add(module_info.name)
+                    times = (0.0, 0.0)
+                duration += num_parents * runs * (times[0] + times[1] * pipelines_per_node)
+        durations[key] = duration
+    return durations[key] * pending.num_pipelines / math.prod(sizes)
+
+
+def estimate_subtrees(pipeline_trees: list[PipelineTree], history: TimingHistory) -> SubtreeEstimates:
+    """Estimate the duration of every subtree of the pipeline trees, when run serially.
+
+    A subtree takes as long as the preprocess step of its root, the postprocess step of its root once for every pipeline
+    passing through it, and all of its child subtrees, including pending ones. Steps are counted once per repetition and
+    warmup run. Pending roots are estimated as a whole, as the trees they create.
+    """
+    estimates = SubtreeEstimates({}, set())
+    pending_durations: dict[tuple[int, ...], float] = {}
+    for tree in pipeline_trees:
+        if not isinstance(tree, ModuleNode):
+            duration = _estimate_pending(tree, history, estimates.unknown_modules, pending_durations)
+            estimates.durations[id(tree)] = duration
+            continue
+        # Children are estimated before their parents
+        for node in reversed([tree, *tree.descendants]):
+            preprocess_time, postprocess_time = _step_times(node, history, estimates.unknown_modules)
+            estimates.durations[id(node)] = (
+                preprocess_time
+                + postprocess_time * node.num_pipelines
+                + sum(estimates[child] for child in node.children)
+                + (
+                    0.0
+                    if node.pending_children is None
+                    else _estimate_pending(node.pending_children, history, estimates.unknown_modules, pending_durations)
+                )
+            )
+    return estimates
+
+
+def order_longest_first(pipeline_trees: list[PipelineTree], estimates: SubtreeEstimates) -> list[PipelineTree]:
+    """Sort the children of every node, and the trees themselves, by their estimated duration, longest first.
+
+    Subtrees that are distributed over worker processes are started in this order, so that the longest ones do not end
+    up being started last. The positions of the nodes are not changed, so a run can be resumed as before. Pending
+    children and pending roots are always created in the order given by the config file.
+    """
+    for tree in pipeline_trees:
+        for node in _nodes(tree):
+            node.children = sorted(node.children, key=lambda child: -estimates[child])
+    return sorted(pipeline_trees, key=lambda tree: -estimates[tree])
+
+
+def _nodes(tree: PipelineTree) -> list[ModuleNode]:
+    """Return the nodes of a pipeline tree, or no nodes for pending roots."""
+    return [tree, *tree.descendants] if isinstance(tree, ModuleNode) else []
+
+
+def _num_nodes(tree: PipelineTree) -> int:
+    """Return the number of nodes of a pipeline tree, including the pending ones."""
+    if not isinstance(tree, ModuleNode):
+        return tree.num_nodes
+    nodes = _nodes(tree)
+    return len(nodes) + sum(node.pending_children.num_nodes for node in nodes if node.pending_children is not None)
+
+
+def _describe_tree(tree: PipelineTree) -> str:
+    """Return the position and name of the root of a pipeline tree, or those of the trees created by pending roots."""
+    if isinstance(tree, ModuleNode):
+        return f"Tree {tree.position} ({tree.module_info.name})"
+    positions = tree.root_positions()
+    names = sorted({module_info.name for module_info, _, _ in tree.layer_modules(0)})
+    trees = f"Tree {positions[0]}" if len(positions) == 1 else f"Trees {positions[0]}-{positions[-1]}"
+    return f"{trees} ({', '.join(names)})"
+
+
+def describe_plan(pipeline_trees: list[PipelineTree], estimates: SubtreeEstimates) -> list[str]:
+    """Describe the pipelines of a run and their estimated duration, as lines to be printed.
+
+    The description contains the number of pipelines and nodes, how many preprocess steps are saved by running
+    prefixes shared by several pipelines only once, and the estimated duration of each pipeline tree. The trees created
+    by pending roots are described together.
+    """
+    nodes = [node for tree in pipeline_trees for node in _nodes(tree)]
+    num_pipelines = sum(tree.num_pipelines for tree in pipeline_trees)
+    num_nodes = sum(_num_nodes(tree) for tree in pipeline_trees)
+    # Nodes needed if no prefix was shared, i.e. the length of every pipeline
+    unshared_nodes = (
+        sum(len(node.path) for node in nodes if node.is_leaf and node.pending_children is None)
+        + sum(
+            node.pending_children.num_pipelines * (len(node.path) + len(node.pending_children.layers))
+            for node in nodes
+            if node.pending_children is not None
+        )
+        + sum(tree.num_pipelines * len(tree.layers) for tree in pipeline_trees if not isinstance(tree, ModuleNode))
+    )
+    lines = [
+        f"Pipelines: {num_pipelines}",
+        f"Nodes: {num_nodes}, {unshared_nodes - num_nodes} preprocess steps saved by shared prefixes",
+        f"Estimated duration: {sum(estimates[tree] for tree in pipeline_trees):.3f} seconds, if run serially",
+    ]
+    if estimates.unknown_modules:
+        lines.append(f"No recorded times for modules {sorted(estimates.unknown_modules)}, estimated as 0 seconds")
+    lines.extend(
+        f"  {_describe_tree(tree)}: {tree.num_pipelines} pipelines, "
+        f"{_num_nodes(tree)} nodes, {estimates[tree]:.3f} seconds"
+        for tree in pipeline_trees
+    )
+    return lines
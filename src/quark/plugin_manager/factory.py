@@ -1,3 +1,7 @@
+import atexit
+import json
+import logging
+from collections import OrderedDict
 from collections.abc import Callable
 from typing import Any
 
@@ -5,6 +9,26 @@ from quark.core import Core
 
 plugin_creation_funcs: dict[str, Callable[..., Core]] = {}
 
+# Modules of plugins that were not imported yet, mapping the name of each module to the plugin providing it
+lazy_modules: dict[str, str] = {}
+
+# Idle instances of reusable modules, see Core.reusable, by the name and the JSON encoded parameters they were created
+# with. At most one instance is kept per name and parameters, and at most max_idle_instances in total, evicting the
+# least recently released instance first.
+_idle_instances: OrderedDict[tuple[str, str], Core] = OrderedDict()
+max_idle_instances: int = 8
+
+
+def _pool_key(module_name: str, arguments: dict[str, Any]) -> tuple[str, str]:
+    return module_name, json.dumps(arguments or {}, sort_keys=True, default=repr)
+
+
+def _evict(instance: Core) -> None:
+    try:
+        instance.release_resources()
+    except Exception:  # A failing module must not fail the run, as its results are already written
+        logging.exception(f"Releasing the resources of an instance of {type(instance).__name__} failed")
+
 
 def register(plugin_type: str, creator_fn: Callable[..., Core]) -> None:
     """Register a module with the factory.
@@ -19,11 +43,28 @@ def register(plugin_type: str, creator_fn: Callable[..., Core]) -> None:
     plugin_creation_funcs[plugin_type] = creator_fn
 
 
+def register_lazy(module_name: str, plugin: str) -> None:
+    """Declare that a module is provided by a plugin that is not imported yet.
+
+    The plugin is imported and its register function is called when the module is created for the first time, see
+    loader.load_plugins.
+    """
+    lazy_modules[module_name] = plugin
+
+
 def create(module_name: str, arguments: dict[str, Any]) -> Core:
     """Create an instance of a module previously registered with the factory.
 
-    The module_name must be the same the one given when the factory.register function was called for the module.
+    The module_name must be the same the one given when the factory.register function was called for the module. If an
+    idle instance of a reusable module with the same name and parameters was released before, it is returned instead.
     """
+    instance = _idle_instances.pop(_pool_key(module_name, arguments), None)
+    if instance is not None:
+        return instance
+    if module_name not in plugin_creation_funcs and module_name in lazy_modules:
+        from quark.plugin_manager import loader  # noqa: PLC0415  # The loader itself imports the factory
+
+        loader.load_plugin(lazy_modules[module_name])
     try:
         creator_func = plugin_creation_funcs[module_name]
     except KeyError as exc:
@@ -32,3 +73,40 @@ def create(module_name: str, arguments: dict[str, Any]) -> Core:
 
     # TODO is this syntax still necessary if arguments is no longer optional?
     return creator_func(**(arguments or {}))
+
+
+def release(module_name: str, arguments: dict[str, Any], instance: Core) -> None:
+    """Hand back an instance whose node is done, so that the next node with the same module can reuse it.
+
+    Instances of modules that are not reusable are simply dropped. Releasing an instance may evict others, see
+    _idle_instances, or the instance itself if max_idle_instances is 0.
+
+    :param module_name: The name the instance was created with
+    :param arguments: The parameters the instance was created with
+    :param instance: The instance, which must not be used by its node anymore
+    """
+    if not instance.reusable:
+        return
+    key = _pool_key(module_name, arguments)
+    previous = _idle_instances.pop(key, None)  # Only the most recently released instance is kept
+    evicted = [] if previous is None or previous is instance else [previous]
+    _idle_instances[key] = instance
+    while len(_idle_instances) > max_idle_instances:
+        evicted.append(_idle_instances.popitem(last=False)[1])
+    for evicted_instance in evicted:
+        _evict(evicted_instance)
+
+
+def discard(instance: Core) -> None:
+    """Release the resources of an instance of a reusable module that must not be reused, e.g. after it raised."""
+    if instance.reusable:
+        _evict(instance)
+
+
+def clear_pool() -> None:
+    """Evict all idle instances of reusable modules, which is done automatically at exit."""
+    while _idle_instances:
+        _evict(_idle_instances.popitem(last=False)[1])
+
+
+atexit.register(clear_pool)
@@ -1,6 +1,18 @@
 import importlib
+import logging
+import sys
+from importlib.metadata import entry_points
+from time import perf_counter
 from typing import Protocol
 
+from quark.plugin_manager import factory
+
+# Entry point group in which installed plugins can declare their modules, so that they are only imported when needed
+ENTRY_POINT_GROUP: str = "quark.modules"
+
+# A plugin as given in the config file, either by its name only, or together with the names of its modules
+PluginSpec = str | dict[str, list[str]]
+
 
 class PluginInterface(Protocol):
     """Every plugin must implement this interface.
@@ -30,8 +42,56 @@ def _import_plugin(plugin_file: str) -> PluginInterface:
     return importlib.import_module(plugin_file)  # type: ignore
 
 
-def load_plugins(plugin_files: list[str]) -> None:
-    """Import and register the plugins at the path-strings given."""
-    for plugin_file in plugin_files:
-        plugin = _import_plugin(plugin_file)
-        plugin.register()
+def load_plugin(plugin_file: str) -> None:
+    """Import a plugin and call its register function, logging how long the import took and how much it imported."""
+    modules_before = len(sys.modules)
+    t1 = perf_counter()
+    plugin = _import_plugin(plugin_file)
+    import_time = perf_counter() - t1
+    logging.info(
+        f"Imported plugin {plugin_file} in {import_time:.3f} seconds, "
+        f"which imported {len(sys.modules) - modules_before} modules",
+    )
+    plugin.register()
+    # Its modules are registered now, so they no longer need to be loaded lazily
+    for module_name in [name for name, plugin_name in factory.lazy_modules.items() if plugin_name == plugin_file]:
+        del factory.lazy_modules[module_name]
+
+
+def _declared_modules() -> dict[str, list[str]]:
+    """Return the names of the modules declared by installed plugins through entry points, grouped by plugin."""
+    declared: dict[str, list[str]] = {}
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        declared.setdefault(entry_point.module, []).append(entry_point.name)
+    return declared
+
+
+def load_plugins(plugin_files: list[PluginSpec]) -> None:
+    """Import and register the plugins at the path-strings given.
+
+    A plugin whose modules are declared, either in the config file or through entry points, is not imported here.
+    Instead, its modules are registered lazily, so the plugin is only imported when one of them is first created.
+    """
+    t1 = perf_counter()
+    modules_before = len(sys.modules)
+    declared = _declared_modules()
+    lazy_plugins = []
+    for plugin_spec in plugin_files:
+        match plugin_spec:
+            case dict():
+                plugins_with_modules = list(plugin_spec.items())
+            case plugin_file if plugin_file in declared:
+                plugins_with_modules = [(plugin_file, declared[plugin_file])]
+            case plugin_file:
+                load_plugin(plugin_file)
+                continue
+        for plugin_file, module_names in plugins_with_modules:
+            for module_name in module_names:
+                factory.register_lazy(module_name, plugin_file)
+            lazy_plugins.append(plugin_file)
+    logging.info(
+        f"Loaded {len(plugin_files) - len(lazy_plugins)} plugins in {perf_counter() - t1:.3f} seconds, "
+        f"which imported {len(sys.modules) - modules_before} modules",
+    )
+    if lazy_plugins:
+        logging.info(f"Plugins imported on first use of one of their modules: {', '.join(lazy_plugins)}")
@@ -0,0 +1,186 @@
+# ruff: noqa: ANN401
+
+"""A persistent, content-addressed cache for the results of preprocess steps.
+
+The cache is shared between runs. An entry is identified by the name and parameters of a module, the version of the
+plugin providing it, and a hash of the data it received from its upstream module. Plugins that are not installed as a
+distribution are identified by a hash of their source files instead of a version. The size of the cache directory is
+bounded, evicting the least recently used entries first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import pickle
+import sys
+from contextlib import suppress
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from quark.benchmarking import ModuleInfo
+    from quark.core import Core
+
+ENTRY_SUFFIX: str = ".pkl"
+# Evicting entries frees space down to this fraction of the maximum size, so that the next entries can be stored without
+# evicting again right away
+EVICTION_TARGET: float = 0.9
+
+# The size of each cache directory used by this process, as found by its last scan plus the entries stored since. Other
+# processes may store entries as well, which is only noticed by the next scan, once the tracked size exceeds the limit.
+_tracked_sizes: dict[Path, int] = {}
+
+
+@dataclass(frozen=True)
+class CachedPreprocess:
+    """A cache entry, storing the output of a preprocess step and the time it originally took to compute it.
+
+    The module instance is stored as well, as modules often keep some state from their preprocess step that is needed
+    in their postprocess step.
+    """
+
+    data: Any
+    module: Core
+    preprocess_time: float
+
+
+def _source_hash(package: str) -> str:
+    """Return a hash of the Python source files of an imported top-level package, or an empty string if it has none."""
+    module = sys.modules.get(package)
+    if module is None:
+        return ""
+    if hasattr(module, "__path__"):
+        directories = [Path(directory) for directory in module.__path__]
+        files = sorted((path.relative_to(d).as_posix(), path) for d in directories for path in d.rglob("*.py"))
+    elif getattr(module, "__file__", None):
+        files = [(Path(module.__file__).name, Path(module.__file__))]  # type: ignore
+    else:
+        return ""
+    source_hash = hashlib.sha256()
+    for name, path in files:
+        with suppress(OSError):  # E.g. for a file removed since the package was imported
+            source_hash.update(name.encode() + b"\0" + path.read_bytes())
+    return source_hash.hexdigest()
+
+
+@cache
+def _plugin_version(package: str) -> str:
+    """Return the version of the distribution providing the given top-level package.
+
+    If no distribution provides it, e.g. for a plugin imported from sys.path, its __version__ attribute, if any, is
+    combined with a hash of its source files, so that editing the plugin invalidates its cache entries.
+    """
+    for distribution in importlib.metadata.packages_distributions().get(package, []):
+        try:
+            return importlib.metadata.version(distribution)
+        except importlib.metadata.PackageNotFoundError:
+            continue
+    version = str(getattr(sys.modules.get(package), "__version__", ""))
+    return f"{version}+source.{_source_hash(package)}"
+
+
+@dataclass(frozen=True)
+class PreprocessCache:
+    """Stores the results of preprocess steps in a local directory.
+
+    Only the path and the size limit are stored in an instance, so it can be sent to worker processes cheaply.
+    """
+
+    directory: Path
+    max_size: int  # Maximum size of all entries combined in bytes
+
+    def key(self, module_info: ModuleInfo, module: Core, upstream_data: Any) -> str | None:
+        """Compute the key identifying a preprocess step.
+
+        :return: The key as a hex string, or None if the upstream data cannot be hashed
+        """
+        try:
+            upstream_hash = hashlib.sha256(pickle.dumps(upstream_data, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+        except (pickle.PicklingError, TypeError, AttributeError):  # E.g. for locks, lambdas or local classes
+            logging.warning(f"Upstream data of module {module_info} cannot be hashed, skipping the preprocess cache")
+            return None
+        key_data = json.dumps(
+            {
+                "name": module_info.name,
+                "params": module_info.params,
+                "plugin_version": _plugin_version(type(module).__module__.partition(".")[0]),
+                "upstream": upstream_hash,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(key_data.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory.joinpath(key[:2], key + ENTRY_SUFFIX)
+
+    def load(self, key: str) -> CachedPreprocess | None:
+        """Return the entry stored for the given key, or None if there is none."""
+        path = self._path(key)
+        try:
+            with path.open("rb") as f:
+                entry: CachedPreprocess = pickle.load(f)  # noqa: S301
+        except FileNotFoundError:
+            return None
+        # A corrupted entry, or one whose module changed so that it cannot be unpickled, is treated like a missing one
+        except (pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError):
+            logging.warning(f"Preprocess cache entry {path} could not be read, ignoring it")
+            return None
+        os.utime(path)  # Marks the entry as recently used
+        return entry
+
+    def store(self, key: str, entry: CachedPreprocess) -> bool:
+        """Store an entry and evict the least recently used entries if the cache grew too large.
+
+        The size of the cache is tracked by each process, so the cache directory is only scanned by the first store of a
+        process, and whenever the tracked size exceeds the limit.
+
+        :return: Whether the entry was stored, which fails if it cannot be pickled
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            with tmp_path.open("wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):  # Not every preprocess result can be pickled
+            logging.warning(f"Preprocess result for cache entry {key} cannot be pickled, not caching it")
+            tmp_path.unlink(missing_ok=True)
+            return False
+        size = tmp_path.stat().st_size
+        with suppress(FileNotFoundError):  # An existing entry, e.g. a corrupted one, is replaced
+            size -= path.stat().st_size
+        tmp_path.replace(path)  # Atomic, so concurrent runs never read a partially written entry
+        if self.directory not in _tracked_sizes:
+            _tracked_sizes[self.directory] = self._evict(self.max_size)
+        else:
+            _tracked_sizes[self.directory] += size
+            if _tracked_sizes[self.directory] > self.max_size:
+                _tracked_sizes[self.directory] = self._evict(int(self.max_size * EVICTION_TARGET))
+        return True
+
+    def _evict(self, target_size: int) -> int:
+        """Scan the cache directory and evict the least recently used entries until it is no larger than target_size.
+
+        :return: The size of the remaining entries
+        """
+        entries = []
+        for path in self.directory.glob("*/*" + ENTRY_SUFFIX):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Evicted concurrently
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+        return total_size
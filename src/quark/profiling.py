@@ -0,0 +1,68 @@
+"""Profiling the pre- and postprocess steps of selected modules with cProfile.
+
+Each profiled step is written to its own .pstats file in the profiles directory of the run, named after the step and the
+position of its node. When a pipeline run is done, the profiles of its steps are copied next to its results, see
+results.ResultSink.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import os
+from dataclasses import dataclass
+from time import time_ns
+from typing import TYPE_CHECKING, Self
+
+if TYPE_CHECKING:
+    from pathlib import Path
+    from types import TracebackType
+
+    from quark.benchmarking import ModuleNode
+
+PROFILES_DIR_NAME: str = "profiles"
+PROFILE_FILE_SUFFIX: str = ".pstats"
+
+
+@dataclass(frozen=True)
+class Profiler:
+    """Settings of the profiler, shared by every step of a run.
+
+    Only the path and the module names are stored in an instance, so it can be sent to worker processes cheaply.
+    """
+
+    directory: Path
+    modules: frozenset[str] | None = None  # Names of the modules to profile, all modules are profiled if None
+
+    def profile(self, node: ModuleNode, step: str) -> StepProfile | None:
+        """Return a context manager profiling the given step of a node, or None if its module is not selected.
+
+        :param node: The node whose module is run inside the context
+        :param step: Either "preprocess" or "postprocess"
+        """
+        if self.modules is not None and node.module_info.name not in self.modules:
+            return None
+        # A node runs its postprocess step once per pipeline run, so the time is needed to keep the names unique
+        file_name = f"{step}-{node.position}-{time_ns()}-{os.getpid()}{PROFILE_FILE_SUFFIX}"
+        return StepProfile(self.directory.joinpath(file_name))
+
+
+class StepProfile:
+    """Profiles one pre- or postprocess step, writing the profile to the given path when the context is left."""
+
+    def __init__(self, path: Path) -> None:  # noqa: D107
+        self.path = path
+        self._profile = cProfile.Profile()
+
+    def __enter__(self) -> Self:  # noqa: D105
+        self._profile.enable()
+        return self
+
+    def __exit__(  # noqa: D105
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._profile.disable()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(self.path)
@@ -1,17 +1,197 @@
+"""Logging of a QUARK run.
+
+Log records are only put on a queue by the code emitting them, and formatted and written by a listener thread, so that
+writing to the console and the log file does not slow down the tree runner. Worker processes forward their records to
+the same listener. The depth of the current node in the benchmarking tree and its module are kept in a context
+variable, which is read when a record is emitted.
+
+Besides the human-readable log, one JSON object per finished or failed pre- and postprocess step is written to a
+separate file, see log_step.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
 import logging
+import queue
+from contextvars import ContextVar
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    import multiprocessing.queues
+    from pathlib import Path
+
+    from quark.benchmarking import ModuleInfo
+
+LOG_FILE_NAME = "logging.log"
+STEPS_FILE_NAME = "steps.jsonl"
+
+
+@dataclass(frozen=True)
+class LogContext:
+    """The position in the benchmarking tree that log records are emitted from."""
+
+    depth: int = 0
+    module_info: ModuleInfo | None = None
+
+
+_context: ContextVar[LogContext] = ContextVar("quark_log_context", default=LogContext())  # noqa: B039
+
+# Records of this logger are only written to the steps file, and it is only enabled once the steps file is set up
+_step_logger = logging.getLogger("quark.steps")
+_step_logger.setLevel(logging.INFO)  # Independent of the level of the human-readable log
+_step_logger.disabled = True
+
+# A single formatter is shared by the console and the log file, the indent of each record is set by _add_context
+_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(indent)s%(message)s", defaults={"indent": ""})
+
+_listeners: list[QueueListener] = []
+_handlers: list[logging.Handler] = []  # The handlers writing the records of all listeners
+_worker_queue: multiprocessing.queues.Queue | None = None
+_worker_listener: QueueListener | None = None  # The listener of the records forwarded by worker processes
+
+
+def _add_context(record: logging.LogRecord) -> bool:
+    """Attach the current log context to a record before it is put on the queue."""
+    context = _context.get()
+    record.indent = " " * 4 * context.depth
+    if record.name == _step_logger.name:
+        module_info = context.module_info
+        record.step = {
+            "depth": context.depth,
+            "module": None if module_info is None else module_info.name,
+            "params": None if module_info is None else module_info.params,
+            **record.step,
+        }
+    return True
+
+
+def _is_step(record: logging.LogRecord) -> bool:
+    return record.name == _step_logger.name
+
+
+def _is_not_step(record: logging.LogRecord) -> bool:
+    return record.name != _step_logger.name
+
+
+class _StepFormatter(logging.Formatter):
+    """Formats the record of a step as a single line of JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({"time": record.created, "pid": record.process, **record.step}, default=str)
+
+
+def _queue_handler(log_queue: queue.SimpleQueue | multiprocessing.queues.Queue) -> QueueHandler:
+    handler = QueueHandler(log_queue)
+    handler.addFilter(_add_context)
+    return handler
+
+
+def stop_worker_logging() -> None:
+    """Write the records forwarded by worker processes that are still queued, and stop their listener.
+
+    Called once the worker processes exited, when their pool is shut down. This must happen before the interpreter shuts
+    down, as stopping the listener sends a sentinel through the queue shared with the workers, which starts a thread.
+    """
+    global _worker_queue, _worker_listener  # noqa: PLW0603
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _listeners.remove(_worker_listener)
+        _worker_listener = None
+    if _worker_queue is not None:
+        _worker_queue.close()
+        _worker_queue.join_thread()
+        _worker_queue = None
+
+
+def stop_logger() -> None:
+    """Write all records that are still queued and stop the listeners, which is done automatically at exit."""
+    stop_worker_logging()
+    for listener in _listeners:
+        listener.stop()
+    for handler in _handlers:
+        handler.close()
+    _listeners.clear()
+    _handlers.clear()
+
+
+atexit.register(stop_logger)
+
+
+def set_logger(base_path: Path, level: str = "INFO") -> None:
+    """Set up the logger to write to the console, to a log file, and to a steps file in the store directory.
+
+    :param base_path: The directory the log file and the steps file are written to, existing files are appended to
+    :param level: The minimum level of the records written to the console and the log file
+    """
+    stop_logger()
+    console_handler = logging.StreamHandler()
+    file_handler = logging.FileHandler(base_path.joinpath(LOG_FILE_NAME))
+    for handler in (console_handler, file_handler):
+        handler.setFormatter(_formatter)
+        handler.addFilter(_is_not_step)
+    steps_handler = logging.FileHandler(base_path.joinpath(STEPS_FILE_NAME))
+    steps_handler.setFormatter(_StepFormatter())
+    steps_handler.addFilter(_is_step)
+    _handlers.extend((console_handler, file_handler, steps_handler))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *_handlers)
+    listener.start()
+    _listeners.append(listener)
+    root = logging.getLogger()
+    root.handlers = [_queue_handler(log_queue)]
+    root.setLevel(level)
+    _step_logger.disabled = False
+
+
+@dataclass(frozen=True)
+class WorkerLogging:
+    """Everything a worker process needs to forward its log records to the listener of the main process."""
+
+    log_queue: multiprocessing.queues.Queue
+    level: int
+
+    def install(self) -> None:
+        """Replace the handlers of the worker process, e.g. ones inherited by forking, with a forwarding handler."""
+        root = logging.getLogger()
+        root.handlers = [_queue_handler(self.log_queue)]
+        root.setLevel(self.level)
+        _step_logger.disabled = False
+
+
+def worker_logging() -> WorkerLogging | None:
+    """Return the logging setup for worker processes, or None if the logger was not set up by set_logger.
+
+    Records of worker processes are sent through a queue shared between processes, which is only created, along with
+    its listener, once the first worker processes are started. Both are stopped by stop_worker_logging.
+    """
+    global _worker_queue, _worker_listener  # noqa: PLW0603
+    if not _listeners:
+        return None
+    if _worker_queue is None:
+        import multiprocessing  # noqa: PLC0415  Only imported once worker processes are started
+
+        _worker_queue = multiprocessing.Queue()
+        _worker_listener = QueueListener(_worker_queue, *_handlers)
+        _worker_listener.start()
+        _listeners.append(_worker_listener)
+    return WorkerLogging(_worker_queue, logging.getLogger().level)
+
 
+def set_logging_context(depth: int, module_info: ModuleInfo | None = None) -> None:
+    """Set the depth within the benchmarking tree, which records are indented by, and the module being run."""
+    _context.set(LogContext(depth, module_info))
 
-def set_logger(path: str) -> None:
-    """Set up the logger to also write to a file in the store directory."""
-    logging.getLogger().handlers = []
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[logging.StreamHandler(), logging.FileHandler(path)],
-    )
 
+def log_step(event: str, **fields: Any) -> None:  # noqa: ANN401
+    """Write a record of a pre- or postprocess step to the steps file, together with the current log context.
 
-def set_logging_depth(depth: int) -> None:
-    """Set up indents according to depth within the benchmarking tree."""
-    for handler in logging.getLogger().handlers:
-        handler.setFormatter(logging.Formatter(f"%(asctime)s [%(levelname)s] {' ' * 4 * depth}%(message)s", None, "%"))
+    :param event: The kind of the step, e.g. "preprocess" or "postprocess_failed"
+    :param fields: Further values describing the step, which are written as JSON
+    """
+    if not _step_logger.disabled:
+        _step_logger.info(event, extra={"step": {"event": event, **fields}})
@@ -0,0 +1,257 @@
+"""Writing the results of pipeline runs to the run directory as soon as each pipeline run is done."""
+
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+from dataclasses import dataclass, fields
+from textwrap import wrap
+from typing import TYPE_CHECKING, Any
+
+from quark.benchmarking import FailedPipelineRun, FinishedPipelineRun, ModuleRunMetrics
+from quark.interface_types.other import Other
+from quark.profiling import PROFILES_DIR_NAME
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from quark.benchmarking import ModuleInfo
+    from quark.checkpoint import CheckpointJournal
+    from quark.interface_types import InterfaceType
+    from quark.results_store import ResultsStore
+
+PIPELINES_DIR_NAME: str = "pipelines"
+FAILED_PIPELINES_DIR_NAME: str = "failed_pipelines"
+RESULTS_FILE_NAME: str = "results.json"
+RESULTS_LINES_FILE_NAME: str = "results.jsonl"
+
+# Fields of ModuleRunMetrics that are only set if the corresponding feature is used, and left out of the results if not
+_OPTIONAL_STEP_FIELDS: frozenset[str] = frozenset(f.name for f in fields(ModuleRunMetrics) if f.default is None)
+
+
+def extract_result(result: InterfaceType) -> float | None:
+    """Return the result of a pipeline run as a number, or None if it is not numeric and therefore cannot be plotted."""
+    match result:
+        case Other(data) if isinstance(data, int):
+            return float(data)
+        case Other(data) if isinstance(data, float):
+            return data
+        case _:
+            return None
+
+
+def unique_dir_name(dir_name: str, taken: set[str]) -> str:
+    """Return a directory name that is not taken yet, and mark it as taken.
+
+    Identical pipelines, e.g. the same leaf module given twice in a layer, have the same directory name, so all but the
+    first are given a number.
+
+    :param dir_name: The name made of the unique names of the steps of a pipeline run
+    :param taken: The names of the pipeline runs written before, which the returned name is added to
+    """
+    name = dir_name
+    i = 2
+    while name in taken:
+        name = f"{dir_name}_{i}"
+        i += 1
+    taken.add(name)
+    return name
+
+
+def _encode_step(step: ModuleRunMetrics) -> dict[str, Any]:
+    """Return the metrics of a step as a dictionary, leaving out the optional fields that are not set.
+
+    The dictionary is a new one, so that encoding does not modify the step itself.
+    """
+    d = {key: value for key, value in step.__dict__.items() if value is not None or key not in _OPTIONAL_STEP_FIELDS}
+    d["module_info"] = step.module_info.__dict__
+    return d
+
+
+class FinishedPipelineRunResultEncoder(json.JSONEncoder):
+    """JSONEncoder for the FinishedPipelineRun class."""
+
+    def default(self, o: Any) -> Any:  # noqa: ANN401 D102
+        if not isinstance(o, FinishedPipelineRun):
+            # Let the base class default method raise the TypeError
+            return super().default(o)
+        d = o.__dict__.copy()
+        del d["origin"]  # Only used to resume runs, not meaningful to a reader of the results
+        match extract_result(d["result"]):
+            case None:
+                del d["result"]
+            case result:
+                d["result"] = result
+        d["steps"] = [_encode_step(step) for step in o.steps]
+        return d
+
+
+class FailedPipelineRunResultEncoder(json.JSONEncoder):
+    """JSONEncoder for the FailedPipelineRun class."""
+
+    def default(self, o: Any) -> Any:  # noqa: ANN401 D102
+        if not isinstance(o, FailedPipelineRun):
+            # Let the base class default method raise the TypeError
+            return super().default(o)
+        d = o.__dict__.copy()
+        del d["origin"]  # Only used to resume runs, not meaningful to a reader of the results
+        d["metrics_up_to_now"] = [_encode_step(step) for step in o.metrics_up_to_now]
+        return d
+
+
+@dataclass(frozen=True)
+class FinishedPipelineRunSummary:
+    """The part of a finished pipeline run that is kept in memory after its results were written."""
+
+    dir_name: str
+    module_infos: list[ModuleInfo]
+    result: float | None
+    total_time: float
+    additional_metrics: list[dict]
+
+
+@dataclass(frozen=True)
+class FailedPipelineRunSummary:
+    """The part of a failed pipeline run that is kept in memory after its results were written."""
+
+    dir_name: str
+    module_infos: list[ModuleInfo]
+    reason: str
+    additional_metrics: list[dict]
+
+
+class ResultSink:
+    """Writes the results of each pipeline run to the run directory as soon as the pipeline run is done.
+
+    Each pipeline run gets its own directory containing a results.json file. Additionally, one line per pipeline run is
+    appended to the results.jsonl file of the run. The profiles of its steps, if any, are copied into its directory as
+    well. If a results store is given, each pipeline run is written to it instead, and no directories are created.
+    Afterward, only a small summary of the pipeline run is kept in memory, which is used for the final summary and plot.
+    If a checkpoint journal is given, the summary is recorded in it as well, marking the pipeline run as done.
+    """
+
+    def __init__(
+        self,
+        base_path: Path,
+        finished_summaries: list[FinishedPipelineRunSummary] | None = None,
+        failed_summaries: list[FailedPipelineRunSummary] | None = None,
+        journal: CheckpointJournal | None = None,
+        store: ResultsStore | None = None,
+        *,
+        resumed: bool = False,
+    ) -> None:
+        """Initialize a ResultSink, optionally continuing from the summaries of a previous, interrupted run.
+
+        :param resumed: Whether the run is resumed. Only then, the directory of a pipeline run may exist already, if the
+            previous run crashed after writing it, but before journaling its summary. It is overwritten in that case.
+        """
+        self.base_path = base_path
+        self.finished_summaries = finished_summaries or []
+        self.failed_summaries = failed_summaries or []
+        self.journal = journal
+        self.store = store
+        self.resumed = resumed
+        self._finished_dir_names = {summary.dir_name for summary in self.finished_summaries}
+
+    def __call__(self, pipeline_run: FinishedPipelineRun | FailedPipelineRun) -> None:
+        """Write the results of a pipeline run and keep its summary."""
+        match pipeline_run:
+            case FinishedPipelineRun(result, steps):
+                dir_name = str.join("-", (step.unique_name for step in steps))
+                dir_name = unique_dir_name(dir_name, self._finished_dir_names)
+                dir_path = self.base_path.joinpath(PIPELINES_DIR_NAME, dir_name)
+                status = "finished"
+                encoder = FinishedPipelineRunResultEncoder
+                summary = FinishedPipelineRunSummary(
+                    dir_name=dir_name,
+                    module_infos=[step.module_info for step in steps],
+                    result=extract_result(result),
+                    total_time=sum(step.preprocess_time + step.postprocess_time for step in steps),
+                    additional_metrics=[step.additional_metrics for step in steps],
+                )
+                self.finished_summaries.append(summary)
+            case FailedPipelineRun(reason, metrics_up_to_now):
+                # The index is part of the name, as failed pipelines often have no steps to name them after
+                dir_name = str(len(self.failed_summaries)) + str.join(
+                    "-",
+                    (step.unique_name for step in metrics_up_to_now),
+                )
+                dir_path = self.base_path.joinpath(FAILED_PIPELINES_DIR_NAME, dir_name)
+                status = "failed"
+                encoder = FailedPipelineRunResultEncoder
+                summary = FailedPipelineRunSummary(
+                    dir_name=dir_name,
+                    module_infos=[step.module_info for step in metrics_up_to_now],
+                    reason=reason,
+                    additional_metrics=[step.additional_metrics for step in metrics_up_to_now],
+                )
+                self.failed_summaries.append(summary)
+        if self.store is not None:
+            from quark.results_store import PipelineRunRecord  # noqa: PLC0415  results_store imports this module
+
+            encoded = json.loads(json.dumps(pipeline_run, cls=encoder))
+            self.store.write(PipelineRunRecord.from_encoded(dir_name, status, encoded))
+        else:
+            self._write_files(pipeline_run, dir_path, status, encoder)
+        if self.journal is not None:
+            self.journal.record_done(pipeline_run.origin, summary)
+
+    def _write_files(
+        self,
+        pipeline_run: FinishedPipelineRun | FailedPipelineRun,
+        dir_path: Path,
+        status: str,
+        encoder: type[json.JSONEncoder],
+    ) -> None:
+        """Write the results.json file of a pipeline run into its directory, and append it to the results.jsonl file."""
+        # The directory already exists if a previous run crashed after writing it, but before journaling the summary
+        dir_path.mkdir(parents=True, exist_ok=self.resumed)
+        dir_path.joinpath(RESULTS_FILE_NAME).write_text(json.dumps(pipeline_run, cls=encoder, indent=4))
+        steps = pipeline_run.steps if isinstance(pipeline_run, FinishedPipelineRun) else pipeline_run.metrics_up_to_now
+        for profile in (p for step in steps for p in (step.preprocess_profile, step.postprocess_profile) if p):
+            # Preprocess profiles are shared by every pipeline run through the same node, so they are copied, not moved
+            shutil.copyfile(self.base_path.joinpath(PROFILES_DIR_NAME, profile), dir_path.joinpath(profile))
+        line = {
+            "status": status,
+            "dir": dir_path.relative_to(self.base_path).as_posix(),
+            **json.loads(json.dumps(pipeline_run, cls=encoder)),
+        }
+        with self.base_path.joinpath(RESULTS_LINES_FILE_NAME).open("a") as f:
+            f.write(json.dumps(line) + "\n")
+
+    def close(self) -> None:
+        """Close the results store, if any."""
+        if self.store is not None:
+            self.store.close()
+
+    def write_summary(self) -> None:
+        """Log a summary of all pipeline runs and plot the results of the finished ones."""
+        bar_plot_results = []
+        for summary in self.finished_summaries:
+            logging.info(summary.module_infos)
+            logging.info(f"Result: {summary.result}")
+            logging.info(f"Total time: {summary.total_time}")
+            logging.info(f"Metrics: {summary.additional_metrics}")
+            logging.info("-" * 60)
+            if summary.result:
+                bar_plot_results.append(("\n".join(wrap(summary.dir_name, 25)), summary.result))
+
+        for summary in self.failed_summaries:
+            logging.info(summary.module_infos)
+            logging.info(f"Reason for fail: {summary.reason}")
+            logging.info(f"Metrics: {summary.additional_metrics}")
+            logging.info("-" * 60)
+
+        if bar_plot_results:
+            import matplotlib.pyplot as plt  # noqa: PLC0415  # Only imported at the end of a run, as it is slow to import
+
+            bar_plot_results.sort(key=lambda x: x[1], reverse=True)
+            plt.barh([r[0] for r in bar_plot_results], [r[1] for r in bar_plot_results])
+            plt.title("Results")
+            plt.ylabel("Pipelines")
+            plt.yticks(fontsize=5)
+            plt.xlabel("Result")
+            plt.tight_layout()
+            plt.savefig(self.base_path.joinpath("results.pdf"))
+            plt.close()
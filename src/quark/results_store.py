@@ -0,0 +1,230 @@
+"""Storing the results of all pipeline runs of a run in a single SQLite database, and reading them back.
+
+The database is an alternative to writing one directory with a results.json file per pipeline run, which is slow for
+sweeps with many pipelines, both to write and to read afterward. Each pipeline run is one row of the pipeline_runs
+table, and each of its steps one row of the steps table, so that runs can be queried with SQL directly as well:
+
+    SELECT p.name, s.module, s.preprocess_time FROM pipeline_runs p JOIN steps s ON s.pipeline_run_id = p.id
+
+Values that are not numbers or strings, like parameters and metrics, are stored as JSON. load_run and compare_runs read
+the results of runs written with either backend into PipelineRunRecords.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from quark.results import RESULTS_LINES_FILE_NAME
+
+RESULTS_DB_FILE_NAME: str = "results.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    modules TEXT NOT NULL,
+    params TEXT NOT NULL,
+    result REAL,
+    reason TEXT,
+    total_time REAL NOT NULL,
+    UNIQUE (status, name)
+);
+CREATE TABLE IF NOT EXISTS steps (
+    pipeline_run_id INTEGER NOT NULL REFERENCES pipeline_runs (id),
+    position INTEGER NOT NULL,
+    module TEXT NOT NULL,
+    params TEXT NOT NULL,
+    unique_name TEXT NOT NULL,
+    preprocess_time REAL NOT NULL,
+    postprocess_time REAL NOT NULL,
+    metrics TEXT NOT NULL,
+    PRIMARY KEY (pipeline_run_id, position)
+);
+"""
+
+
+@dataclass(frozen=True)
+class PipelineRunRecord:
+    """The stored results of a finished or failed pipeline run.
+
+    The steps are in the same order as in the results.json file of the pipeline run. Each step is a dictionary of the
+    fields of benchmarking.ModuleRunMetrics, with the module info as a dictionary as well. Optional fields that are not
+    set are missing.
+    """
+
+    name: str  # The name of the directory the pipeline run would be written to, unique within a run
+    status: str  # Either "finished" or "failed"
+    steps: list[dict[str, Any]]
+    result: float | None = None  # Only numeric results are stored, see results.extract_result
+    reason: str | None = None  # Only set for failed pipeline runs
+
+    @property
+    def modules(self) -> list[str]:
+        """Return the names of the modules of the steps."""
+        return [step["module_info"]["name"] for step in self.steps]
+
+    @property
+    def params(self) -> list[dict[str, Any]]:
+        """Return the parameters of the modules of the steps."""
+        return [step["module_info"]["params"] for step in self.steps]
+
+    @property
+    def total_time(self) -> float:
+        """Return the time spent in all pre- and postprocess steps combined."""
+        return sum(step["preprocess_time"] + step["postprocess_time"] for step in self.steps)
+
+    @classmethod
+    def from_encoded(cls, name: str, status: str, encoded: dict[str, Any]) -> PipelineRunRecord:
+        """Create a record from a pipeline run as encoded by the encoders in quark.results."""
+        if status == "finished":
+            return cls(name, status, encoded["steps"], result=encoded.get("result"))
+        return cls(name, status, encoded["metrics_up_to_now"], reason=encoded["reason"])
+
+    def encoded(self) -> dict[str, Any]:
+        """Return the pipeline run as encoded by the encoders in quark.results.
+
+        This is the content of the results.json file of the pipeline run.
+        """
+        if self.status == "finished":
+            return {"steps": self.steps} if self.result is None else {"result": self.result, "steps": self.steps}
+        return {"reason": self.reason, "metrics_up_to_now": self.steps}
+
+
+class ResultsStore:
+    """The SQLite database storing the results of all pipeline runs of a run.
+
+    Writing a pipeline run commits it, but the database is only synced to disk when it is closed, like the checkpoint
+    journal. Writing a pipeline run that was already written, e.g. by a run that crashed before journaling it, replaces
+    the previous one.
+    """
+
+    def __init__(self, path: Path, *, read_only: bool = False) -> None:
+        """Open the database at the given path.
+
+        :param path: The path of the database, which is created if it does not exist, unless opened read-only
+        :param read_only: If True, the database is opened read-only, e.g. to query the results of a finished run
+        """
+        self.path = path
+        self.read_only = read_only
+        if read_only:
+            self.connection = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+        else:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("PRAGMA synchronous = OFF")
+            self.connection.executescript(_SCHEMA)
+
+    def write(self, record: PipelineRunRecord) -> None:
+        """Write a pipeline run and its steps in one transaction."""
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM steps WHERE pipeline_run_id IN "
+                "(SELECT id FROM pipeline_runs WHERE status = ? AND name = ?)",
+                (record.status, record.name),
+            )
+            self.connection.execute(
+                "DELETE FROM pipeline_runs WHERE status = ? AND name = ?",
+                (record.status, record.name),
+            )
+            pipeline_run_id = self.connection.execute(
+                "INSERT INTO pipeline_runs (name, status, modules, params, result, reason, total_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    record.name,
+                    record.status,
+                    json.dumps(record.modules),
+                    json.dumps(record.params),
+                    record.result,
+                    record.reason,
+                    record.total_time,
+                ),
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        pipeline_run_id,
+                        position,
+                        step["module_info"]["name"],
+                        json.dumps(step["module_info"]["params"]),
+                        step["unique_name"],
+                        step["preprocess_time"],
+                        step["postprocess_time"],
+                        json.dumps(step),
+                    )
+                    for position, step in enumerate(record.steps)
+                ),
+            )
+
+    def pipeline_runs(self, status: str | None = None) -> list[PipelineRunRecord]:
+        """Return all stored pipeline runs in the order they were written, optionally only those with the given status.
+
+        :param status: Either "finished" or "failed"
+        """
+        rows = self.connection.execute(
+            "SELECT id, name, status, result, reason FROM pipeline_runs WHERE ? IS NULL OR status = ? ORDER BY id",
+            (status, status),
+        ).fetchall()
+        steps: dict[int, list[dict[str, Any]]] = {}
+        for pipeline_run_id, metrics in self.connection.execute(
+            "SELECT s.pipeline_run_id, s.metrics FROM steps s JOIN pipeline_runs p ON p.id = s.pipeline_run_id "
+            "WHERE ? IS NULL OR p.status = ? ORDER BY s.pipeline_run_id, s.position",
+            (status, status),
+        ):
+            steps.setdefault(pipeline_run_id, []).append(json.loads(metrics))
+        return [
+            PipelineRunRecord(name, row_status, steps.get(pipeline_run_id, []), result=result, reason=reason)
+            for pipeline_run_id, name, row_status, result, reason in rows
+        ]
+
+    def close(self) -> None:
+        """Close the database, syncing it to disk."""
+        self.connection.close()
+        if self.read_only:
+            return
+        with self.path.open("rb") as f:
+            os.fsync(f.fileno())
+
+
+def load_run(run_dir: str | Path, status: str | None = None) -> list[PipelineRunRecord]:
+    """Load the pipeline runs of a run from its database, or from its results.jsonl file if it has no database.
+
+    :param run_dir: The run directory, e.g. benchmark_runs/2025-01-01-12-00-00
+    :param status: Either "finished" or "failed", all pipeline runs are loaded if not given
+    """
+    run_dir = Path(run_dir)
+    db_path = run_dir.joinpath(RESULTS_DB_FILE_NAME)
+    if db_path.exists():
+        store = ResultsStore(db_path, read_only=True)
+        try:
+            return store.pipeline_runs(status)
+        finally:
+            store.close()
+    # A pipeline run is written again if a run crashed before journaling it, the last line of each one is kept
+    records: dict[tuple[str, str], PipelineRunRecord] = {}
+    with run_dir.joinpath(RESULTS_LINES_FILE_NAME).open() as f:
+        for line in f:
+            encoded = json.loads(line)
+            if status is None or encoded["status"] == status:
+                name = Path(encoded["dir"]).name
+                records[encoded["status"], name] = PipelineRunRecord.from_encoded(name, encoded["status"], encoded)
+    return list(records.values())
+
+
+def compare_runs(run_dirs: list[str | Path]) -> dict[str, dict[str, PipelineRunRecord]]:
+    """Load the finished pipeline runs of several runs, grouped by pipeline, to compare the same pipelines across runs.
+
+    :param run_dirs: The run directories to compare
+    :return: A dictionary mapping the name of each pipeline to a dictionary mapping each run directory, as given, to the
+        pipeline run of that pipeline in that run. A pipeline that is missing from a run is missing from its dictionary.
+    """
+    pipelines: dict[str, dict[str, PipelineRunRecord]] = {}
+    for run_dir in run_dirs:
+        for record in load_run(run_dir, status="finished"):
+            pipelines.setdefault(record.name, {})[str(run_dir)] = record
+    return pipelines
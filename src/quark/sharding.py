@@ -0,0 +1,219 @@
+"""Splitting the pipelines of a config file into shards that are run independently, and merging their results.
+
+Each pipeline is a leaf of the pipeline trees created from the config file. The leaves are split into contiguous ranges
+in the order the trees are traversed, so that every shard runs the same number of pipelines, give or take one, and a
+prefix shared by several pipelines is only run by more than one shard if a range boundary falls between them. As the
+split only depends on the config file, every machine computes the same shards without coordinating with the others.
+Pipelines of parameter sweeps are only counted, and their pending children restricted to the range of the shard.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import shutil
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from quark.benchmarking import ModuleInfo, ModuleNode
+from quark.profiling import PROFILES_DIR_NAME
+from quark.results import (
+    FAILED_PIPELINES_DIR_NAME,
+    PIPELINES_DIR_NAME,
+    RESULTS_LINES_FILE_NAME,
+    FailedPipelineRunSummary,
+    FinishedPipelineRunSummary,
+    ResultSink,
+    unique_dir_name,
+)
+from quark.results_store import RESULTS_DB_FILE_NAME, PipelineRunRecord, ResultsStore, load_run
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from quark.config_parsing import PipelineTree
+
+SHARD_FILE_NAME: str = "shard.txt"
+# Files of a run that are only present while it is not finished, see __main__ and checkpoint
+_UNFINISHED_MARKERS: tuple[str, ...] = ("intermediate_run_state.pkl", "journal")
+# Files that are concatenated in the order of the shards
+_CONCATENATED_FILES: tuple[str, ...] = ("logging.log", "steps.jsonl")
+
+
+@dataclass(frozen=True)
+class Shard:
+    """One of count shards of the pipelines of a config file, the index starting at 1."""
+
+    index: int
+    count: int
+
+    @classmethod
+    def parse(cls, spec: str) -> Shard:
+        """Parse a shard given as "i/N", e.g. "2/8" for the second of eight shards."""
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec)
+        if match is None:
+            message = f"Expected a shard of the form i/N, got {spec!r}"
+            raise ValueError(message)
+        shard = cls(int(match.group(1)), int(match.group(2)))
+        if not 1 <= shard.index <= shard.count:
+            message = f"The index of shard {shard} must be between 1 and {shard.count}"
+            raise ValueError(message)
+        return shard
+
+    def __str__(self) -> str:
+        """Return the shard in the form it is parsed from."""
+        return f"{self.index}/{self.count}"
+
+    def write(self, run_dir: Path) -> None:
+        """Record this shard in a run directory, so that it is known when the run is resumed or merged."""
+        run_dir.joinpath(SHARD_FILE_NAME).write_text(str(self))
+
+    @classmethod
+    def read(cls, run_dir: Path) -> Shard | None:
+        """Return the shard recorded in a run directory, or None if the run is not a shard."""
+        path = run_dir.joinpath(SHARD_FILE_NAME)
+        return cls.parse(path.read_text()) if path.is_file() else None
+
+
+def _restrict(nodes: list[PipelineTree], start: int, stop: int) -> list[PipelineTree]:
+    """Reduce the given sibling nodes to those the pipelines start..stop of them pass through, in traversal order.
+
+    Pending children and pending roots are not created, but only restricted to the pipelines passing through them.
+    """
+    kept = []
+    offset = 0
+    for node in nodes:
+        num_pipelines = node.num_pipelines
+        node_start, node_stop = max(start - offset, 0), min(stop - offset, num_pipelines)
+        offset += num_pipelines
+        if node_start >= node_stop:
+            continue
+        kept.append(node)
+        if not isinstance(node, ModuleNode):
+            node.restrict(node_start, node_stop)
+            continue
+        num_child_pipelines = sum(child.num_pipelines for child in node.children)
+        node.children = _restrict(list(node.children), node_start, node_stop)  # type: ignore
+        if node.pending_children is not None:
+            node.pending_children.restrict(
+                max(node_start - num_child_pipelines, 0),
+                max(node_stop - num_child_pipelines, 0),
+            )
+    return kept
+
+
+def shard_pipeline_trees(pipeline_trees: list[PipelineTree], shard: Shard) -> list[PipelineTree]:
+    """Reduce the pipeline trees to the pipelines of a shard, removing every node none of its pipelines pass through.
+
+    The positions of the remaining nodes are kept, so they must be assigned before, as done by parse_config.
+    """
+    num_pipelines = sum(tree.num_pipelines for tree in pipeline_trees)
+    start = num_pipelines * (shard.index - 1) // shard.count
+    stop = num_pipelines * shard.index // shard.count
+    logging.info(f"Shard {shard} runs {stop - start} of {num_pipelines} pipelines")
+    return _restrict(pipeline_trees, start, stop)
+
+
+def _check_shards(shard_dirs: list[Path]) -> list[Path]:
+    """Check that the run directories are the finished shards of one config file, and return them in shard order."""
+    shards: dict[int, Path] = {}
+    counts = set()
+    for shard_dir in shard_dirs:
+        shard = Shard.read(shard_dir)
+        if shard is None:
+            message = f"{shard_dir} is not the run directory of a shard"
+            raise ValueError(message)
+        if any(shard_dir.joinpath(marker).exists() for marker in _UNFINISHED_MARKERS):
+            message = (
+                f"Shard {shard} in {shard_dir} is not finished, resume it before merging. If it was run with "
+                "--keep-pickle, its intermediate run state must be removed first"
+            )
+            raise ValueError(message)
+        if shard.index in shards:
+            message = f"Shard {shard} is given twice, in {shards[shard.index]} and {shard_dir}"
+            raise ValueError(message)
+        shards[shard.index] = shard_dir
+        counts.add(shard.count)
+    if len(counts) != 1:
+        message = f"The shards are not from the same split, they have {sorted(counts)} shards in total"
+        raise ValueError(message)
+    if missing := set(range(1, counts.pop() + 1)) - shards.keys():
+        message = f"Shards {sorted(missing)} are missing"
+        raise ValueError(message)
+    if len({shard_dir.joinpath(RESULTS_DB_FILE_NAME).exists() for shard_dir in shard_dirs}) != 1:
+        message = "All shards must use the same results backend"
+        raise ValueError(message)
+    return [shards[index] for index in sorted(shards)]
+
+
+def _copy_pipeline_run(shard_dir: Path, base_path: Path, record: PipelineRunRecord, name: str) -> str:
+    """Copy the directory of a pipeline run of a shard into the merged run directory, and return its results line."""
+    dir_name = PIPELINES_DIR_NAME if record.status == "finished" else FAILED_PIPELINES_DIR_NAME
+    target = base_path.joinpath(dir_name, name)
+    shutil.copytree(shard_dir.joinpath(dir_name, record.name), target, dirs_exist_ok=True)
+    return json.dumps({"status": record.status, "dir": target.relative_to(base_path).as_posix(), **record.encoded()})
+
+
+def merge_shards(shard_dirs: list[Path], base_path: Path) -> ResultSink:
+    """Combine the run directories of all shards of a config file into one run directory.
+
+    The merged directory has the same layout as the directory of a run of the whole config file on a single machine.
+    Failed pipeline runs are renumbered, as each shard numbers its own from 0. Finished pipeline runs of different
+    shards with the same name are numbered like identical pipelines of one run, see results.unique_dir_name.
+
+    :param shard_dirs: The run directories of the shards, in any order
+    :param base_path: The run directory to create
+    :return: A result sink holding the summaries of all merged pipeline runs, to write the summary of the merged run
+    """
+    shard_dirs = _check_shards(shard_dirs)
+    base_path.mkdir(parents=True)
+    shutil.copyfile(shard_dirs[0].joinpath("config.yml"), base_path.joinpath("config.yml"))
+    for file_name in _CONCATENATED_FILES:
+        with base_path.joinpath(file_name).open("wb") as merged_file:
+            for shard_dir in (d for d in shard_dirs if d.joinpath(file_name).is_file()):
+                with shard_dir.joinpath(file_name).open("rb") as shard_file:
+                    shutil.copyfileobj(shard_file, merged_file)
+
+    use_store = shard_dirs[0].joinpath(RESULTS_DB_FILE_NAME).exists()
+    store = ResultsStore(base_path.joinpath(RESULTS_DB_FILE_NAME)) if use_store else None
+    lines = []
+    finished_summaries: list[FinishedPipelineRunSummary] = []
+    failed_summaries: list[FailedPipelineRunSummary] = []
+    finished_names: set[str] = set()
+    for shard_dir in shard_dirs:
+        for record in load_run(shard_dir):
+            module_infos = [ModuleInfo(**step["module_info"]) for step in record.steps]
+            additional_metrics = [step["additional_metrics"] for step in record.steps]
+            name = record.name
+            if record.status == "finished":
+                # Identical pipelines may end up in different shards, each of which named its pipeline run the same
+                name = unique_dir_name(name, finished_names)
+                summary = FinishedPipelineRunSummary(
+                    name,
+                    module_infos,
+                    record.result,
+                    record.total_time,
+                    additional_metrics,
+                )
+                finished_summaries.append(summary)
+            else:
+                # The index is part of the name of failed pipeline runs, see ResultSink
+                name = str(len(failed_summaries)) + str.join("-", (step["unique_name"] for step in record.steps))
+                failed_summaries.append(FailedPipelineRunSummary(name, module_infos, record.reason, additional_metrics))  # type: ignore
+            if store is None:
+                lines.append(_copy_pipeline_run(shard_dir, base_path, record, name))
+            else:
+                store.write(PipelineRunRecord(name, record.status, record.steps, record.result, record.reason))
+        if store is not None and shard_dir.joinpath(PROFILES_DIR_NAME).is_dir():
+            # Profiles of the pipeline runs in the store are kept in the profiles directory of the run
+            shutil.copytree(
+                shard_dir.joinpath(PROFILES_DIR_NAME),
+                base_path.joinpath(PROFILES_DIR_NAME),
+                dirs_exist_ok=True,
+            )
+    if store is None:
+        base_path.joinpath(RESULTS_LINES_FILE_NAME).write_text(str.join("", (f"{line}\n" for line in lines)))
+    else:
+        store.close()
+    return ResultSink(base_path, finished_summaries, failed_summaries)
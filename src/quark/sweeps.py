@@ -0,0 +1,104 @@
+"""Parameter sweeps, running a module of the config file with many combinations of parameters.
+
+Next to its parameters, a module can be given a grid and a zip of parameters, each mapping parameter names to lists of
+values or to ranges, given as {range: [start, stop, step]} with the same meaning as in Python. Every combination of the
+values in the grid, i.e. their Cartesian product, is combined with every tuple of the values in the zip, which are
+combined element by element. The parameters of the module itself are shared by all combinations.
+
+A sweep is never expanded into a list. Its combinations are computed from their index, so that only the combination
+that is currently run has to be held in memory, however many combinations there are.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+# Keys of the sweep settings, which can be given for a single module next to its parameters
+# -grid: Parameters whose values are combined with all values of the other parameters in the grid
+# -zip: Parameters whose values are combined element by element, so they must all have the same number of values
+SWEEP_SETTINGS: tuple[str, ...] = ("grid", "zip")
+
+
+def _init_values(name: str, values: Any) -> Sequence[Any]:  # noqa: ANN401
+    """Return the values of a swept parameter, given either as a list or as a range.
+
+    :param name: The name of the parameter, used in error messages
+    :param values: A list of values, or a dictionary {range: stop} or {range: [start, stop, step]}, the step being
+        optional
+    :return: A sequence of the values, ranges are kept as range objects instead of being expanded to lists
+    """
+    match values:
+        case list():
+            return values
+        case {"range": int() as stop}:
+            return range(stop)
+        case {"range": [*args]} if 1 <= len(args) <= 3 and all(isinstance(arg, int) for arg in args):
+            return range(*args)
+        case _:
+            message = f"The values of the swept parameter {name} must be a list or a range of integers, got {values}"
+            raise ValueError(message)
+
+
+@dataclass(frozen=True)
+class Sweep:
+    """The combinations of parameters a module is run with.
+
+    The combinations are ordered like nested loops, the outermost one going over the tuples of the zip, followed by one
+    loop for each parameter of the grid in the given order.
+    """
+
+    params: dict[str, Any]  # Parameters shared by all combinations
+    grid: dict[str, Sequence[Any]] = field(default_factory=dict)
+    zipped: dict[str, Sequence[Any]] = field(default_factory=dict)
+
+    @classmethod
+    def from_settings(cls, params: dict[str, Any], settings: dict[str, Any]) -> Sweep:
+        """Create a sweep from the parameters of a module and the dictionary the module is given in.
+
+        :param params: The parameters of the module
+        :param settings: A dictionary that may contain any of the keys in SWEEP_SETTINGS
+        """
+        swept = {key: settings.get(key) or {} for key in SWEEP_SETTINGS}
+        for key, parameters in swept.items():
+            if not isinstance(parameters, dict):
+                message = f"The {key} of a module must map parameter names to their values, got {parameters}"
+                raise TypeError(message)
+        if both := swept["grid"].keys() & swept["zip"].keys():
+            message = f"Parameters {sorted(both)} cannot be part of both the grid and the zip of a module"
+            raise ValueError(message)
+        sweep = cls(
+            params,
+            {name: _init_values(name, values) for name, values in swept["grid"].items()},
+            {name: _init_values(name, values) for name, values in swept["zip"].items()},
+        )
+        if len({len(values) for values in sweep.zipped.values()}) > 1:
+            message = f"All parameters of a zip must have the same number of values, got {sweep.zipped}"
+            raise ValueError(message)
+        if len(sweep) == 0:
+            message = f"A sweep needs at least one combination of parameters, but a parameter has no values: {swept}"
+            raise ValueError(message)
+        return sweep
+
+    def __len__(self) -> int:
+        """Return the number of combinations."""
+        zipped = len(next(iter(self.zipped.values()))) if self.zipped else 1
+        return zipped * math.prod(len(values) for values in self.grid.values())
+
+    def __getitem__(self, index: int) -> dict[str, Any]:
+        """Return the parameters of the combination with the given index."""
+        if not 0 <= index < len(self):
+            message = f"Sweep index {index} out of range"
+            raise IndexError(message)
+        params = dict(self.params)
+        grid = {}
+        for name, values in reversed(self.grid.items()):  # The last parameter of the grid changes fastest
+            index, i = divmod(index, len(values))
+            grid[name] = values[i]
+        params.update({name: values[index] for name, values in self.zipped.items()})
+        params.update(reversed(grid.items()))
+        return params
@@ -0,0 +1,82 @@
+"""Statistics over the measured times of a module step that was run repeatedly."""
+
+from __future__ import annotations
+
+import math
+import statistics
+
+# Two-sided 95% quantiles of Student's t-distribution, indexed by the degrees of freedom
+_T_QUANTILES_95: dict[int, float] = {
+    1: 12.706,
+    2: 4.303,
+    3: 3.182,
+    4: 2.776,
+    5: 2.571,
+    6: 2.447,
+    7: 2.365,
+    8: 2.306,
+    9: 2.262,
+    10: 2.228,
+    11: 2.201,
+    12: 2.179,
+    13: 2.160,
+    14: 2.145,
+    15: 2.131,
+    16: 2.120,
+    17: 2.110,
+    18: 2.101,
+    19: 2.093,
+    20: 2.086,
+    21: 2.080,
+    22: 2.074,
+    23: 2.069,
+    24: 2.064,
+    25: 2.060,
+    26: 2.056,
+    27: 2.052,
+    28: 2.048,
+    29: 2.045,
+    30: 2.042,
+    40: 2.021,
+    60: 2.000,
+    120: 1.980,
+}
+_Z_QUANTILE_95: float = 1.960
+
+
+def _t_quantile_95(degrees_of_freedom: int) -> float:
+    """Return the quantile for the given degrees of freedom, rounding down to the next tabulated value.
+
+    Rounding down makes the confidence interval slightly wider, never narrower, than the exact one.
+    """
+    if degrees_of_freedom > max(_T_QUANTILES_95):
+        return _Z_QUANTILE_95
+    return _T_QUANTILES_95[max(df for df in _T_QUANTILES_95 if df <= degrees_of_freedom)]
+
+
+def timing_statistics(samples: list[float]) -> dict[str, float | int | None]:
+    """Summarize the times measured for repeated runs of a module step.
+
+    The standard deviation and the 95% confidence interval of the mean are None if there is only one sample.
+
+    :param samples: The measured times in seconds, at least one
+    :return: A dict that can be added to the results as it is
+    """
+    mean = statistics.fmean(samples)
+    stddev: float | None = None
+    ci95_low: float | None = None
+    ci95_high: float | None = None
+    if len(samples) > 1:
+        stddev = statistics.stdev(samples, mean)
+        half_width = _t_quantile_95(len(samples) - 1) * stddev / math.sqrt(len(samples))
+        ci95_low = mean - half_width
+        ci95_high = mean + half_width
+    return {
+        "samples": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": mean,
+        "stddev": stddev,
+        "ci95_low": ci95_low,
+        "ci95_high": ci95_high,
+    }